@@ -1,12 +1,140 @@
-from flask import Flask
+from flask import Flask, Response, jsonify, request
 from routes.pension_routes import pension_bp
 from routes.social_security_routes import social_security_bp
+from routes.medical_insurance_payments import medical_insurance_bp
+from routes.statement_routes import statement_bp
+from utils.coalescer import coalescing_enabled, coalescer_stats
+from utils.cache import response_cache
+from utils.statements import statement_stats
+from utils import admission, compression, db, metrics, profiling, snapshot, spool
+from mysql.connector import Error
+from config import admission_config, cache_config, snapshot_config, spool_config
 
 app = Flask(__name__)
 
-# Register blueprints for pension and social security routes
+# Register blueprints for pension, social security and medical insurance routes
+# 原独立插入服务（api_insert_*.py）的接口路径与这些蓝图相同，旧端口见 server_config['extra_ports']
 app.register_blueprint(pension_bp, url_prefix='/api')
 app.register_blueprint(social_security_bp, url_prefix='/api')
+app.register_blueprint(medical_insurance_bp, url_prefix='/api')
+# 三个险种合并的缴费汇总
+app.register_blueprint(statement_bp, url_prefix='/api')
 
+# 请求数、延迟等监控指标
+metrics.init_app(app)
+# 准入控制：按路由类别限制并发和排队，按客户端限速，超限返回 429
+admission.init_app(app)
+# 按需请求分析（X-Profile 请求头或管理开关）和慢请求日志，管理接口需共享密钥或本机访问
+profiling.init_app(app)
+# 读写分离：客户端写入后短时间内的读请求走主库
+db.init_app(app)
+# 统计接口使用的进程内快照，每个进程收到第一个请求时开始载入
+snapshot.init_app(app)
+# 单条插入的本地写入暂存，每个进程收到第一个请求时接管一个通道并开始重放
+spool.init_app(app)
+# 按 Accept-Encoding 压缩较大的查询结果和导出（最后注册，最先执行）
+compression.init_app(app)
+
+# 合并写入（group commit）的运行统计
+@app.route('/api/coalescer/stats', methods=['GET'])
+def get_coalescer_stats():
+    return jsonify({
+        'enabled': coalescing_enabled(),
+        'tables': coalescer_stats()
+    }), 200
+
+# 查询结果缓存的命中统计
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'enabled': cache_config['enabled'],
+        **response_cache.stats()
+    }), 200
+
+# 预处理语句复用情况（预处理次数、执行次数、各语句形状）
+@app.route('/api/statements/stats', methods=['GET'])
+def get_statement_stats():
+    return jsonify(statement_stats()), 200
+
+# 各路由类别正在执行、排队和被拒绝的请求数
+@app.route('/api/admission/stats', methods=['GET'])
+def get_admission_stats():
+    return jsonify({
+        'enabled': admission_config['enabled'],
+        'classes': admission.admission_stats()
+    }), 200
+
+# 只读副本的可用性、复制延迟和读请求分布
+@app.route('/api/replicas/stats', methods=['GET'])
+def get_replica_stats():
+    replicas = db.get_replicas()
+    if replicas is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **replicas.stats()}), 200
+
+# 进程内快照的行数、是否可用和命中情况
+@app.route('/api/snapshot/stats', methods=['GET'])
+def get_snapshot_stats():
+    return jsonify({
+        'enabled': snapshot_config['enabled'],
+        'tables': snapshot.snapshot_stats() if snapshot_config['enabled'] else {}
+    }), 200
+
+# 本进程写入暂存的积压记录数、最早未重放记录的等待时间和重放统计
+@app.route('/api/spool/stats', methods=['GET'])
+def get_spool_stats():
+    return jsonify({
+        'enabled': spool_config['enabled'],
+        'lane': spool.spool_stats()
+    }), 200
+
+# 按插入接口返回的 spool_id 查询记录是否已写入数据库
+@app.route('/api/spool/<spool_id>', methods=['GET'])
+def get_spool_record(spool_id):
+    try:
+        return jsonify(spool.lookup(spool_id)), 200
+    except spool.SpoolIdError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# Prometheus 抓取接口
+@app.route('/metrics', methods=['GET'], endpoint='metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# 请求分析开关：GET 查看状态，POST {"enabled": true, "slow_threshold_ms": 200} 切换
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@profiling.admin_only
+def admin_profiling():
+    if request.method == 'GET':
+        return jsonify(profiling.profiling_status()), 200
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('enabled'), bool):
+        return jsonify({'error': 'Request body must be a JSON object with a boolean "enabled"'}), 400
+    threshold = data.get('slow_threshold_ms')
+    if threshold is not None and (not isinstance(threshold, (int, float)) or threshold < 0):
+        return jsonify({'error': 'slow_threshold_ms must be a non-negative number'}), 400
+    return jsonify(profiling.set_enabled(data['enabled'], threshold)), 200
+
+# 慢请求日志（最新的在前），包含各阶段耗时和每条 SQL 及参数
+@app.route('/api/admin/slow_log', methods=['GET'])
+@profiling.admin_only
+def admin_slow_log():
+    limit = request.args.get('limit', type=int)
+    entries = profiling.slow_log(limit)
+    return jsonify({'count': len(entries), 'entries': entries}), 200
+
+# 按响应头 X-Profile-Id 查看最近一次被分析请求的完整结果（含 cProfile 输出）
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+@profiling.admin_only
+def admin_profile(profile_id):
+    result = profiling.get_profile(profile_id)
+    if result is None:
+        return jsonify({'error': f'Profile {profile_id} not found'}), 404
+    return jsonify(result), 200
+
+# 生产环境多进程启动，参数见 config.server_config；本地调试可用 flask --app app run --debug
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5003)
\ No newline at end of file
+    from serve import main
+    main()
@@ -0,0 +1,86 @@
+"""
+批量插入校验微基准：对比旧的逐条校验（每个值调用 strptime / float + 异常处理）
+与列式 BatchValidator（按列去重后用预编译正则校验一次）。
+旧实现遇到第一条错误即返回，这里让它校验完全部记录，与新实现报告全部错误的工作量相同。
+
+    python3 benchmarks/bench_batch_validation.py --rows 100 10000 50000 --invalid 0.01
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.validation import BatchValidator, validate_date, validate_payment
+
+REQUIRED_FIELDS = ['date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
+AMOUNT_FIELDS = ['personal_payment', 'company_payment', 'personal_account']
+
+
+def old_validate_record(record):
+    """旧实现（社保蓝图的 validate_record）"""
+    for field in REQUIRED_FIELDS:
+        if field not in record:
+            return f'Missing required field in record: {field}'
+    if not validate_date(record['date']):
+        return f"Date must be in YYYY-MM-DD format in record: {record}"
+    for field in AMOUNT_FIELDS:
+        valid, error = validate_payment(record[field], field)
+        if not valid:
+            return error
+    return None
+
+
+def old_path(records):
+    return [index for index, record in enumerate(records) if old_validate_record(record) is not None]
+
+
+def new_path(validator, records):
+    return sorted({error['index'] for error in validator.validate(records)})
+
+
+def make_records(count, invalid, seed=1):
+    """模拟 JSON 请求体：日期为字符串（每月一天），金额为数字或数字字符串，按比例混入无效记录"""
+    rng = random.Random(seed)
+    start = date(2000, 1, 1)
+    records = []
+    for i in range(count):
+        record = {
+            'date': (start + timedelta(days=30 * (i % 300))).isoformat(),
+            'personal_payment': 812.5,
+            'company_payment': '1625.00',
+            'personal_account': 300 + i % 7,
+            'remarks': '正常缴纳',
+        }
+        if rng.random() < invalid:
+            field, value = rng.choice([('date', '2020-02-30'), ('personal_payment', '-1'),
+                                       ('company_payment', 'abc'), ('personal_account', None)])
+            record[field] = value
+        records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 10000, 50000])
+    parser.add_argument('--invalid', type=float, default=0.01, help='fraction of invalid records')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    validator = BatchValidator(REQUIRED_FIELDS, amounts=AMOUNT_FIELDS)
+    print(f"{'rows':>8} {'invalid':>8} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8}")
+    for count in args.rows:
+        records = make_records(count, args.invalid)
+        expected = old_path(records)
+        assert new_path(validator, records) == expected, 'invalid records differ'
+        number = max(1, 100000 // count)
+        old = min(timeit.repeat(lambda: old_path(records), number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: new_path(validator, records), number=number, repeat=args.repeat)) / number
+        print(f"{count:>8} {len(expected):>8} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
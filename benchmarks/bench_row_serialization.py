@@ -0,0 +1,83 @@
+"""
+查询结果序列化微基准：对比旧的逐行 Python 日期格式化（字典游标 + format_date）
+与新的 SQL 侧 DATE_FORMAT + 元组游标 + 预先确定列名的处理方式。
+不连接数据库，只测量 Python 侧从游标结果到 JSON 响应体的开销。
+
+    python3 benchmarks/bench_row_serialization.py --rows 20 1000 10000
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from utils.rows import to_records
+
+COLUMNS = ['id', 'date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
+
+
+def format_date(date_value, record_id):
+    """旧实现：在 Python 中把日期格式化为 YYYY-MM"""
+    if not date_value:
+        return None
+    if isinstance(date_value, (datetime, date)):
+        return date_value.strftime('%Y-%m')
+    if isinstance(date_value, str):
+        try:
+            return datetime.strptime(date_value, '%a, %d %b %Y %H:%M:%S %Z').strftime('%Y-%m')
+        except ValueError:
+            try:
+                return datetime.strptime(date_value, '%Y-%m-%d').strftime('%Y-%m')
+            except ValueError:
+                return None
+    return None
+
+
+def make_rows(count):
+    start = date(2000, 1, 1)
+    dict_rows, tuple_rows = [], []
+    for i in range(count):
+        day = start + timedelta(days=i % 9000)
+        values = (i + 1, day, Decimal('812.50'), Decimal('1625.00'), Decimal('300.00'), '正常缴纳')
+        dict_rows.append(dict(zip(COLUMNS, values)))
+        # 新方式下 MySQL 返回格式化后的月份，末尾附加原始日期（sort_date）
+        tuple_rows.append((values[0], day.strftime('%Y-%m')) + values[2:] + (day,))
+    return dict_rows, tuple_rows
+
+
+def old_path(dict_rows):
+    records = [dict(row) for row in dict_rows]  # 字典游标每次查询都会生成新的字典
+    for record in records:
+        record['date'] = format_date(record['date'], record['id'])
+    return jsonify({'message': 'Query successful', 'records': records, 'count': len(records)}).get_data()
+
+
+def new_path(tuple_rows):
+    records = to_records(COLUMNS, tuple_rows)
+    return jsonify({'message': 'Query successful', 'records': records, 'count': len(records)}).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[20, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with app.app_context():
+        print(f"{'rows':>8} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8}")
+        for count in args.rows:
+            dict_rows, tuple_rows = make_rows(count)
+            assert old_path(dict_rows) == new_path(tuple_rows), 'payloads differ'
+            number = max(1, 20000 // count)
+            old = min(timeit.repeat(lambda: old_path(dict_rows), number=number, repeat=args.repeat)) / number
+            new = min(timeit.repeat(lambda: new_path(tuple_rows), number=number, repeat=args.repeat)) / number
+            print(f"{count:>8} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
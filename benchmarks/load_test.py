@@ -0,0 +1,418 @@
+"""
+接口压测：向各缴费表写入指定数量的种子数据，在子进程中启动 app.py 中的应用，
+用多个并发客户端依次压测每个接口（单条/批量插入、各种过滤条件的查询、汇总、导出、单条/批量删除），
+输出每个接口的吞吐量和 p50/p95/p99 延迟（JSON），可保存为基线并与后续版本对比。
+
+数据库默认使用嵌入式替身（benchmarks/standin.py，SQLite 文件库），只反映应用层开销；
+--db mysql 时使用 config.py 中的 db_config 连接真实 MySQL（需已建表）。
+
+    python3 benchmarks/load_test.py --rows 10000 --clients 8 --duration 5 --output baseline.json
+    python3 benchmarks/load_test.py --rows 1000000 --compare baseline.json
+    python3 benchmarks/load_test.py --db mysql --skip-seed --routes pension_payments
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 各缴费表的写入列和查询接口支持的额外过滤条件
+TABLES = {
+    'pension_payments': {
+        'columns': ['date', 'personal_payment', 'company_payment', 'remarks'],
+        'filters': ['year'],
+    },
+    'social_security_payments': {
+        'columns': ['date', 'personal_payment', 'company_payment', 'personal_account', 'remarks'],
+        'filters': ['year', 'personal_payment'],
+    },
+    'medical_insurance_payments': {
+        'columns': ['date', 'personal_payment', 'company_payment', 'personal_account', 'remarks'],
+        'filters': [],
+    },
+}
+
+FIRST_DATE = date(2000, 1, 1)
+DATE_SPAN_DAYS = 25 * 365
+PAYMENTS = [Decimal('812.50'), Decimal('1625.00'), Decimal('300.00'), Decimal('2450.75')]
+SEED_CHUNK = 2000
+
+
+def _record(columns, index):
+    """第 index 条种子/写入记录，日期分布在 2000 年起的 25 年内"""
+    day = FIRST_DATE + timedelta(days=(index * 7) % DATE_SPAN_DAYS)
+    values = {
+        'date': day.isoformat(),
+        'personal_payment': PAYMENTS[index % len(PAYMENTS)],
+        'company_payment': PAYMENTS[(index + 1) % len(PAYMENTS)],
+        'personal_account': PAYMENTS[(index + 2) % len(PAYMENTS)],
+        'remarks': 'benchmark',
+    }
+    return [values[column] for column in columns]
+
+
+def seed(tables, rows):
+    """用多行 INSERT 分块写入种子数据，返回各表的 (最小 ID, 最大 ID)"""
+    from utils.db import get_db_connection
+    from utils.rollup import rollup_enabled, rebuild_rollups
+
+    connection, cursor = get_db_connection()
+    try:
+        for table in tables:
+            columns = TABLES[table]['columns']
+            placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            for start in range(0, rows, SEED_CHUNK):
+                count = min(SEED_CHUNK, rows - start)
+                cursor.execute(
+                    f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+                    f"VALUES {', '.join([placeholders] * count)}",
+                    [value for index in range(start, start + count) for value in _record(columns, index)])
+                connection.commit()
+            print(f'seeded {rows} rows into {table}', file=sys.stderr)
+    finally:
+        cursor.close()
+        connection.close()
+    # 种子数据绕过了接口，开启汇总表时需重建
+    if rows and rollup_enabled():
+        rebuild_rollups(tables)
+    return id_ranges(tables)
+
+
+def id_ranges(tables):
+    from utils.db import get_db_connection
+
+    connection, cursor = get_db_connection()
+    try:
+        ranges = {}
+        for table in tables:
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+            ranges[table] = cursor.fetchone()
+        return ranges
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def serve(db, standin_path, ready):
+    """子进程入口：启动应用并把监听端口交给父进程"""
+    if db == 'standin':
+        import standin
+        standin.install(standin_path)
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import app
+
+    class Handler(WSGIRequestHandler):
+        # 与 serve.py 相同使用 HTTP/1.1（流式导出分块传输）；werkzeug 每个响应都带 Connection: close，
+        # 不支持保持连接，客户端每个请求都重新建立 TCP 连接，测得的延迟包含建立连接的时间
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=Handler)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+class IdAllocator:
+    """按顺序分配种子数据的 ID 给删除接口，分配完后返回 None"""
+
+    def __init__(self, first, last):
+        self._next = itertools.count(first)
+        self._last = last
+        self._lock = threading.Lock()
+
+    def take(self, count):
+        with self._lock:
+            ids = [next(self._next) for _ in range(count)]
+        return ids if ids[-1] <= self._last else None
+
+
+def _month_range(rng):
+    day = FIRST_DATE + timedelta(days=rng.randrange(DATE_SPAN_DAYS))
+    return day.replace(day=1).isoformat(), day.replace(day=28).isoformat()
+
+
+def scenarios(table, id_range, batch_size):
+    """
+    生成表的压测场景：(名称, 方法, 生成请求的函数)。
+    生成函数接收随机数生成器，返回 (路径, 请求体)，返回 None 表示数据已用完、场景结束。
+    """
+    base = f'/api/{table}'
+    columns = TABLES[table]['columns']
+    first_id, last_id = id_range
+    counter = itertools.count(random.randrange(1 << 20))
+
+    def body(index):
+        return {column: str(value) if isinstance(value, Decimal) else value
+                for column, value in zip(columns, _record(columns, index))}
+
+    def random_id(rng):
+        return rng.randint(first_id, last_id) if first_id is not None else 1
+
+    def month_query(rng):
+        start_date, end_date = _month_range(rng)
+        return f'start_date={start_date}&end_date={end_date}'
+
+    result = [
+        ('POST', lambda rng: (base, body(next(counter))), 'POST'),
+        ('POST /batch', lambda rng: (f'{base}/batch', [body(next(counter)) for _ in range(batch_size)]), 'POST'),
+        ('GET ?id', lambda rng: (f'{base}?id={random_id(rng)}', None), 'GET'),
+        ('GET ?start_date&end_date', lambda rng: (f'{base}?{month_query(rng)}', None), 'GET'),
+        ('GET ?per_page', lambda rng: (f'{base}?per_page=20', None), 'GET'),
+    ]
+    if 'year' in TABLES[table]['filters']:
+        result.append(('GET ?year', lambda rng: (f'{base}?year={rng.randint(2000, 2024)}', None), 'GET'))
+    if 'personal_payment' in TABLES[table]['filters']:
+        result.append(('GET ?personal_payment',
+                       lambda rng: (f'{base}?personal_payment={rng.choice(PAYMENTS)}', None), 'GET'))
+    result += [
+        ('GET /summary?group_by=month', lambda rng: (f'{base}/summary?group_by=month', None), 'GET'),
+        ('GET /summary?group_by=year', lambda rng: (f'{base}/summary?group_by=year', None), 'GET'),
+        ('GET /export', lambda rng: (f'{base}/export?{month_query(rng)}', None), 'GET'),
+    ]
+    if first_id is not None:
+        # 删除接口放在最后，逐个消耗种子数据
+        deletes = IdAllocator(first_id, last_id)
+
+        def delete_one(rng):
+            ids = deletes.take(1)
+            return (f'{base}/{ids[0]}', None) if ids else None
+
+        def delete_batch(rng):
+            ids = deletes.take(batch_size)
+            return (f'{base}/batch', ids) if ids else None
+
+        result += [
+            ('DELETE /<id>', delete_one, 'DELETE'),
+            ('DELETE /batch', delete_batch, 'DELETE'),
+            ('DELETE ?start_date&end_date', lambda rng: (f'{base}?{month_query(rng)}', None), 'DELETE'),
+        ]
+    return [(f'{table} {name}', method, make) for name, make, method in result]
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def run_scenario(host, port, method, make, clients, duration, max_requests):
+    latencies = []
+    statuses = {}
+    failures = []
+    lock = threading.Lock()
+    issued = itertools.count()
+    deadline = time.monotonic() + duration
+    exhausted = threading.Event()
+
+    def client(seed):
+        rng = random.Random(seed)
+        # 服务端每个响应后关闭连接，HTTPConnection 在下一个请求时自动重新连接
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        local_latencies, local_statuses = [], {}
+        try:
+            while time.monotonic() < deadline and not exhausted.is_set():
+                if max_requests and next(issued) >= max_requests:
+                    break
+                request = make(rng)
+                if request is None:
+                    exhausted.set()
+                    break
+                path, payload = request
+                headers = {}
+                data = None
+                if payload is not None:
+                    data = json.dumps(payload).encode()
+                    headers['Content-Type'] = 'application/json'
+                started = time.perf_counter()
+                try:
+                    connection.request(method, path, body=data, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    with lock:
+                        failures.append(str(e))
+                    connection.close()
+                    connection = http.client.HTTPConnection(host, port, timeout=60)
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+                local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+        finally:
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = len(failures) + sum(count for status, count in statuses.items() if status >= 400)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            name: round(value * 1000, 3) if value is not None else None
+            for name, value in (
+                ('mean', sum(latencies) / len(latencies) if latencies else None),
+                ('p50', percentile(latencies, 50)),
+                ('p95', percentile(latencies, 95)),
+                ('p99', percentile(latencies, 99)),
+                ('max', latencies[-1] if latencies else None),
+            )
+        },
+    }
+    if exhausted.is_set():
+        result['exhausted'] = True
+    if failures:
+        result['failures'] = sorted(set(failures))[:5]
+    return result
+
+
+def registered(app, method, path):
+    adapter = app.url_map.bind('localhost')
+    return adapter.test(path.split('?')[0], method=method)
+
+
+def _config_snapshot():
+    import config
+    return {
+        'pool_size': config.pool_config['pool_size'],
+        'cache': config.cache_config['enabled'],
+        'statements': config.statement_config['enabled'],
+        'coalesce': config.coalesce_config['enabled'],
+        'rollup': config.rollup_config['enabled'],
+    }
+
+
+def compare(baseline, current):
+    """打印与基线的对比：吞吐量和 p95/p99 的变化百分比"""
+    def change(old, new):
+        if not old or new is None:
+            return '-'
+        return f'{(new - old) / old * 100:+.1f}%'
+
+    print(f"{'route':<60} {'rps':>10} {'Δrps':>8} {'p95 ms':>9} {'Δp95':>8} {'p99 ms':>9} {'Δp99':>8}",
+          file=sys.stderr)
+    for name, result in current['routes'].items():
+        old = baseline['routes'].get(name)
+        latency = result['latency_ms']
+        if old is None:
+            deltas = ('new', 'new', 'new')
+        else:
+            deltas = (change(old['throughput_rps'], result['throughput_rps']),
+                      change(old['latency_ms']['p95'], latency['p95']),
+                      change(old['latency_ms']['p99'], latency['p99']))
+        print(f"{name:<60} {result['throughput_rps']:>10} {deltas[0]:>8} "
+              f"{latency['p95'] or '-':>9} {deltas[1]:>8} {latency['p99'] or '-':>9} {deltas[2]:>8}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', choices=['standin', 'mysql'], default='standin',
+                        help='standin: 嵌入式 SQLite 替身；mysql: config.py 中的 db_config')
+    parser.add_argument('--standin-path', help='替身库文件路径（默认使用临时文件）')
+    parser.add_argument('--rows', type=int, default=10000, help='每张表写入的种子数据行数')
+    parser.add_argument('--skip-seed', action='store_true', help='不写入种子数据，使用表中已有数据')
+    parser.add_argument('--clients', type=int, default=8, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=5, help='每个接口的压测时长（秒）')
+    parser.add_argument('--requests', type=int, default=0, help='每个接口最多发送的请求数，0 表示不限')
+    parser.add_argument('--batch-size', type=int, default=100, help='批量插入/删除接口每个请求的记录数')
+    parser.add_argument('--routes', nargs='*', default=[], help='只压测名称包含这些字符串的接口')
+    parser.add_argument('--output', help='结果 JSON 的输出文件（默认输出到标准输出）')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args()
+
+    # 压测进程自身的日志只保留警告以上
+    logging.disable(logging.INFO)
+    standin_path = None
+    if args.db == 'standin':
+        import standin
+        standin_path = args.standin_path or os.path.join(tempfile.mkdtemp(prefix='payment-bench-'), 'standin.db')
+        standin.install(standin_path)
+
+    from app import app
+    tables = [table for table in TABLES if registered(app, 'GET', f'/api/{table}')]
+    skipped = [table for table in TABLES if table not in tables]
+    if skipped:
+        print(f"skipping unregistered routes: {', '.join(skipped)}", file=sys.stderr)
+    ranges = id_ranges(tables) if args.skip_seed else seed(tables, args.rows)
+    # 父进程不再使用连接，释放后再启动服务进程
+    from utils.db import get_pool
+    get_pool().close_all()
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(args.db, standin_path, ready), daemon=True)
+    server.start()
+    port = ready.get(timeout=60)
+
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'db': args.db,
+            'rows': 0 if args.skip_seed else args.rows,
+            'clients': args.clients,
+            'duration_s': args.duration,
+            'batch_size': args.batch_size,
+            'python': platform.python_version(),
+            'config': _config_snapshot(),
+        },
+        'routes': {},
+    }
+    try:
+        for table in tables:
+            for name, method, make in scenarios(table, ranges[table], args.batch_size):
+                if args.routes and not any(pattern in name for pattern in args.routes):
+                    continue
+                result = run_scenario('127.0.0.1', port, method, make,
+                                      args.clients, args.duration, args.requests)
+                report['routes'][name] = {'method': method, **result}
+                latency = result['latency_ms']
+                print(f"{name:<60} {result['throughput_rps']:>10} rps  p50 {latency['p50']} ms  "
+                      f"p95 {latency['p95']} ms  p99 {latency['p99']} ms  errors {result['errors']}",
+                      file=sys.stderr)
+    finally:
+        server.terminate()
+        server.join()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+压测用的嵌入式数据库替身：用 SQLite 文件库模拟 mysql.connector.connect，
+在没有 MySQL 的环境中也能启动应用、跑完整的接口压测。
+
+只覆盖本项目用到的 SQL 写法（%s 占位符、DATE_FORMAT、MONTH、生成列 year、
+ON DUPLICATE KEY UPDATE、FOR UPDATE 等），测得的是应用层（Flask、连接池、序列化）的开销，
+数据库层的性能数据应以真实 MySQL 为准。
+"""
+import datetime
+import decimal
+import re
+import sqlite3
+
+import mysql.connector
+from mysql.connector import errors
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pension_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    personal_payment NUMERIC,
+    company_payment NUMERIC,
+    remarks TEXT,
+    year INT GENERATED ALWAYS AS (CAST(substr(date, 1, 4) AS INT)) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_pension_date ON pension_payments (date, id);
+CREATE TABLE IF NOT EXISTS social_security_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    personal_payment NUMERIC,
+    company_payment NUMERIC,
+    personal_account NUMERIC,
+    remarks TEXT,
+    year INT GENERATED ALWAYS AS (CAST(substr(date, 1, 4) AS INT)) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_social_security_date ON social_security_payments (date, id);
+CREATE TABLE IF NOT EXISTS medical_insurance_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    personal_payment NUMERIC,
+    company_payment NUMERIC,
+    personal_account NUMERIC,
+    remarks TEXT,
+    year INT GENERATED ALWAYS AS (CAST(substr(date, 1, 4) AS INT)) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_medical_insurance_date ON medical_insurance_payments (date, id);
+"""
+
+_DML = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _date_format(value, fmt):
+    if value is None:
+        return None
+    return datetime.date.fromisoformat(str(value)[:10]).strftime(fmt)
+
+
+def _month(value):
+    return int(str(value)[5:7]) if value else None
+
+
+def translate(sql):
+    """把 MySQL 写法改写为 SQLite 可执行的等价语句"""
+    sql = sql.replace('%s', '?').replace('@@session.auto_increment_increment', '1')
+    # SQLite 一条多行 INSERT 分配的 rowid 连续，相当于 innodb_autoinc_lock_mode = 1
+    sql = sql.replace('@@innodb_autoinc_lock_mode', '1')
+    sql = sql.replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET')
+    sql = re.sub(r'VALUES\((`?\w+`?)\)', r'excluded.\1', sql)
+    sql = sql.replace(' FOR UPDATE', '').replace(' LOCK IN SHARE MODE', '')
+    # SQLite 默认不支持 DELETE ... ORDER BY ... LIMIT，改写为按 id 子查询删除
+    return re.sub(r'^\s*DELETE FROM (\w+) WHERE (.+) ORDER BY (.+) LIMIT \?\s*$',
+                  r'DELETE FROM \1 WHERE id IN (SELECT id FROM \1 WHERE \2 ORDER BY \3 LIMIT ?)', sql, flags=re.S)
+
+
+def _param(value):
+    return str(value) if isinstance(value, (decimal.Decimal, datetime.date)) else value
+
+
+class StandInCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._result = None
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+
+    def execute(self, operation, params=(), multi=False):
+        try:
+            self._result = self._connection.db.execute(translate(operation), [_param(p) for p in params or ()])
+        except sqlite3.Error as e:
+            raise errors.DatabaseError(msg=str(e))
+        self.rowcount = self._result.rowcount
+        self.description = self._result.description
+        statement = operation.lstrip().upper()
+        if statement.startswith(_DML):
+            self._connection.in_transaction = True
+        if statement.startswith('INSERT') and self.rowcount > 0:
+            # MySQL 多行 INSERT 的 lastrowid 是第一行的 ID，SQLite 是最后一行
+            self.lastrowid = self._result.lastrowid - self.rowcount + 1
+
+    def executemany(self, operation, seq_params):
+        try:
+            self._result = self._connection.db.executemany(
+                translate(operation), [[_param(p) for p in params] for params in seq_params])
+        except sqlite3.Error as e:
+            raise errors.DatabaseError(msg=str(e))
+        self.rowcount = self._result.rowcount
+        self._connection.in_transaction = True
+
+    def fetchone(self):
+        row = self._result.fetchone()
+        return tuple(row) if row is not None else None
+
+    def fetchmany(self, size=1):
+        return [tuple(row) for row in self._result.fetchmany(size)]
+
+    def fetchall(self):
+        return [tuple(row) for row in self._result.fetchall()] if self._result is not None else []
+
+    def close(self):
+        pass
+
+
+class StandInDictCursor(StandInCursor):
+    def _record(self, row):
+        return dict(zip((column[0] for column in self.description), row))
+
+    def fetchone(self):
+        row = super().fetchone()
+        return self._record(row) if row is not None else None
+
+    def fetchmany(self, size=1):
+        return [self._record(row) for row in super().fetchmany(size)]
+
+    def fetchall(self):
+        return [self._record(row) for row in super().fetchall()]
+
+
+class StandInConnection:
+    """一个替身连接对应一个 SQLite 连接，事务语义沿用 SQLite 的隐式事务"""
+
+    def __init__(self, path, **kwargs):
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.create_function('DATE_FORMAT', 2, _date_format, deterministic=True)
+        self.db.create_function('MONTH', 1, _month, deterministic=True)
+        self.in_transaction = False
+        self.unread_result = False
+        self._closed = False
+
+    def cursor(self, dictionary=False, buffered=None, cursor_class=None, **kwargs):
+        return StandInDictCursor(self) if dictionary else StandInCursor(self)
+
+    def commit(self):
+        self.db.commit()
+        self.in_transaction = False
+
+    def rollback(self):
+        self.db.rollback()
+        self.in_transaction = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self._closed:
+            raise errors.InterfaceError(msg='Connection is closed')
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.db.close()
+
+    shutdown = close
+
+
+def install(path):
+    """
+    创建替身库的表结构，并把 mysql.connector.connect 替换为连接该 SQLite 文件。
+    需在应用首次获取数据库连接之前调用。
+    """
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.close()
+    mysql.connector.connect = lambda **kwargs: StandInConnection(path, **kwargs)
@@ -4,4 +4,196 @@ db_config = {
     'database': 'test',  # 替换为您的数据库名
     'user': 'test',          # 替换为您的数据库用户名
     'password': 'test'       # 替换为您的数据库密码
-}
\ No newline at end of file
+}
+
+# 数据库连接池配置
+pool_config = {
+    'pool_size': 10,          # 每个进程最多保持的连接数
+    'max_age': 1800,          # 连接最长存活时间（秒），超过后回收重建
+    'checkout_timeout': 5,    # 连接池已满时排队等待的最长时间（秒）
+    'ping_interval': 0        # 连接空闲超过该秒数时借出前先 ping 校验，0 表示每次借出都校验
+}
+
+# 只读副本配置（读写分离）：查询、汇总和导出接口路由到副本，写操作始终走主库；replicas 为空时全部走主库
+replica_config = {
+    'replicas': [
+        # 未列出的连接参数（database、user、password 等）沿用 db_config，例如本机第二个实例：
+        # {'host': '127.0.0.1', 'port': 3307, 'weight': 1},
+    ],
+    'balance': 'least_busy',    # weighted：按权重随机；least_busy：借出连接数/权重最小的副本
+    'sticky_seconds': 5,        # 客户端（或本进程）写入后该秒数内的读请求仍走主库，保证读到刚写入的数据
+    'max_lag_seconds': 5,       # 复制延迟超过该秒数的副本不使用；None 表示不检查（两个独立实例测试时使用）
+    'check_interval': 2,        # 查询副本复制延迟的间隔（秒），需要 REPLICATION CLIENT 权限
+    'retry_after': 10,          # 副本连接失败后暂停使用的秒数
+    'checkout_timeout': 1,      # 从副本连接池借连接的最长等待（秒），超时改用其他副本或主库
+    'client_header': None,      # 识别客户端的请求头（如 X-Client-Id），None 表示按客户端 IP 识别
+    'sticky_cookie': 'payment_primary_until'  # 写响应设置的 Cookie，多进程部署时其他工作进程据此走主库；None 表示不设置
+}
+
+# 导出接口配置
+export_config = {
+    'chunk_size': 1000        # 每次从游标读取并输出的记录数
+}
+
+# 批量插入校验配置
+validation_config = {
+    'max_errors': 1000        # 校验失败时响应中最多列出的错误数（error_count 为全部错误数）
+}
+
+# 流式批量导入配置
+ingest_config = {
+    'chunk_size': 1000,       # 默认每个分块的记录数，每个分块单独提交
+    'max_chunk_size': 10000   # 请求参数 chunk_size 允许的最大值
+}
+
+# 单条插入合并写入（group commit）配置
+coalesce_config = {
+    'enabled': False,         # 是否开启合并写入
+    'max_delay_ms': 5,        # 收集同一张表插入的最长等待时间（毫秒）
+    'max_batch': 100,         # 单次合并写入的最大行数，达到后立即写入
+    'wait_timeout': 10        # 请求等待写入结果的最长时间（秒）
+}
+
+# 单条插入的本地写入暂存（spool）配置：开启后插入接口把记录追加到本地日志并 fsync，返回 202 和暂存 ID，
+# 由后台线程成批重放到 MySQL，MySQL 变慢或重启期间插入接口仍然可用。开启前先执行 python3 -m utils.migrate up
+spool_config = {
+    'enabled': False,
+    'path': 'spool',          # 暂存目录（需位于本地磁盘），每个工作进程独占其中的一个通道子目录
+    'lanes': 16,              # 通道数上限，不少于 server_config['workers']
+    'node': None,             # 多台服务器写同一个数据库时区分各自通道的名称，None 表示使用主机名
+    'segment_bytes': 64 * 1024 * 1024,  # 单个分段文件的大小，写满后换新文件，全部重放后删除
+    'max_pending': 1000000,   # 每个通道最多积压的记录数，超过后插入接口返回 503
+    'batch_rows': 1000,       # 每批（一个事务）重放的最多记录数
+    'max_delay_ms': 50,       # 积压不足一批时等待更多记录的时间（毫秒）
+    'retry_interval': 1,      # 数据库不可用时重试重放的间隔（秒）
+    'retry_after': 5          # 返回 503 时响应头 Retry-After 的秒数
+}
+
+# 月度汇总表配置
+rollup_config = {
+    'enabled': False          # 开启前先执行 python3 -m utils.rollup rebuild 建表并初始化汇总
+}
+
+# 统计接口（/api/<表>/report）使用的进程内列式快照
+snapshot_config = {
+    'enabled': False,         # 开启后每个工作进程在内存中保存各表的日期和金额，约 22 字节/行
+    'tables': ['pension_payments', 'social_security_payments', 'medical_insurance_payments'],
+    'max_rows': 5000000,      # 超过该行数的表不载入快照，统计查询始终走 MySQL
+    'max_age': 300,           # 快照载入超过该秒数后重新载入（感知其他进程的写入），None 表示不限制
+    'retry_interval': 5,      # 两次载入之间的最短间隔（秒）
+    'fetch_size': 10000       # 载入时每次从游标读取的行数
+}
+
+# 准入控制配置：按路由类别限制每个工作进程同时执行和排队的请求数，超出时返回 429 和 Retry-After
+# read：查询、汇总、统计；write：单条插入和删除；bulk：/batch、/export 和按日期范围删除
+# 排队的请求同样占用工作线程，各类别 concurrency + queue 之和不宜超过 server_config['threads']，
+# 同时执行的请求数之和不宜超过 pool_config['pool_size']，批量导入时单条写入和查询仍有线程和连接可用
+admission_config = {
+    'enabled': False,
+    'classes': {
+        'read': {
+            'concurrency': 4,       # 同时执行的请求数
+            'queue': 2,             # 执行名额用完时最多排队的请求数，超过后立即拒绝
+            'queue_timeout': 1,     # 排队等待的最长时间（秒），超时拒绝
+            'retry_after': 1,       # 因并发拒绝时响应头 Retry-After 的秒数
+            'rate_limit': None      # 每个客户端的令牌桶限速，如 {'rate': 50, 'burst': 100}（每秒请求数、突发请求数）
+        },
+        'write': {
+            'concurrency': 2,
+            'queue': 2,
+            'queue_timeout': 1,
+            'retry_after': 1,
+            'rate_limit': None
+        },
+        'bulk': {
+            'concurrency': 1,
+            'queue': 0,
+            'queue_timeout': 0,
+            'retry_after': 5,
+            'rate_limit': None      # 如 {'rate': 1, 'burst': 2}，客户端以 replica_config['client_header'] 或 IP 区分
+        }
+    }
+}
+
+# 跨险种汇总接口（/api/statements）配置
+overview_config = {
+    'max_workers': 6,         # 每个进程并发执行各表汇总查询的线程数，同时占用的数据库连接不超过该值
+    'timeout': 10             # 等待单张表汇总查询的最长时间（秒），超时返回 504
+}
+
+# 查询结果缓存配置（进程内缓存，多进程部署时其他进程的写操作只能等 TTL 过期后可见）
+cache_config = {
+    'enabled': True,
+    'max_entries': 1024,              # 最多缓存的查询结果数，超过后淘汰最久未使用的
+    'ttl': 30,                        # 缓存有效期（秒）
+    'max_body_bytes': 1024 * 1024     # 超过该大小的响应不缓存
+}
+
+# 表变更版本号配置，查询缓存和 ETag 据此判断数据是否变化
+version_config = {
+    # memory：进程内，只适合单进程部署（多个工作进程时其他进程的写入要等缓存 TTL 过期才可见，304 也可能过期）；
+    # file：同一台机器上的工作进程通过 path 下的文件共享，重启后保留；auto：server_config['workers'] 大于 1 时为 file
+    'store': 'auto',
+    'path': 'versions',       # store 为 file 时版本号文件所在的目录
+    'etag': True              # 查询接口返回 ETag，请求头 If-None-Match 与之相同时返回 304，不访问数据库
+}
+
+# 响应压缩配置，按请求头 Accept-Encoding 协商编码
+compression_config = {
+    'enabled': True,
+    'algorithms': ['zstd', 'br', 'gzip'],  # 按优先顺序协商，zstd、br 需安装 zstandard、brotli 包，未安装时跳过
+    'min_size': 1024,         # 小于该字节数的响应不压缩（流式导出的大小未知，总是压缩）
+    'gzip_level': 6,          # 1-9，越大压缩率越高、越耗 CPU
+    'zstd_level': 3,          # 1-22
+    'brotli_quality': 4,      # 0-11，动态内容不宜过高
+    'mimetypes': ['application/json', 'application/x-ndjson', 'text/csv', 'text/plain']
+}
+
+# 预处理语句配置
+statement_config = {
+    'enabled': True,            # 查询、单条插入和删除接口使用服务端预处理语句
+    'max_per_connection': 64    # 每个连接最多保留的预处理语句数，超过后关闭最久未使用的
+}
+
+# 监控指标配置（/metrics，Prometheus 文本格式）
+metrics_config = {
+    'enabled': True             # 统计各路由的请求数、延迟、数据库等待与执行时间、返回行数和批量大小
+}
+
+# 请求分析配置
+profiling_config = {
+    'enabled': False,           # 管理开关：对所有请求开启分析（也可通过 POST /api/admin/profiling 切换）
+    'header': 'X-Profile',      # 请求带有该请求头时只分析该请求，值为 cprofile 时同时运行 cProfile
+    'header_enabled': False,    # 是否接受上述请求头；关闭时客户端不能自行触发分析（cProfile 开销较大）
+    'admin_token': None,        # /api/admin/ 管理接口的共享密钥，请求需带 X-Admin-Token 请求头；None 表示只允许本机访问
+    'slow_threshold_ms': 500,   # 被分析的请求超过该耗时（毫秒）写入慢请求日志
+    'slow_log_size': 200,       # 内存中保留的慢请求条数
+    'recent_size': 100,         # 内存中保留的最近分析结果条数，可按 X-Profile-Id 查看
+    'slow_log_file': None       # 慢请求同时写入的滚动日志文件路径，None 表示不写文件
+}
+
+# 删除接口配置
+delete_config = {
+    'batch_chunk_size': 1000,   # 批量删除时每个事务最多删除的 ID 数，超过后分多个事务提交
+    'range_chunk_size': 1000,   # 按日期范围删除时每个事务最多删除的行数
+    'max_range_chunk_size': 10000,  # 请求参数 chunk_size 允许的最大值
+    'range_pause_ms': 10        # 范围删除两个分块之间的暂停（毫秒），给复制和其他写入留出空间
+}
+
+# 生产环境启动器配置（python3 serve.py，命令行参数可覆盖）
+server_config = {
+    'app': 'app:app',           # 默认托管的 WSGI 应用（模块:变量）
+    'host': '0.0.0.0',
+    'port': 5003,
+    'extra_ports': [5000, 5001],  # 同时监听的兼容端口：原独立插入服务的端口（5000 医保、5001 养老），旧客户端无需修改地址
+    'workers': 4,               # 工作进程数；每个进程有自己的连接池，数据库连接总数最多 workers * pool_size
+    'threads': 8,               # 每个工作进程同时处理的连接数，不宜超过 pool_size
+    'backlog': 2048,            # 监听队列长度
+    'timeout': 30,              # 读取请求超过该秒数的慢客户端直接断开，避免占满工作线程
+    'max_requests': 10000,      # 工作进程处理该数量请求后平滑退出并由主进程重新启动，0 表示不回收
+    'max_requests_jitter': 1000,  # 在 max_requests 上随机增加的请求数，避免所有工作进程同时回收
+    'graceful_timeout': 30,     # 平滑停止或重载时等待进行中请求完成的最长时间（秒）
+    'preload': False,           # 在主进程预先导入应用（fork 后共享内存，但 HUP 重载不会加载新代码）
+    'access_log': False,        # 是否记录每个请求的访问日志
+    'pid_file': None            # 主进程 PID 文件路径，用于 kill -HUP $(cat ...) 平滑重载
+}
@@ -0,0 +1,34 @@
+-- 三张缴费明细表。year 为 date 的生成列（按年份过滤、按年汇总），
+-- 金额使用 DECIMAL 避免浮点误差；表已存在时不做修改，缺少的索引由后续版本补齐。
+
+CREATE TABLE IF NOT EXISTS `pension_payments` (
+    `id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    `date` DATE NOT NULL,
+    `personal_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `company_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `remarks` VARCHAR(255) NULL,
+    `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED,
+    PRIMARY KEY (`id`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `social_security_payments` (
+    `id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    `date` DATE NOT NULL,
+    `personal_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `company_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `personal_account` DECIMAL(12, 2) NULL,
+    `remarks` VARCHAR(255) NULL,
+    `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED,
+    PRIMARY KEY (`id`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `medical_insurance_payments` (
+    `id` INT UNSIGNED NOT NULL AUTO_INCREMENT,
+    `date` DATE NOT NULL,
+    `personal_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `company_payment` DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    `personal_account` DECIMAL(12, 2) NULL,
+    `remarks` VARCHAR(255) NULL,
+    `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED,
+    PRIMARY KEY (`id`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
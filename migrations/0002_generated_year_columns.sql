@@ -0,0 +1,13 @@
+-- 早于 0001 建立的表可能没有 year 生成列或 personal_account 列（列已存在时跳过该语句）。
+
+ALTER TABLE `pension_payments`
+    ADD COLUMN `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED;
+
+ALTER TABLE `social_security_payments`
+    ADD COLUMN `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED;
+
+ALTER TABLE `medical_insurance_payments`
+    ADD COLUMN `year` SMALLINT GENERATED ALWAYS AS (YEAR(`date`)) STORED;
+
+ALTER TABLE `medical_insurance_payments`
+    ADD COLUMN `personal_account` DECIMAL(12, 2) NULL AFTER `company_payment`;
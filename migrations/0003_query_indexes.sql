@@ -0,0 +1,17 @@
+-- 与各接口访问模式对应的索引（InnoDB 二级索引隐含主键 id，因此 (date) 即 (date, id)）：
+--   idx_date              日期范围过滤 + 游标分页 ORDER BY date DESC, id DESC；导出和范围删除 ORDER BY date, id
+--   idx_year_date         year = ? 过滤，按年/按月汇总（含金额列，汇总时只读索引不回表）
+--   idx_personal_payment  社保查询按 personal_payment 精确过滤，组内按 date 排序
+--   idx_company_payment   社保查询按 company_payment 精确过滤，组内按 date 排序
+-- 每条语句只加一个索引，已存在的索引跳过不影响其他索引。
+
+ALTER TABLE `pension_payments` ADD INDEX `idx_date` (`date`);
+ALTER TABLE `pension_payments` ADD INDEX `idx_year_date` (`year`, `date`, `personal_payment`, `company_payment`);
+
+ALTER TABLE `social_security_payments` ADD INDEX `idx_date` (`date`);
+ALTER TABLE `social_security_payments` ADD INDEX `idx_year_date` (`year`, `date`, `personal_payment`, `company_payment`);
+ALTER TABLE `social_security_payments` ADD INDEX `idx_personal_payment` (`personal_payment`, `date`);
+ALTER TABLE `social_security_payments` ADD INDEX `idx_company_payment` (`company_payment`, `date`);
+
+ALTER TABLE `medical_insurance_payments` ADD INDEX `idx_date` (`date`);
+ALTER TABLE `medical_insurance_payments` ADD INDEX `idx_year_date` (`year`, `date`, `personal_payment`, `company_payment`);
@@ -0,0 +1,11 @@
+-- 月度汇总表（utils/rollup.py，rollup_config['enabled'] 开启前执行 python3 -m utils.rollup rebuild 初始化数据）。
+
+CREATE TABLE IF NOT EXISTS `payment_monthly_rollups` (
+    `table_name` VARCHAR(64) NOT NULL,
+    `year` SMALLINT NOT NULL,
+    `month` TINYINT NOT NULL,
+    `record_count` INT NOT NULL DEFAULT 0,
+    `personal_total` DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    `company_total` DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`table_name`, `year`, `month`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
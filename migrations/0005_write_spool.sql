@@ -0,0 +1,20 @@
+-- 写入暂存（utils/spool.py）的重放进度：每个通道已写入缴费表的最大序号，与重放的记录在同一事务中更新，
+-- 重启后重放时跳过已提交的序号，保证每条暂存记录只写入一次。
+-- 数据库拒绝的记录（如备注超长）连同错误信息记入 spool_rejected，不阻塞后续记录。
+
+CREATE TABLE IF NOT EXISTS `spool_progress` (
+    `lane` VARCHAR(128) NOT NULL,
+    `seq` BIGINT UNSIGNED NOT NULL,
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`lane`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `spool_rejected` (
+    `lane` VARCHAR(128) NOT NULL,
+    `seq` BIGINT UNSIGNED NOT NULL,
+    `table_name` VARCHAR(64) NOT NULL,
+    `record` TEXT NOT NULL,
+    `error` VARCHAR(1024) NOT NULL,
+    `rejected_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`lane`, `seq`)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
@@ -1,13 +1,48 @@
 from flask import Blueprint, request, jsonify
-import mysql.connector
 from mysql.connector import Error
 from utils.db import get_db_connection
+from utils.pagination import PaginationError, parse_pagination, paginate_query, split_page, page_info
+from utils.export import ExportError, parse_export_args, export_response
+from utils.rollup import SummaryError, parse_summary_args, query_summary, record_inserted, record_deleting
+from utils.snapshot import ReportError, parse_report_args, query_report
+from utils.versions import bumps_version
+from utils.cache import cached_response
+from utils.ingest import IngestError, stream_format, parse_chunk_size, iter_records, ingest_records, ingest_response
+from utils.rows import to_records
+from utils.statements import execute, fetch_all
+from utils.deletes import DeleteError, parse_range_args, delete_ids, delete_range
+from utils.metrics import observe_batch_size
+from utils.spool import SpoolUnavailableError, spooling_enabled, get_spool
+from utils.validation import BatchValidator, error_report
 
-social_security_bp = Blueprint('medical_insurance', __name__)
+medical_insurance_bp = Blueprint('medical_insurance', __name__)
+
+# 必需字段常量
+REQUIRED_FIELDS = ['date', 'personal_payment', 'company_payment', 'remarks']
+
+# 写入的列；personal_account 为可选字段（原独立医保插入服务要求提供），未提供时写入 NULL
+INSERT_COLUMNS = ['date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
+
+# 查询接口返回的列
+QUERY_COLUMNS = ['id', 'date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
+
+# 批量插入的校验规则：日期格式，金额为非负数，personal_account 可以缺省
+BATCH_VALIDATOR = BatchValidator(REQUIRED_FIELDS, amounts=['personal_payment', 'company_payment'],
+                                 optional_amounts=['personal_account'])
+
+# 批量插入时单条记录对应的 VALUES 参数
+def record_values(record):
+    # CSV 导入无法表示 null，personal_account 为空字符串时同样写入 NULL
+    personal_account = record.get('personal_account')
+    return (record['date'], record['personal_payment'], record['company_payment'],
+            None if personal_account == '' else personal_account, record['remarks'])
 
 # 插入单条社保缴纳记录的接口
-@social_security_bp.route('/medical_insurance_payments', methods=['POST'])
+@medical_insurance_bp.route('/medical_insurance_payments', methods=['POST'])
+@bumps_version('medical_insurance_payments')
 def insert_social_security_payment():
+    connection = None
+    cursor = None
     try:
         data = request.get_json()
         required_fields = ['date', 'personal_payment', 'company_payment', 'remarks']
@@ -15,88 +50,126 @@ def insert_social_security_payment():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        date = data['date']
-        personal_payment = data['personal_payment']
-        company_payment = data['company_payment']
-        remarks = data['remarks']
+        # 开启写入暂存时追加到本地日志后即返回，由后台线程重放到数据库；无法事后拒绝，因此先校验日期和金额
+        if spooling_enabled():
+            errors = BATCH_VALIDATOR.validate([data])
+            if errors:
+                return jsonify({'error': errors[0]['error']}), 400
+            spool_id = get_spool().append('medical_insurance_payments', INSERT_COLUMNS, record_values(data))
+            return jsonify({
+                'message': 'medical insurance record accepted',
+                'spool_id': spool_id
+            }), 202
         
         connection, cursor = get_db_connection()
         
         insert_query = """
         INSERT INTO `medical_insurance_payments` 
-        (`date`, `personal_payment`, `company_payment`, `remarks`) 
-        VALUES (%s, %s, %s, %s)
+        (`date`, `personal_payment`, `company_payment`, `personal_account`, `remarks`) 
+        VALUES (%s, %s, %s, %s, %s)
         """
-        values = (date, personal_payment, company_payment, remarks)
+        values = record_values(data)
+        
+        result = execute(connection, insert_query, values)
         
-        cursor.execute(insert_query, values)
+        record_inserted(connection, 'medical_insurance_payments', [values])
         connection.commit()
         
         return jsonify({
             'message': 'medical insurance record inserted successfully',
-            'id': cursor.lastrowid
+            'id': result.lastrowid
         }), 201
         
+    except SpoolUnavailableError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Error as e:
         return jsonify({'error': str(e)}), 500
         
     finally:
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
 # 批量插入社保缴纳记录的接口
-@social_security_bp.route('/medical_insurance_payments/batch', methods=['POST'])
+@medical_insurance_bp.route('/medical_insurance_payments/batch', methods=['POST'])
+@bumps_version('medical_insurance_payments')
 def insert_social_security_payments_batch():
+    connection = None
+    cursor = None
     try:
+        # NDJSON/CSV 请求体走流式分块导入
+        fmt = stream_format(request)
+        if fmt:
+            report = ingest_records(
+                iter_records(request, fmt), 'medical_insurance_payments', INSERT_COLUMNS,
+                BATCH_VALIDATOR, record_values, parse_chunk_size(request.args)
+            )
+            return ingest_response(report, 'medical insurance')
+        
         data = request.get_json()
         
         if not isinstance(data, list):
             return jsonify({'error': 'Request body must be a list of records'}), 400
         
-        required_fields = ['date', 'personal_payment', 'company_payment', 'remarks']
-        for record in data:
-            for field in required_fields:
-                if field not in record:
-                    return jsonify({'error': f'Missing required field in record: {field}'}), 400
+        errors = BATCH_VALIDATOR.validate(data)
+        if errors:
+            return jsonify(error_report(errors, len(data))), 400
         
         connection, cursor = get_db_connection()
         
         insert_query = """
         INSERT INTO `medical_insurance_payments` 
-        (`date`, `personal_payment`, `company_payment`, `remarks`) 
-        VALUES (%s, %s, %s, %s)
+        (`date`, `personal_payment`, `company_payment`, `personal_account`, `remarks`) 
+        VALUES (%s, %s, %s, %s, %s)
         """
         
-        values = [(record['date'], record['personal_payment'], record['company_payment'], record['remarks']) for record in data]
+        observe_batch_size(len(data))
+        values = [record_values(record) for record in data]
         
         cursor.executemany(insert_query, values)
+        
+        record_inserted(connection, 'medical_insurance_payments', values)
         connection.commit()
         
         return jsonify({
-            'message': f'Successfully inserted {cursor.rowcount} social security records',
+            'message': f'Successfully inserted {cursor.rowcount} medical insurance records',
             'inserted_count': cursor.rowcount
         }), 201
         
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
     except Error as e:
         return jsonify({'error': str(e)}), 500
         
     finally:
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
 # 查询社保缴纳记录的接口
-@social_security_bp.route('/medical_insurance_payments', methods=['GET'])
+@medical_insurance_bp.route('/medical_insurance_payments', methods=['GET'])
+@cached_response('medical_insurance_payments')
 def query_social_security_payments():
+    connection = None
+    cursor = None
     try:
         id = request.args.get('id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        connection, cursor = get_db_connection(dictionary=True)
+        # 提供 cursor/page/per_page 时分页返回，否则保持原有行为返回全部记录
+        pagination = None
+        if any(key in request.args for key in ('cursor', 'page', 'per_page')):
+            try:
+                pagination = parse_pagination(request.args)
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
         
-        query = "SELECT id, date, personal_payment, company_payment, remarks FROM medical_insurance_payments WHERE 1=1"
+        connection, cursor = get_db_connection(read_table='medical_insurance_payments')
+        
+        query = f"SELECT {', '.join(QUERY_COLUMNS)} FROM medical_insurance_payments WHERE 1=1"
         params = []
         
         if id:
@@ -108,53 +181,116 @@ def query_social_security_payments():
         if end_date:
             query += " AND date <= %s"
             params.append(end_date)
+        if pagination:
+            query = paginate_query(query, params, pagination)
         
-        cursor.execute(query, params)
-        records = cursor.fetchall()
+        records = to_records(QUERY_COLUMNS, fetch_all(connection, query, params))
+        page_fields = {}
+        if pagination:
+            records, next_cursor = split_page(records, pagination)
+            page_fields = page_info(pagination, next_cursor)
         
         return jsonify({
             'message': 'Query successful',
             'records': records,
-            'count': len(records)
+            'count': len(records),
+            **page_fields
         }), 200
         
     except Error as e:
         return jsonify({'error': str(e)}), 500
         
     finally:
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
-# 删除单条社保缴纳记录的接口
-@social_security_bp.route('/medical_insurance_payments/<int:id>', methods=['DELETE'])
+# 流式导出医保缴纳记录的接口
+@medical_insurance_bp.route('/medical_insurance_payments/export', methods=['GET'])
+def export_medical_insurance_payments():
+    try:
+        start_date, end_date, fmt = parse_export_args(request.args)
+        return export_response(
+            'medical_insurance_payments',
+            QUERY_COLUMNS,
+            start_date, end_date, fmt
+        )
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# 按月/按年汇总医保缴纳金额的接口
+@medical_insurance_bp.route('/medical_insurance_payments/summary', methods=['GET'])
+@cached_response('medical_insurance_payments')
+def summarize_medical_insurance_payments():
+    try:
+        group_by, start_date, end_date = parse_summary_args(request.args)
+        records = query_summary('medical_insurance_payments', group_by, start_date, end_date)
+        return jsonify({
+            'message': 'Query successful',
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except SummaryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# 按日期范围和金额条件统计医保缴纳记录的接口（开启 snapshot_config 时由进程内快照回答）
+@medical_insurance_bp.route('/medical_insurance_payments/report', methods=['GET'])
+@cached_response('medical_insurance_payments')
+def report_medical_insurance_payments():
+    try:
+        start_date, end_date, ranges, group_by = parse_report_args(request.args)
+        records, source = query_report('medical_insurance_payments', start_date, end_date, ranges, group_by)
+        return jsonify({
+            'message': 'Query successful',
+            'source': source,
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# 删除单条社保缴纳记录的接口，按影响行数判断记录是否存在
+@medical_insurance_bp.route('/medical_insurance_payments/<int:id>', methods=['DELETE'])
+@bumps_version('medical_insurance_payments')
 def delete_social_security_payment(id):
+    connection = None
+    cursor = None
     try:
         connection, cursor = get_db_connection()
         
-        check_query = "SELECT id FROM medical_insurance_payments WHERE id = %s"
-        cursor.execute(check_query, (id,))
-        if not cursor.fetchone():
-            return jsonify({'error': f'Social security record with id {id} not found'}), 404
-        
         delete_query = "DELETE FROM medical_insurance_payments WHERE id = %s"
-        cursor.execute(delete_query, (id,))
+        record_deleting(connection, 'medical_insurance_payments', [id])
+        result = execute(connection, delete_query, (id,))
+        if not result.rowcount:
+            connection.rollback()
+            return jsonify({'error': f'Medical insurance record with id {id} not found'}), 404
         connection.commit()
         
         return jsonify({
-            'message': f'Social security record with id {id} deleted successfully'
+            'message': f'Medical insurance record with id {id} deleted successfully'
         }), 200
         
     except Error as e:
         return jsonify({'error': str(e)}), 500
         
     finally:
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
-# 批量删除社保缴纳记录的接口
-@social_security_bp.route('/medical_insurance_payments/batch', methods=['DELETE'])
+# 批量删除社保缴纳记录的接口，ID 较多时分块删除，每块一个事务
+@medical_insurance_bp.route('/medical_insurance_payments/batch', methods=['DELETE'])
+@bumps_version('medical_insurance_payments')
 def delete_social_security_payments_batch():
     try:
         data = request.get_json()
@@ -165,29 +301,37 @@ def delete_social_security_payments_batch():
         if not data:
             return jsonify({'error': 'ID list cannot be empty'}), 400
         
-        connection, cursor = get_db_connection()
-        
-        check_query = "SELECT id FROM medical_insurance_payments WHERE id IN (%s)" % ','.join(['%s'] * len(data))
-        cursor.execute(check_query, data)
-        existing_ids = [row[0] for row in cursor.fetchall()]
+        observe_batch_size(len(data))
+        deleted_ids, missing_ids = delete_ids('medical_insurance_payments', data)
         
-        if not existing_ids:
-            return jsonify({'error': 'No social security records found for provided IDs'}), 404
-        
-        delete_query = "DELETE FROM medical_insurance_payments WHERE id IN (%s)" % ','.join(['%s'] * len(existing_ids))
-        cursor.execute(delete_query, existing_ids)
-        connection.commit()
+        if not deleted_ids:
+            return jsonify({
+                'error': 'No medical insurance records found for provided IDs',
+                'missing_ids': missing_ids
+            }), 404
         
         return jsonify({
-            'message': f'Successfully deleted {cursor.rowcount} social security records',
-            'deleted_count': cursor.rowcount,
-            'deleted_ids': existing_ids
+            'message': f'Successfully deleted {len(deleted_ids)} medical insurance records',
+            'deleted_count': len(deleted_ids),
+            'deleted_ids': deleted_ids,
+            'missing_ids': missing_ids
         }), 200
         
     except Error as e:
         return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
\ No newline at end of file
+
+# 按日期范围删除医保缴纳记录的接口（start_date、end_date 必填，含两端），分块提交
+@medical_insurance_bp.route('/medical_insurance_payments', methods=['DELETE'])
+@bumps_version('medical_insurance_payments')
+def delete_medical_insurance_payments_range():
+    try:
+        start_date, end_date, chunk_size = parse_range_args(request.args)
+        result = delete_range('medical_insurance_payments', start_date, end_date, chunk_size)
+        return jsonify({
+            'message': f"Successfully deleted {result['deleted_count']} medical insurance records",
+            **result
+        }), 200
+    except DeleteError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,18 +1,48 @@
 from flask import Blueprint, request, jsonify
 from mysql.connector import Error
 from utils.db import get_db_connection
-from datetime import datetime, date
+from utils.pagination import PaginationError, parse_pagination, paginate_query, split_page, page_info
+from utils.rows import select_list, cursor_key, to_records
+from utils.export import ExportError, parse_export_args, export_response
+from utils.rollup import SummaryError, parse_summary_args, query_summary, record_inserted, record_deleting
+from utils.snapshot import ReportError, parse_report_args, query_report
+from utils.ingest import stream_format, parse_chunk_size, iter_records, ingest_records, ingest_response
+from utils.versions import bumps_version
+from utils.cache import cached_response
+from utils.coalescer import coalescing_enabled, get_coalescer
+from utils.spool import SpoolUnavailableError, spooling_enabled, get_spool
+from utils.statements import execute, fetch_all
+from utils.deletes import DeleteError, parse_range_args, delete_ids, delete_range
+from utils.metrics import observe_batch_size
+from utils.validation import BatchValidator, error_report
+from datetime import datetime
 import logging
+import os
 
-# 配置日志记录，用于调试日期格式化和错误
-logging.basicConfig(level=logging.DEBUG)
+# 配置日志记录，级别由环境变量控制（与社保路由相同，不在生产环境输出 DEBUG 日志）
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=getattr(logging, log_level, logging.INFO), filename='app.log')
 logger = logging.getLogger(__name__)
 
 # 创建 Flask 蓝图，用于组织养老缴纳相关的路由
 pension_bp = Blueprint('pension', __name__)
 
+# 必需字段常量
+REQUIRED_FIELDS = ['date', 'personal_payment', 'company_payment', 'remarks']
+
+# 查询接口返回的列
+QUERY_COLUMNS = ['id', 'date', 'personal_payment', 'company_payment', 'remarks']
+
+# 批量插入的校验规则：日期格式，个人和公司缴纳金额为非负数
+BATCH_VALIDATOR = BatchValidator(REQUIRED_FIELDS, amounts=['personal_payment', 'company_payment'])
+
+def record_values(record):
+    """批量插入时单条记录对应的 VALUES 参数"""
+    return (record['date'], record['personal_payment'], record['company_payment'], record['remarks'])
+
 # 插入单条养老缴纳记录的接口
 @pension_bp.route('/pension_payments', methods=['POST'])
+@bumps_version('pension_payments')
 def insert_pension_payment():
     """
     插入单条养老缴纳记录，需提供日期（YYYY-MM-DD 格式）、个人缴纳金额、公司缴纳金额和备注。
@@ -45,6 +75,26 @@ def insert_pension_payment():
         except ValueError:
             return jsonify({'error': 'Date must be in YYYY-MM-DD format'}), 400
         
+        # 开启写入暂存时追加到本地日志后即返回，由后台线程重放到数据库；无法事后拒绝，因此先校验金额
+        if spooling_enabled():
+            errors = BATCH_VALIDATOR.validate([data])
+            if errors:
+                return jsonify({'error': errors[0]['error']}), 400
+            spool_id = get_spool().append('pension_payments', REQUIRED_FIELDS, record_values(data))
+            return jsonify({
+                'message': 'Pension record accepted',
+                'spool_id': spool_id
+            }), 202
+        
+        # 开启合并写入时交给后台写线程与其他请求合并提交
+        if coalescing_enabled():
+            record_id = get_coalescer('pension_payments', REQUIRED_FIELDS).submit(
+                (date, personal_payment, company_payment, remarks))
+            return jsonify({
+                'message': 'Pension record inserted successfully',
+                'id': record_id
+            }), 201
+        
         # 获取数据库连接和游标
         connection, cursor = get_db_connection()
         
@@ -56,16 +106,21 @@ def insert_pension_payment():
         """
         values = (date, personal_payment, company_payment, remarks)
         
-        # 执行插入操作并提交
-        cursor.execute(insert_query, values)
+        # 执行插入操作并提交（复用连接上已预处理的语句）
+        result = execute(connection, insert_query, values)
+        record_inserted(connection, 'pension_payments', [values])
         connection.commit()
         
         # 返回插入成功的响应，包括新记录的 ID
         return jsonify({
             'message': 'Pension record inserted successfully',
-            'id': cursor.lastrowid
+            'id': result.lastrowid
         }), 201
         
+    except SpoolUnavailableError as e:
+        # 暂存积压过多或本地磁盘写入失败，返回 503 让客户端稍后重试
+        logger.error(f"Spool error: {str(e)}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Error as e:
         # 捕获 MySQL 错误，返回 500 状态码
         logger.error(f"Database error: {str(e)}")
@@ -84,14 +139,26 @@ def insert_pension_payment():
 
 # 批量插入养老缴纳记录的接口
 @pension_bp.route('/pension_payments/batch', methods=['POST'])
+@bumps_version('pension_payments')
 def insert_pension_payments_batch():
     """
     批量插入养老缴纳记录，需提供记录列表，每条记录包含日期（YYYY-MM-DD 格式）、个人缴纳金额、公司缴纳金额和备注。
     验证日期格式和必需字段。
+    请求体为 NDJSON（application/x-ndjson）或 CSV（text/csv，可 gzip 压缩）时流式分块导入，
+    每 chunk_size 条记录提交一次，无效记录跳过并在响应中逐块报告。
     """
     connection = None
     cursor = None
     try:
+        # NDJSON/CSV 请求体走流式分块导入
+        fmt = stream_format(request)
+        if fmt:
+            report = ingest_records(
+                iter_records(request, fmt), 'pension_payments', REQUIRED_FIELDS,
+                BATCH_VALIDATOR, record_values, parse_chunk_size(request.args)
+            )
+            return ingest_response(report, 'pension')
+        
         # 验证请求是否为 JSON 格式
         if not request.is_json:
             return jsonify({'error': 'Content-Type must be application/json'}), 400
@@ -101,17 +168,10 @@ def insert_pension_payments_batch():
         if not isinstance(data, list):
             return jsonify({'error': 'Request body must be a list of records'}), 400
         
-        required_fields = ['date', 'personal_payment', 'company_payment', 'remarks']
-        # 检查每条记录的必需字段和日期格式
-        for record in data:
-            for field in required_fields:
-                if field not in record:
-                    return jsonify({'error': f'Missing required field in record: {field}'}), 400
-            # 验证日期格式
-            try:
-                datetime.strptime(record['date'], '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': f"Date must be in YYYY-MM-DD format in record: {record}"}), 400
+        # 一次校验全部记录的必需字段、日期格式和金额，返回所有错误
+        errors = BATCH_VALIDATOR.validate(data)
+        if errors:
+            return jsonify(error_report(errors, len(data))), 400
         
         # 获取数据库连接和游标
         connection, cursor = get_db_connection()
@@ -124,10 +184,12 @@ def insert_pension_payments_batch():
         """
         
         # 准备批量插入的数据
-        values = [(record['date'], record['personal_payment'], record['company_payment'], record['remarks']) for record in data]
+        observe_batch_size(len(data))
+        values = [record_values(record) for record in data]
         
         # 执行批量插入并提交
         cursor.executemany(insert_query, values)
+        record_inserted(connection, 'pension_payments', values)
         connection.commit()
         
         # 返回插入成功的响应，包括插入的记录数
@@ -154,12 +216,15 @@ def insert_pension_payments_batch():
 
 # 查询养老缴纳记录的接口
 @pension_bp.route('/pension_payments', methods=['GET'])
+@cached_response('pension_payments')
 def query_pension_payments():
     """
     查询养老缴纳记录，支持按 ID、日期范围和年份过滤，默认返回最新 20 条记录。
-    返回的 date 字段格式为 YYYY-MM（例如 "2023-01"）。
-    支持 datetime.date、datetime.datetime 和字符串格式的日期，记录解析失败的日志。
+    支持游标分页（cursor, per_page），响应中的 next_cursor 用于获取下一页；兼容 page/per_page 偏移分页。
+    返回的 date 字段格式为 YYYY-MM（例如 "2023-01"），由 MySQL 在查询中格式化。
     """
+    connection = None
+    cursor = None
     try:
         # 获取查询参数：记录 ID、开始日期、结束日期、年份
         id = request.args.get('id')
@@ -167,11 +232,17 @@ def query_pension_payments():
         end_date = request.args.get('end_date')
         year = request.args.get('year')
         
-        # 获取数据库连接和游标，dictionary=True 使查询结果返回字典格式
-        connection, cursor = get_db_connection(dictionary=True)
+        # 解析分页参数
+        try:
+            pagination = parse_pagination(request.args)
+        except PaginationError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 获取数据库连接和游标，查询结果为元组，按 QUERY_COLUMNS 转换为记录
+        connection, cursor = get_db_connection(read_table='pension_payments')
         
         # 基础 SQL 查询，WHERE 1=1 便于动态添加条件
-        query = "SELECT id, date, personal_payment, company_payment, remarks FROM pension_payments WHERE 1=1"
+        query = f"SELECT {select_list(QUERY_COLUMNS)} FROM pension_payments WHERE 1=1"
         params = []
         
         # 如果提供了 ID，添加 ID 过滤条件
@@ -195,48 +266,19 @@ def query_pension_payments():
             except ValueError:
                 return jsonify({'error': 'Year must be a valid integer'}), 400
         
-        # 默认按日期降序排序，限制返回 20 条记录
-        query += " ORDER BY date DESC LIMIT 20"
+        # 按 (date, id) 降序分页，默认每页 20 条记录
+        query = paginate_query(query, params, pagination)
         
         # 执行查询，获取结果
-        cursor.execute(query, params)
-        records = cursor.fetchall()
-        
-        # 格式化每条记录的 date 字段为 YYYY-MM
-        for record in records:
-            date_value = record['date']
-            if date_value:
-                if isinstance(date_value, (datetime, date)):
-                    # 处理 datetime.datetime 或 datetime.date，直接格式化为 YYYY-MM
-                    record['date'] = date_value.strftime('%Y-%m')
-                elif isinstance(date_value, str):
-                    # 处理字符串格式的日期，尝试多种解析格式
-                    try:
-                        # 尝试解析 RFC 1123 格式（例如 "Tue, 01 Dec 2020 00:00:00 GMT"）
-                        parsed_date = datetime.strptime(date_value, '%a, %d %b %Y %H:%M:%S %Z')
-                        record['date'] = parsed_date.strftime('%Y-%m')
-                    except ValueError:
-                        try:
-                            # 尝试解析 YYYY-MM-DD 格式
-                            parsed_date = datetime.strptime(date_value, '%Y-%m-%d')
-                            record['date'] = parsed_date.strftime('%Y-%m')
-                        except ValueError:
-                            # 记录解析失败的日期值
-                            logger.error(f"Failed to parse date string: {date_value} for record ID: {record['id']}")
-                            record['date'] = None
-                else:
-                    # 记录不支持的日期类型
-                    logger.error(f"Unsupported date type: {type(date_value)} for record ID: {record['id']}")
-                    record['date'] = None
-            else:
-                # 如果 date 为空或 None，保持 None
-                record['date'] = None
+        rows, next_cursor = split_page(fetch_all(connection, query, params), pagination, key=cursor_key)
+        records = to_records(QUERY_COLUMNS, rows)
         
         # 返回查询成功的 JSON 响应
         return jsonify({
             'message': 'Query successful',
             'records': records,
-            'count': len(records)
+            'count': len(records),
+            **page_info(pagination, next_cursor)
         }), 200
         
     except Error as e:
@@ -246,12 +288,85 @@ def query_pension_payments():
         
     finally:
         # 关闭游标和数据库连接（如果已连接）
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
+# 流式导出养老缴纳记录的接口
+@pension_bp.route('/pension_payments/export', methods=['GET'])
+def export_pension_payments():
+    """
+    按日期范围流式导出养老缴纳记录，支持 format=ndjson（默认）或 csv。
+    分块读取并边查边输出，导出大量记录时内存占用保持平稳。
+    """
+    try:
+        start_date, end_date, fmt = parse_export_args(request.args)
+        return export_response(
+            'pension_payments',
+            QUERY_COLUMNS,
+            start_date, end_date, fmt
+        )
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        # 捕获 MySQL 错误，返回 500 状态码
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# 按月/按年汇总养老缴纳金额的接口
+@pension_bp.route('/pension_payments/summary', methods=['GET'])
+@cached_response('pension_payments')
+def summarize_pension_payments():
+    """
+    按月（group_by=month，默认）或按年（group_by=year）汇总养老缴纳金额，支持 start_date/end_date 过滤。
+    日期范围按所在月份整月计算，返回每个周期的记录数、个人/公司缴纳合计和总额。
+    """
+    try:
+        group_by, start_date, end_date = parse_summary_args(request.args)
+        records = query_summary('pension_payments', group_by, start_date, end_date)
+        return jsonify({
+            'message': 'Query successful',
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except SummaryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        # 捕获 MySQL 错误，返回 500 状态码
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# 按日期范围和金额条件统计养老缴纳记录的接口
+@pension_bp.route('/pension_payments/report', methods=['GET'])
+@cached_response('pension_payments')
+def report_pension_payments():
+    """
+    统计 start_date/end_date（含两端）范围内、满足金额条件（min_/max_personal_payment、
+    min_/max_company_payment，含边界）的养老缴纳记录数和金额合计，可按月或按年分组（group_by）。
+    开启 snapshot_config 时由进程内快照回答，快照过期时查询 MySQL，source 字段标明数据来源。
+    """
+    try:
+        start_date, end_date, ranges, group_by = parse_report_args(request.args)
+        records, source = query_report('pension_payments', start_date, end_date, ranges, group_by)
+        return jsonify({
+            'message': 'Query successful',
+            'source': source,
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        # 捕获 MySQL 错误，返回 500 状态码
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # 删除单条养老缴纳记录的接口
 @pension_bp.route('/pension_payments/<int:id>', methods=['DELETE'])
+@bumps_version('pension_payments')
 def delete_pension_payment(id):
     """
     删除指定 ID 的养老缴纳记录。
@@ -262,15 +377,13 @@ def delete_pension_payment(id):
         # 获取数据库连接和游标
         connection, cursor = get_db_connection()
         
-        # 检查记录是否存在
-        check_query = "SELECT id FROM pension_payments WHERE id = %s"
-        cursor.execute(check_query, (id,))
-        if not cursor.fetchone():
-            return jsonify({'error': f'Pension record with id {id} not found'}), 404
-        
-        # 删除记录的 SQL 查询
+        # 直接删除，按影响行数判断记录是否存在，不再预先查询
         delete_query = "DELETE FROM pension_payments WHERE id = %s"
-        cursor.execute(delete_query, (id,))
+        record_deleting(connection, 'pension_payments', [id])
+        result = execute(connection, delete_query, (id,))
+        if not result.rowcount:
+            connection.rollback()
+            return jsonify({'error': f'Pension record with id {id} not found'}), 404
         connection.commit()
         
         # 返回删除成功的响应
@@ -292,13 +405,13 @@ def delete_pension_payment(id):
 
 # 批量删除养老缴纳记录的接口
 @pension_bp.route('/pension_payments/batch', methods=['DELETE'])
+@bumps_version('pension_payments')
 def delete_pension_payments_batch():
     """
     批量删除指定 ID 列表的养老缴纳记录。
-    请求体需为整数 ID 列表。
+    请求体需为整数 ID 列表。ID 较多时分块删除，每块一个事务；
+    响应中分别列出已删除和不存在的 ID。
     """
-    connection = None
-    cursor = None
     try:
         # 获取 JSON 数据，需为整数 ID 列表
         data = request.get_json()
@@ -307,37 +420,47 @@ def delete_pension_payments_batch():
         if not data:
             return jsonify({'error': 'ID list cannot be empty'}), 400
         
-        # 获取数据库连接和游标
-        connection, cursor = get_db_connection()
-        
-        # 检查记录是否存在
-        check_query = "SELECT id FROM pension_payments WHERE id IN (%s)" % ','.join(['%s'] * len(data))
-        cursor.execute(check_query, data)
-        existing_ids = [row[0] for row in cursor.fetchall()]
-        
-        if not existing_ids:
-            return jsonify({'error': 'No pension records found for provided IDs'}), 404
+        # 每块一条 DELETE，按影响行数确定已删除和不存在的 ID
+        observe_batch_size(len(data))
+        deleted_ids, missing_ids = delete_ids('pension_payments', data)
         
-        # 删除记录的 SQL 查询
-        delete_query = "DELETE FROM pension_payments WHERE id IN (%s)" % ','.join(['%s'] * len(existing_ids))
-        cursor.execute(delete_query, existing_ids)
-        connection.commit()
+        if not deleted_ids:
+            return jsonify({
+                'error': 'No pension records found for provided IDs',
+                'missing_ids': missing_ids
+            }), 404
         
         # 返回删除成功的响应，包括删除的记录数和 ID 列表
         return jsonify({
-            'message': f'Successfully deleted {cursor.rowcount} pension records',
-            'deleted_count': cursor.rowcount,
-            'deleted_ids': existing_ids
+            'message': f'Successfully deleted {len(deleted_ids)} pension records',
+            'deleted_count': len(deleted_ids),
+            'deleted_ids': deleted_ids,
+            'missing_ids': missing_ids
         }), 200
         
     except Error as e:
         # 捕获 MySQL 错误，返回 500 状态码
         logger.error(f"Database error: {str(e)}")
         return jsonify({'error': str(e)}), 500
-        
-    finally:
-        # 安全关闭游标和连接
-        if cursor is not None:
-            cursor.close()
-        if connection is not None and connection.is_connected():
-            connection.close()
\ No newline at end of file
+
+# 按日期范围删除养老缴纳记录的接口
+@pension_bp.route('/pension_payments', methods=['DELETE'])
+@bumps_version('pension_payments')
+def delete_pension_payments_range():
+    """
+    删除 start_date 到 end_date（含两端，均为必填）之间的养老缴纳记录。
+    每个事务最多删除 chunk_size 行（默认见 delete_config），分块提交，避免长时间锁表。
+    """
+    try:
+        start_date, end_date, chunk_size = parse_range_args(request.args)
+        result = delete_range('pension_payments', start_date, end_date, chunk_size)
+        return jsonify({
+            'message': f"Successfully deleted {result['deleted_count']} pension records",
+            **result
+        }), 200
+    except DeleteError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        # 捕获 MySQL 错误，返回 500 状态码
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
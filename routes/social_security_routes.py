@@ -1,7 +1,20 @@
 from flask import Blueprint, request, jsonify
 from mysql.connector import Error
 from utils.db import get_db_connection
-from datetime import datetime, date
+from utils.pagination import PaginationError, parse_pagination, paginate_query, split_page, page_info
+from utils.rows import select_list, cursor_key, to_records
+from utils.export import ExportError, parse_export_args, export_response
+from utils.rollup import SummaryError, parse_summary_args, query_summary, record_inserted, record_deleting
+from utils.snapshot import ReportError, parse_report_args, query_report
+from utils.ingest import stream_format, parse_chunk_size, iter_records, ingest_records, ingest_response
+from utils.versions import bumps_version
+from utils.cache import cached_response
+from utils.coalescer import coalescing_enabled, get_coalescer
+from utils.spool import SpoolUnavailableError, spooling_enabled, get_spool
+from utils.statements import execute, fetch_all
+from utils.deletes import DeleteError, parse_range_args, delete_ids, delete_range
+from utils.metrics import observe_batch_size
+from utils.validation import BatchValidator, error_report, validate_date, validate_payment
 import logging
 import os
 
@@ -16,50 +29,27 @@ social_security_bp = Blueprint('social_security', __name__)
 # 必需字段常量
 REQUIRED_FIELDS = ['date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
 
-def format_date(date_value, record_id):
-    """将日期格式化为 YYYY-MM，记录解析错误"""
-    if not date_value:
-        return None
-    if isinstance(date_value, (datetime, date)):
-        return date_value.strftime('%Y-%m')
-    if isinstance(date_value, str):
-        try:
-            parsed_date = datetime.strptime(date_value, '%a, %d %b %Y %H:%M:%S %Z')
-            return parsed_date.strftime('%Y-%m')
-        except ValueError:
-            try:
-                parsed_date = datetime.strptime(date_value, '%Y-%m-%d')
-                return parsed_date.strftime('%Y-%m')
-            except ValueError:
-                logger.error(f"Failed to parse date: {date_value} for record ID: {record_id}")
-                return None
-    logger.error(f"Unsupported date type: {type(date_value)} for record ID: {record_id}")
-    return None
+# 查询接口返回的列
+QUERY_COLUMNS = ['id', 'date', 'personal_payment', 'company_payment', 'personal_account', 'remarks']
 
-def validate_date(date_str):
-    """验证日期格式为 YYYY-MM-DD"""
-    try:
-        datetime.strptime(date_str, '%Y-%m-%d')
-        return True
-    except ValueError:
-        return False
+# 批量插入的校验规则：日期格式，三项金额为非负数
+BATCH_VALIDATOR = BatchValidator(REQUIRED_FIELDS, amounts=['personal_payment', 'company_payment', 'personal_account'])
 
-def validate_payment(value, field_name):
-    """验证金额为正数"""
-    try:
-        val = float(value)
-        if val < 0:
-            return False, f"{field_name} must be non-negative"
-        return True, None
-    except (ValueError, TypeError):
-        return False, f"{field_name} must be a valid number"
+def record_values(record):
+    """批量插入时单条记录对应的 VALUES 参数"""
+    return (record['date'], float(record['personal_payment']), float(record['company_payment']),
+            float(record['personal_account']), record['remarks'])
 
 @social_security_bp.route('/social_security_payments', methods=['GET'])
+@cached_response('social_security_payments')
 def query_social_security_payments():
     """
     查询社保缴纳记录，支持按 ID、日期范围、年份和金额过滤，默认返回最新 20 条记录。
-    支持分页（page, per_page）。返回的 date 字段格式为 YYYY-MM（例如 "2023-01"）。
+    支持游标分页（cursor, per_page），响应中的 next_cursor 用于获取下一页；兼容 page/per_page 偏移分页。
+    返回的 date 字段格式为 YYYY-MM（例如 "2023-01"）。
     """
+    connection = None
+    cursor = None
     try:
         # 获取查询参数
         id = request.args.get('id')
@@ -68,12 +58,12 @@ def query_social_security_payments():
         year = request.args.get('year')
         personal_payment = request.args.get('personal_payment')
         company_payment = request.args.get('company_payment')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         
         # 验证分页参数
-        if page < 1 or per_page < 1:
-            return jsonify({'error': 'Page and per_page must be positive integers'}), 400
+        try:
+            pagination = parse_pagination(request.args)
+        except PaginationError as e:
+            return jsonify({'error': str(e)}), 400
         
         # 验证日期格式
         if start_date and not validate_date(start_date):
@@ -91,11 +81,11 @@ def query_social_security_payments():
             if not valid:
                 return jsonify({'error': error}), 400
         
-        # 获取数据库连接和游标
-        connection, cursor = get_db_connection(dictionary=True)
+        # 获取数据库连接和游标，查询结果为元组
+        connection, cursor = get_db_connection(read_table='social_security_payments')
         
-        # 基础 SQL 查询
-        query = "SELECT id, date, personal_payment, company_payment, personal_account, remarks FROM social_security_payments WHERE 1=1"
+        # 基础 SQL 查询，date 由 MySQL 格式化为 YYYY-MM
+        query = f"SELECT {select_list(QUERY_COLUMNS)} FROM social_security_payments WHERE 1=1"
         params = []
         
         # 动态添加过滤条件
@@ -123,25 +113,18 @@ def query_social_security_payments():
             params.append(float(company_payment))
         
         # 添加分页和排序
-        offset = (page - 1) * per_page
-        query += " ORDER BY date DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
+        query = paginate_query(query, params, pagination)
         
         # 执行查询
-        cursor.execute(query, params)
-        records = cursor.fetchall()
-        
-        # 格式化 date 字段
-        for record in records:
-            record['date'] = format_date(record['date'], record['id'])
+        rows, next_cursor = split_page(fetch_all(connection, query, params), pagination, key=cursor_key)
+        records = to_records(QUERY_COLUMNS, rows)
         
         # 返回响应
         return jsonify({
             'message': 'Query successful',
             'records': records,
             'count': len(records),
-            'page': page,
-            'per_page': per_page
+            **page_info(pagination, next_cursor)
         }), 200
         
     except Error as e:
@@ -149,11 +132,75 @@ def query_social_security_payments():
         return jsonify({'error': str(e)}), 500
         
     finally:
-        if connection.is_connected():
+        if cursor is not None:
             cursor.close()
+        if connection is not None and connection.is_connected():
             connection.close()
 
+@social_security_bp.route('/social_security_payments/export', methods=['GET'])
+def export_social_security_payments():
+    """
+    按日期范围流式导出社保缴纳记录，支持 format=ndjson（默认）或 csv。
+    """
+    try:
+        start_date, end_date, fmt = parse_export_args(request.args)
+        return export_response(
+            'social_security_payments',
+            QUERY_COLUMNS,
+            start_date, end_date, fmt
+        )
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@social_security_bp.route('/social_security_payments/summary', methods=['GET'])
+@cached_response('social_security_payments')
+def summarize_social_security_payments():
+    """
+    按月（group_by=month，默认）或按年（group_by=year）汇总社保缴纳金额，日期范围按所在月份整月计算。
+    """
+    try:
+        group_by, start_date, end_date = parse_summary_args(request.args)
+        records = query_summary('social_security_payments', group_by, start_date, end_date)
+        return jsonify({
+            'message': 'Query successful',
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except SummaryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@social_security_bp.route('/social_security_payments/report', methods=['GET'])
+@cached_response('social_security_payments')
+def report_social_security_payments():
+    """
+    按日期范围（含两端）和金额条件（min_/max_personal_payment、min_/max_company_payment）统计社保缴纳记录数和金额合计，
+    可按月或按年分组。开启 snapshot_config 时由进程内快照回答，source 字段标明数据来源。
+    """
+    try:
+        start_date, end_date, ranges, group_by = parse_report_args(request.args)
+        records, source = query_report('social_security_payments', start_date, end_date, ranges, group_by)
+        return jsonify({
+            'message': 'Query successful',
+            'source': source,
+            'group_by': group_by,
+            'records': records,
+            'count': len(records)
+        }), 200
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @social_security_bp.route('/social_security_payments', methods=['POST'])
+@bumps_version('social_security_payments')
 def insert_social_security_payment():
     """
     插入单条社保缴纳记录，需提供日期（YYYY-MM-DD 格式）、个人缴纳金额、公司缴纳金额、个人账户金额和备注。
@@ -190,6 +237,24 @@ def insert_social_security_payment():
             if not valid:
                 return jsonify({'error': error}), 400
         
+        values = (date, float(personal_payment), float(company_payment), float(personal_account), remarks)
+        
+        # 开启写入暂存时追加到本地日志后即返回，由后台线程重放到数据库
+        if spooling_enabled():
+            spool_id = get_spool().append('social_security_payments', REQUIRED_FIELDS, values)
+            return jsonify({
+                'message': 'Social security record accepted',
+                'spool_id': spool_id
+            }), 202
+        
+        # 开启合并写入时交给后台写线程与其他请求合并提交
+        if coalescing_enabled():
+            record_id = get_coalescer('social_security_payments', REQUIRED_FIELDS).submit(values)
+            return jsonify({
+                'message': 'Social security record inserted successfully',
+                'id': record_id
+            }), 201
+        
         connection, cursor = get_db_connection()
         
         insert_query = """
@@ -197,16 +262,20 @@ def insert_social_security_payment():
         (`date`, `personal_payment`, `company_payment`, `personal_account`, `remarks`) 
         VALUES (%s, %s, %s, %s, %s)
         """
-        values = (date, float(personal_payment), float(company_payment), float(personal_account), remarks)
         
-        cursor.execute(insert_query, values)
+        result = execute(connection, insert_query, values)
+        
+        record_inserted(connection, 'social_security_payments', [values])
         connection.commit()
         
         return jsonify({
             'message': 'Social security record inserted successfully',
-            'id': cursor.lastrowid
+            'id': result.lastrowid
         }), 201
         
+    except SpoolUnavailableError as e:
+        logger.error(f"Spool error: {str(e)}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Error as e:
         logger.error(f"Database error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -221,14 +290,24 @@ def insert_social_security_payment():
             connection.close()
 
 @social_security_bp.route('/social_security_payments/batch', methods=['POST'])
+@bumps_version('social_security_payments')
 def insert_social_security_payments_batch():
     """
     批量插入社保缴纳记录，需提供记录列表，每条记录包含日期（YYYY-MM-DD 格式）、金额和备注。
     验证格式并使用事务。
+    请求体为 NDJSON 或 CSV（可 gzip 压缩）时流式分块导入，每个分块单独提交。
     """
     connection = None
     cursor = None
     try:
+        fmt = stream_format(request)
+        if fmt:
+            report = ingest_records(
+                iter_records(request, fmt), 'social_security_payments', REQUIRED_FIELDS,
+                BATCH_VALIDATOR, record_values, parse_chunk_size(request.args)
+            )
+            return ingest_response(report, 'social security')
+        
         if not request.is_json:
             return jsonify({'error': 'Content-Type must be application/json'}), 400
         
@@ -236,16 +315,9 @@ def insert_social_security_payments_batch():
         if not isinstance(data, list):
             return jsonify({'error': 'Request body must be a list of records'}), 400
         
-        for record in data:
-            for field in REQUIRED_FIELDS:
-                if field not in record:
-                    return jsonify({'error': f'Missing required field in record: {field}'}), 400
-            if not validate_date(record['date']):
-                return jsonify({'error': f"Date must be in YYYY-MM-DD format in record: {record}"}), 400
-            for field in ['personal_payment', 'company_payment', 'personal_account']:
-                valid, error = validate_payment(record[field], field)
-                if not valid:
-                    return jsonify({'error': error}), 400
+        errors = BATCH_VALIDATOR.validate(data)
+        if errors:
+            return jsonify(error_report(errors, len(data))), 400
         
         connection, cursor = get_db_connection()
         
@@ -254,9 +326,12 @@ def insert_social_security_payments_batch():
         (`date`, `personal_payment`, `company_payment`, `personal_account`, `remarks`) 
         VALUES (%s, %s, %s, %s, %s)
         """
-        values = [(r['date'], float(r['personal_payment']), float(r['company_payment']), float(r['personal_account']), r['remarks']) for r in data]
+        observe_batch_size(len(data))
+        values = [record_values(r) for r in data]
         
         cursor.executemany(insert_query, values)
+        
+        record_inserted(connection, 'social_security_payments', values)
         connection.commit()
         
         return jsonify({
@@ -278,22 +353,22 @@ def insert_social_security_payments_batch():
             connection.close()
 
 @social_security_bp.route('/social_security_payments/<int:id>', methods=['DELETE'])
+@bumps_version('social_security_payments')
 def delete_social_security_payment(id):
     """
-    删除指定 ID 的社保缴纳记录。
+    删除指定 ID 的社保缴纳记录，按影响行数判断记录是否存在。
     """
     connection = None
     cursor = None
     try:
         connection, cursor = get_db_connection()
         
-        check_query = "SELECT id FROM social_security_payments WHERE id = %s"
-        cursor.execute(check_query, (id,))
-        if not cursor.fetchone():
-            return jsonify({'error': f'Social security record with id {id} not found'}), 404
-        
         delete_query = "DELETE FROM social_security_payments WHERE id = %s"
-        cursor.execute(delete_query, (id,))
+        record_deleting(connection, 'social_security_payments', [id])
+        result = execute(connection, delete_query, (id,))
+        if not result.rowcount:
+            connection.rollback()
+            return jsonify({'error': f'Social security record with id {id} not found'}), 404
         connection.commit()
         
         return jsonify({
@@ -311,13 +386,13 @@ def delete_social_security_payment(id):
             connection.close()
 
 @social_security_bp.route('/social_security_payments/batch', methods=['DELETE'])
+@bumps_version('social_security_payments')
 def delete_social_security_payments_batch():
     """
     批量删除指定 ID 列表的社保缴纳记录。
-    请求体需为整数 ID 列表。
+    请求体需为整数 ID 列表。ID 较多时分块删除，每块一个事务；
+    响应中分别列出已删除和不存在的 ID。
     """
-    connection = None
-    cursor = None
     try:
         data = request.get_json()
         if not isinstance(data, list) or not all(isinstance(id, int) for id in data):
@@ -325,31 +400,42 @@ def delete_social_security_payments_batch():
         if not data:
             return jsonify({'error': 'ID list cannot be empty'}), 400
         
-        connection, cursor = get_db_connection()
+        observe_batch_size(len(data))
+        deleted_ids, missing_ids = delete_ids('social_security_payments', data)
         
-        check_query = "SELECT id FROM social_security_payments WHERE id IN (%s)" % ','.join(['%s'] * len(data))
-        cursor.execute(check_query, data)
-        existing_ids = [row[0] for row in cursor.fetchall()]
-        
-        if not existing_ids:
-            return jsonify({'error': 'No social security records found for provided IDs'}), 404
-        
-        delete_query = "DELETE FROM social_security_payments WHERE id IN (%s)" % ','.join(['%s'] * len(existing_ids))
-        cursor.execute(delete_query, existing_ids)
-        connection.commit()
+        if not deleted_ids:
+            return jsonify({
+                'error': 'No social security records found for provided IDs',
+                'missing_ids': missing_ids
+            }), 404
         
         return jsonify({
-            'message': f'Successfully deleted {cursor.rowcount} social security records',
-            'deleted_count': cursor.rowcount,
-            'deleted_ids': existing_ids
+            'message': f'Successfully deleted {len(deleted_ids)} social security records',
+            'deleted_count': len(deleted_ids),
+            'deleted_ids': deleted_ids,
+            'missing_ids': missing_ids
         }), 200
         
     except Error as e:
         logger.error(f"Database error: {str(e)}")
         return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if cursor is not None:
-            cursor.close()
-        if connection is not None and connection.is_connected():
-            connection.close()
\ No newline at end of file
+
+@social_security_bp.route('/social_security_payments', methods=['DELETE'])
+@bumps_version('social_security_payments')
+def delete_social_security_payments_range():
+    """
+    删除 start_date 到 end_date（含两端，均为必填）之间的社保缴纳记录，
+    每个事务最多删除 chunk_size 行，分块提交。
+    """
+    try:
+        start_date, end_date, chunk_size = parse_range_args(request.args)
+        result = delete_range('social_security_payments', start_date, end_date, chunk_size)
+        return jsonify({
+            'message': f"Successfully deleted {result['deleted_count']} social security records",
+            **result
+        }), 200
+    except DeleteError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify
+from mysql.connector import Error
+from utils.rollup import PAYMENT_TABLES, SummaryError, parse_summary_args
+from utils.cache import cached_response
+from utils.overview import OverviewTimeout, query_overview
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 创建 Flask 蓝图，用于跨险种（养老、社保、医保）的缴费汇总
+statement_bp = Blueprint('statement', __name__)
+
+# 养老、社保、医保合并的缴费汇总接口
+@statement_bp.route('/statements', methods=['GET'])
+@cached_response(*PAYMENT_TABLES)
+def query_statement():
+    """
+    按月（group_by=month，默认）或按年（group_by=year）合并三张缴费表的汇总，支持 start_date/end_date 过滤。
+    三张表并发查询，每个周期返回各险种的记录数、个人/公司缴纳合计和总额及三者合计，
+    totals 为整个范围内各险种和全部的合计。
+    """
+    try:
+        group_by, start_date, end_date = parse_summary_args(request.args)
+        records, totals = query_overview(group_by, start_date, end_date)
+        return jsonify({
+            'message': 'Query successful',
+            'group_by': group_by,
+            'records': records,
+            'totals': totals,
+            'count': len(records)
+        }), 200
+    except SummaryError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverviewTimeout as e:
+        logger.error(f"Statement query timed out: {str(e)}")
+        return jsonify({'error': str(e)}), 504
+    except Error as e:
+        # 捕获 MySQL 错误，返回 500 状态码
+        logger.error(f"Database error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
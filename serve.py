@@ -0,0 +1,406 @@
+"""
+生产环境多进程启动器（替代 app.run(debug=True) 的单进程开发服务器）：
+
+    python3 serve.py                                   # 启动主应用 app:app，参数默认取自 config.server_config
+    python3 serve.py --workers 8 --threads 16 --port 5003
+    python3 serve.py other_module:app --port 5010 --no-extra-ports
+
+主进程监听端口（以及 extra_ports 中的兼容端口）后 fork 出 workers 个工作进程，
+工作进程共享监听套接字，各自用 threads 个线程处理请求。
+应用默认在工作进程内导入（--preload 时在主进程导入），数据库连接池在工作进程内首次使用时创建，
+不会在进程之间共享连接。
+
+信号（发给主进程）：
+    TERM / INT   平滑停止：工作进程停止接受新连接，等待进行中的请求完成（最多 graceful_timeout 秒）后退出
+    HUP          平滑重载：启动一组新的工作进程（重新导入应用代码和配置），再平滑停止旧的工作进程
+    TTIN / TTOU  增加 / 减少一个工作进程
+    QUIT         立即停止
+"""
+import argparse
+import errno
+import importlib
+import logging
+import os
+import random
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from config import cache_config, server_config, version_config
+
+logger = logging.getLogger('payment.serve')
+
+# 工作进程导入应用失败时的退出码，主进程收到后停止，避免反复 fork 失败的进程
+WORKER_BOOT_ERROR = 3
+
+
+def load_app(target):
+    """按 "模块:变量" 导入 WSGI 应用，省略变量名时取 app"""
+    module_name, _, attr = target.partition(':')
+    module = importlib.import_module(module_name)
+    app = getattr(module, attr or 'app', None)
+    if app is None:
+        raise ImportError(f'{module_name} has no WSGI application {attr or "app"!r}')
+    return app
+
+
+class RequestHandler(WSGIRequestHandler):
+    """
+    请求处理器：使用 HTTP/1.1（流式导出等接口可分块传输），读取请求超过 timeout 秒的慢客户端直接断开，
+    避免占满工作线程。werkzeug 每个连接只处理一个请求（响应带 Connection: close）。
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.timeout = self.server.client_timeout
+        super().setup()
+
+    def run_wsgi(self):
+        self.server.request_started()
+        super().run_wsgi()
+
+    def log_request(self, code='-', size='-'):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+
+class WorkerServer(BaseWSGIServer):
+    """
+    工作进程内的 HTTP 服务：
+    - 最多 threads 个连接同时处理，线程已满时不再接受连接，由其他工作进程接受；
+    - 处理的请求数达到 max_requests 后停止接受连接，处理完进行中的请求后退出，由主进程重新 fork。
+    """
+
+    multithread = True
+
+    def __init__(self, listeners, app, threads, client_timeout, max_requests=0, access_log=False, multiprocess=True):
+        host, port = listeners[0].getsockname()[:2]
+        super().__init__(host, port, app, handler=RequestHandler, fd=listeners[0].fileno())
+        # 其余监听套接字（兼容端口）与主端口由同一组线程处理
+        self.sockets = [self.socket] + [socket.fromfd(listener.fileno(), listener.family, socket.SOCK_STREAM)
+                                        for listener in listeners[1:]]
+        self.multiprocess = multiprocess
+        self.threads = threads
+        self.client_timeout = client_timeout
+        self.max_requests = max_requests
+        self.access_log = access_log
+        self.requests = 0
+        self.stopping = threading.Event()
+        self._slots = threading.Semaphore(threads)
+        self._count_lock = threading.Lock()
+
+    def request_started(self):
+        with self._count_lock:
+            self.requests += 1
+            recycle = self.max_requests and self.requests >= self.max_requests
+        if recycle and not self.stopping.is_set():
+            logger.info('worker %s served %s requests, recycling', os.getpid(), self.requests)
+            self.stopping.set()
+
+    def _process(self, connection, client_address):
+        try:
+            self.finish_request(connection, client_address)
+        except Exception:
+            self.handle_error(connection, client_address)
+        finally:
+            self.shutdown_request(connection)
+            self._slots.release()
+
+    def serve(self, poll_interval=0.5):
+        """接受连接直到 stopping 被设置（收到 TERM 或达到 max_requests）"""
+        executor = ThreadPoolExecutor(self.threads, thread_name_prefix='request')
+        with selectors.DefaultSelector() as selector:
+            for sock in self.sockets:
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ)
+            while not self.stopping.is_set():
+                if not self._slots.acquire(timeout=poll_interval):
+                    continue
+                ready = selector.select(poll_interval)
+                if not ready:
+                    self._slots.release()
+                    continue
+                try:
+                    connection, client_address = ready[0][0].fileobj.accept()
+                except (BlockingIOError, InterruptedError):
+                    # 同一个连接被其他工作进程先接受了
+                    self._slots.release()
+                    continue
+                except OSError as e:
+                    self._slots.release()
+                    if e.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                        logger.warning('accept failed: %s', e)
+                        time.sleep(poll_interval)
+                        continue
+                    raise
+                connection.setblocking(True)
+                executor.submit(self._process, connection, client_address)
+        for sock in self.sockets:
+            sock.close()
+        executor.shutdown(wait=False)
+
+    def drain(self, timeout):
+        """等待进行中的连接处理完毕，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        for _ in range(self.threads):
+            if not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+                return False
+        return True
+
+
+def _close_worker_pools():
+    """关闭本进程连接池中的空闲连接；托管的独立应用不使用连接池时跳过"""
+    db = sys.modules.get('utils.db')
+    if db is not None:
+        db.close_pool()
+
+
+def run_worker(listeners, target, app, options):
+    """工作进程主函数，返回退出码"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)        # 终端 Ctrl-C 由主进程统一处理
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTTIN, signal.SIG_IGN)
+    signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+    signal.signal(signal.SIGQUIT, lambda signum, frame: os._exit(0))
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    if app is None:
+        try:
+            app = load_app(target)
+        except Exception:
+            traceback.print_exc()
+            return WORKER_BOOT_ERROR
+
+    max_requests = options.max_requests
+    if max_requests and options.max_requests_jitter:
+        max_requests += random.randint(0, options.max_requests_jitter)
+    server = WorkerServer(listeners, app, options.threads, options.timeout, max_requests,
+                          access_log=options.access_log, multiprocess=options.workers > 1)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stopping.set())
+    logger.info('worker %s started', os.getpid())
+    server.serve()
+    if not server.drain(options.graceful_timeout):
+        logger.warning('worker %s exiting with requests still in progress after %ss',
+                       os.getpid(), options.graceful_timeout)
+    _close_worker_pools()
+    return 0
+
+
+class Arbiter:
+    """主进程：维持工作进程数量，处理信号，平滑重载与停止"""
+
+    def __init__(self, target, options):
+        self.target = target
+        self.options = options
+        self.num_workers = options.workers
+        self.app = None
+        self.listeners = []
+        self.generation = 0
+        self.workers = {}          # pid -> 所属代数（每次 HUP 重载加一）
+        self.retiring = {}         # 已发出 TERM 的 pid -> 强制结束的时间
+        self._signals = []
+
+    def _listen(self, port):
+        listener = socket.socket(socket.AF_INET6 if ':' in self.options.host else socket.AF_INET)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.options.host, port))
+        listener.listen(self.options.backlog)
+        return listener
+
+    def run(self):
+        ports = [self.options.port] + [port for port in self.options.extra_ports if port != self.options.port]
+        self.listeners = [self._listen(port) for port in ports]
+        if self.options.preload:
+            self.app = load_app(self.target)
+        if self.options.pid_file:
+            with open(self.options.pid_file, 'w') as f:
+                f.write(f'{os.getpid()}\n')
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT, signal.SIGHUP,
+                       signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+        logger.info('serving %s on %s:%s with %s workers x %s threads (pid %s)',
+                    self.target, self.options.host, ','.join(str(port) for port in ports),
+                    self.num_workers, self.options.threads, os.getpid())
+        try:
+            self._loop()
+        finally:
+            for listener in self.listeners:
+                listener.close()
+            if self.options.pid_file and os.path.exists(self.options.pid_file):
+                os.unlink(self.options.pid_file)
+
+    def _loop(self):
+        while True:
+            if not self._reap():
+                self.stop(graceful=False)
+                sys.exit(WORKER_BOOT_ERROR)
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop(graceful=True)
+                    return
+                if signum == signal.SIGQUIT:
+                    self.stop(graceful=False)
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif signum == signal.SIGTTOU:
+                    self.num_workers = max(1, self.num_workers - 1)
+            self._kill_overdue()
+            self._manage_workers()
+            time.sleep(0.5)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = self.generation
+            return
+        code = 1
+        try:
+            code = run_worker(self.listeners, self.target, self.app, self.options)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _retire(self, pid):
+        """平滑停止一个工作进程，超过 graceful_timeout 后强制结束"""
+        if pid in self.retiring:
+            return
+        self.retiring[pid] = time.monotonic() + self.options.graceful_timeout + 5
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now >= deadline:
+                logger.warning('worker %s did not stop in time, killing', pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.retiring[pid] = float('inf')
+
+    def _reap(self):
+        """回收已退出的工作进程；返回 False 表示有工作进程导入应用失败"""
+        booted = True
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return booted
+            if not pid:
+                return booted
+            self.workers.pop(pid, None)
+            retired = self.retiring.pop(pid, None) is not None
+            code = os.waitstatus_to_exitcode(status)
+            if code == WORKER_BOOT_ERROR and not retired:
+                logger.error('worker %s failed to load %s', pid, self.target)
+                booted = False
+            elif code != 0:
+                logger.warning('worker %s exited with status %s', pid, code)
+
+    def _manage_workers(self):
+        current = sorted(pid for pid, generation in self.workers.items()
+                         if generation == self.generation and pid not in self.retiring)
+        for _ in range(self.num_workers - len(current)):
+            self._spawn()
+        for pid in current[:max(0, len(current) - self.num_workers)]:
+            self._retire(pid)
+
+    def reload(self):
+        """先启动新一代工作进程，再平滑停止旧的工作进程"""
+        if self.options.preload:
+            logger.warning('reloading with --preload keeps the application code loaded in the master')
+        logger.info('reloading workers')
+        old = [pid for pid, generation in self.workers.items() if generation == self.generation]
+        self.generation += 1
+        self._manage_workers()
+        for pid in old:
+            self._retire(pid)
+
+    def stop(self, graceful=True):
+        """停止所有工作进程；平滑停止时等待它们处理完进行中的请求"""
+        logger.info('stopping workers (%s)', 'graceful' if graceful else 'immediate')
+        for pid in list(self.workers):
+            if graceful:
+                self._retire(pid)
+            else:
+                try:
+                    os.kill(pid, signal.SIGQUIT)
+                except ProcessLookupError:
+                    pass
+        deadline = time.monotonic() + (self.options.graceful_timeout + 5 if graceful else 5)
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.workers.clear()
+        self.retiring.clear()
+
+
+def _check_version_store(workers):
+    """多个工作进程使用进程内版本号时，其他进程的写入不会使本进程的查询缓存和 ETag 失效，拒绝启动"""
+    if workers > 1 and version_config['store'] == 'memory' and (cache_config['enabled'] or version_config['etag']):
+        sys.exit("version_config['store'] = 'memory' cannot be used with more than one worker while the query "
+                 "cache or ETags are enabled: other workers' writes would not invalidate them. "
+                 "Use 'auto' or 'file', or run with --workers 1.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-fork multi-worker WSGI launcher')
+    parser.add_argument('target', nargs='?', default=server_config['app'],
+                        help='WSGI application as module:variable (default: %(default)s)')
+    parser.add_argument('--host', default=server_config['host'])
+    parser.add_argument('--port', type=int, default=server_config['port'])
+    parser.add_argument('--extra-port', dest='extra_ports', type=int, action='append',
+                        help='additional port to serve on (repeatable, default: extra_ports in config)')
+    parser.add_argument('--no-extra-ports', dest='extra_ports', action='store_const', const=[])
+    parser.add_argument('--workers', type=int, default=server_config['workers'])
+    parser.add_argument('--threads', type=int, default=server_config['threads'])
+    parser.add_argument('--backlog', type=int, default=server_config['backlog'])
+    parser.add_argument('--timeout', type=float, default=server_config['timeout'])
+    parser.add_argument('--max-requests', type=int, default=server_config['max_requests'])
+    parser.add_argument('--max-requests-jitter', type=int, default=server_config['max_requests_jitter'])
+    parser.add_argument('--graceful-timeout', type=float, default=server_config['graceful_timeout'])
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=server_config['preload'])
+    parser.add_argument('--access-log', action=argparse.BooleanOptionalAction, default=server_config['access_log'])
+    parser.add_argument('--pid-file', default=server_config['pid_file'])
+    options = parser.parse_args(argv)
+    if options.extra_ports is None:
+        options.extra_ports = list(server_config['extra_ports'])
+    if options.workers < 1 or options.threads < 1:
+        parser.error('--workers and --threads must be positive integers')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(process)d] %(levelname)s %(message)s')
+    # 在导入应用之前记下实际的工作进程数，version_config['store'] 为 auto 时据此选择共享的版本号存储
+    server_config['workers'] = options.workers
+    _check_version_store(options.workers)
+    Arbiter(options.target, options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
 #!/bin/bash 
-nohup python3 api_insert_medical_insurance_payments.py  insurance.log 2>&1 &
-nohup python3 api_insert_pension_payments.py pension.log 2>&1 &
+# 原独立插入服务（5000 医保、5001 养老）已合并到主应用，主应用同时监听这两个端口
+bash start_app.sh
 netstat -ntlp | grep "500"
@@ -1,2 +1,3 @@
 #!/bin/bash 
-nohup python3 app.py > app.log 2>&1 & 
+# 多进程启动主应用，kill -HUP $(cat app.pid) 平滑重载，kill -TERM $(cat app.pid) 平滑停止
+nohup python3 serve.py app:app --pid-file app.pid > app.log 2>&1 & 
@@ -0,0 +1,60 @@
+"""
+测试使用 benchmarks/standin.py 的 SQLite 替身代替 MySQL，整个测试会话共用一个临时库文件。
+替身需在应用首次获取数据库连接之前安装，因此在导入被测模块之前完成。
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import pytest
+import standin
+
+from config import version_config
+
+TMP_DIR = tempfile.mkdtemp(prefix='payment-tests-')
+DB_PATH = os.path.join(TMP_DIR, 'standin.db')
+standin.install(DB_PATH)
+# 默认配置下（多个工作进程）版本号存储为 file，测试时写到临时目录
+version_config['path'] = os.path.join(TMP_DIR, 'versions')
+
+# 写入暂存的进度表（migrations/0005_write_spool.sql 的 SQLite 写法）
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool_progress (lane TEXT PRIMARY KEY, seq INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS spool_rejected (
+    lane TEXT NOT NULL, seq INTEGER NOT NULL, table_name TEXT NOT NULL,
+    record TEXT NOT NULL, error TEXT NOT NULL, PRIMARY KEY (lane, seq)
+);
+"""
+
+
+def query(sql, params=()):
+    """直接在替身库上执行语句（绕过连接池），返回全部结果行"""
+    db = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        rows = db.execute(sql, params).fetchall()
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    db = sqlite3.connect(DB_PATH, timeout=30)
+    db.executescript(SPOOL_SCHEMA)
+    for table in ('pension_payments', 'social_security_payments', 'medical_insurance_payments',
+                  'spool_progress', 'spool_rejected'):
+        db.execute(f'DELETE FROM {table}')
+    db.commit()
+    db.close()
+    yield
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
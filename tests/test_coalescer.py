@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+from config import rollup_config
+from conftest import query
+from utils import coalescer
+from utils.coalescer import WriteCoalescer
+from utils.rollup import CREATE_ROLLUP_TABLE
+
+COLUMNS = ['date', 'personal_payment', 'company_payment', 'remarks']
+
+
+def submit_all(writer, rows):
+    """从多个线程同时提交，返回 {备注: ID 或异常}"""
+    results = {}
+    start = threading.Barrier(len(rows))
+
+    def submit(values):
+        start.wait()
+        try:
+            results[values[3]] = writer.submit(values, timeout=5)
+        except Exception as e:
+            results[values[3]] = e
+
+    threads = [threading.Thread(target=submit, args=(values,)) for values in rows]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_ids_are_handed_back_to_each_request():
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=100, max_batch=100)
+    results = submit_all(writer, [('2024-01-05', i, i, f'r{i}') for i in range(20)])
+    assert writer.stats()['flushes'] < 20
+    stored = dict(query('SELECT remarks, id FROM pension_payments'))
+    assert results == stored
+
+
+class FakeCursor:
+    """模拟 MySQL 游标：lock_mode 为 innodb_autoinc_lock_mode，自增步长为 2，ID 从 11 开始"""
+
+    def __init__(self, lock_mode):
+        self.lock_mode = lock_mode
+        self.lastrowid = None
+        self.inserts = []
+        self.next_id = 11
+
+    def execute(self, operation, params=()):
+        if 'auto_increment_increment' in operation:
+            self.row = (2,)
+        elif 'innodb_autoinc_lock_mode' in operation:
+            self.row = (self.lock_mode,)
+        else:
+            self.inserts.append(operation.count('(%s'))
+            self.lastrowid = self.next_id
+            # 其他连接的并发插入占用了中间的 ID
+            self.next_id += 2 * self.inserts[-1] + 100
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def fake_db(monkeypatch, lock_mode):
+    connection, cursor = FakeConnection(), FakeCursor(lock_mode)
+    monkeypatch.setattr(coalescer, 'get_db_connection', lambda: (connection, cursor))
+    return connection, cursor
+
+
+def test_ids_follow_auto_increment_increment(monkeypatch):
+    connection, cursor = fake_db(monkeypatch, 1)
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=100, max_batch=3)
+    results = submit_all(writer, [('2024-01-05', i, i, f'r{i}') for i in range(3)])
+    assert sorted(results.values()) == [11, 13, 15]
+    assert cursor.inserts == [3]
+    assert writer.stats()['multi_row_insert'] is True
+
+
+def test_interleaved_lock_mode_inserts_row_by_row_in_one_commit(monkeypatch):
+    connection, cursor = fake_db(monkeypatch, 2)
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=100, max_batch=3)
+    results = submit_all(writer, [('2024-01-05', i, i, f'r{i}') for i in range(3)])
+    # 各行 ID 取自各自的 lastrowid，不按步长推算
+    assert sorted(results.values()) == [11, 113, 215]
+    assert cursor.inserts == [1, 1, 1]
+    assert connection.commits == 1
+    assert writer.stats()['multi_row_insert'] is False
+
+
+def test_failed_batch_falls_back_to_row_by_row():
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=100, max_batch=100)
+    rows = [('2024-01-05', i, i, f'r{i}') for i in range(5)] + [(None, 1, 1, 'bad')]
+    results = submit_all(writer, rows)
+    assert isinstance(results.pop('bad'), Exception)
+    assert results == dict(query('SELECT remarks, id FROM pension_payments'))
+    assert writer.stats()['errors'] == 1
+
+
+@pytest.fixture
+def rollup_enabled():
+    query(CREATE_ROLLUP_TABLE)
+    query('DELETE FROM payment_monthly_rollups')
+    rollup_config['enabled'] = True
+    yield
+    rollup_config['enabled'] = False
+
+
+def test_non_database_errors_do_not_kill_the_writer(rollup_enabled):
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=100, max_batch=100)
+    results = submit_all(writer, [('2024-01-05', 1, 1, 'good'), ('not-a-date', 1, 1, 'bad')])
+    assert isinstance(results['bad'], ValueError)
+    assert isinstance(results['good'], int)
+    # 写线程仍在运行，后续请求正常写入
+    assert isinstance(writer.submit(('2024-01-06', 1, 1, 'later'), timeout=5), int)
+
+
+def test_unexpected_flush_error_fails_the_batch_only(monkeypatch):
+    writer = WriteCoalescer('pension_payments', COLUMNS, max_delay_ms=1, max_batch=100)
+
+    def broken():
+        raise RuntimeError('connection factory broken')
+
+    monkeypatch.setattr(coalescer, 'get_db_connection', broken)
+    with pytest.raises(RuntimeError):
+        writer.submit(('2024-01-05', 1, 1, 'r'), timeout=5)
+    monkeypatch.undo()
+    assert isinstance(writer.submit(('2024-01-05', 1, 1, 'r'), timeout=5), int)
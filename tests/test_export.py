@@ -0,0 +1,27 @@
+import importlib
+
+import pytest
+
+from utils.migrate import export_columns
+
+ROUTES = {
+    'pension_payments': 'routes.pension_routes',
+    'social_security_payments': 'routes.social_security_routes',
+    'medical_insurance_payments': 'routes.medical_insurance_payments',
+}
+
+
+def test_csv_content_type_has_a_single_charset(client):
+    response = client.get('/api/pension_payments/export?format=csv')
+    assert response.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    response.close()
+
+
+@pytest.mark.parametrize('table', ROUTES)
+def test_export_columns_match_query_columns(client, table):
+    columns = importlib.import_module(ROUTES[table]).QUERY_COLUMNS
+    response = client.get(f'/api/{table}/export?format=csv')
+    assert response.get_data(as_text=True).splitlines()[0] == ','.join(columns)
+    response.close()
+    # utils.migrate explain 检查的导出查询与接口相同
+    assert export_columns(table) == columns
@@ -0,0 +1,33 @@
+import pytest
+
+from utils import ingest
+
+NDJSON = {'Content-Type': 'application/x-ndjson'}
+GOOD = '{"date": "2024-01-05", "personal_payment": 1, "company_payment": 2, "remarks": "ok"}\n'
+BAD = '{"date": "2024-13-05", "personal_payment": -1, "company_payment": 2, "remarks": "bad"}\n'
+
+
+@pytest.mark.parametrize('table', ['pension_payments', 'medical_insurance_payments'])
+def test_created_when_any_row_lands(client, table):
+    response = client.post(f'/api/{table}/batch', data=GOOD + BAD, headers=NDJSON)
+    assert response.status_code == 201
+    assert response.get_json()['inserted_count'] == 1
+
+
+@pytest.mark.parametrize('body', [BAD + 'not json\n', ''])
+def test_rejected_when_nothing_lands(client, body):
+    response = client.post('/api/pension_payments/batch', data=body, headers=NDJSON)
+    assert response.status_code == 400
+    report = response.get_json()
+    assert report['inserted_count'] == 0
+    assert report['message'] == 'No pension records inserted'
+
+
+def test_database_error_when_nothing_lands(client, monkeypatch):
+    def broken(*args):
+        raise ingest.Error('table is locked')
+
+    monkeypatch.setattr(ingest, '_insert_chunk', broken)
+    response = client.post('/api/pension_payments/batch', data=GOOD, headers=NDJSON)
+    assert response.status_code == 500
+    assert response.get_json()['chunks'][0]['error'] == 'table is locked'
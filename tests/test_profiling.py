@@ -0,0 +1,39 @@
+import pytest
+
+from config import profiling_config
+
+REMOTE = {'REMOTE_ADDR': '10.0.0.8'}
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setitem(profiling_config, 'admin_token', 's3cret')
+    return 's3cret'
+
+
+@pytest.mark.parametrize('path', ['/api/admin/profiling', '/api/admin/slow_log', '/api/admin/profiles/1'])
+def test_admin_endpoints_are_loopback_only_without_token(client, path):
+    assert client.get(path, environ_base=REMOTE).status_code == 403
+    assert client.get(path).status_code in (200, 404)
+
+
+def test_admin_token_is_required_when_configured(client, admin_token):
+    assert client.get('/api/admin/profiling').status_code == 403
+    assert client.get('/api/admin/profiling', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.get('/api/admin/profiling', headers={'X-Admin-Token': admin_token}, environ_base=REMOTE)
+    assert response.status_code == 200
+
+
+def test_switch_cannot_be_toggled_remotely(client):
+    response = client.post('/api/admin/profiling', json={'enabled': True}, environ_base=REMOTE)
+    assert response.status_code == 403
+    assert client.get('/api/admin/profiling').get_json()['enabled'] is False
+
+
+def test_profile_header_ignored_unless_enabled(client, monkeypatch):
+    response = client.get('/api/pension_payments', headers={'X-Profile': 'cprofile'})
+    assert 'X-Profile-Id' not in response.headers
+    monkeypatch.setitem(profiling_config, 'header_enabled', True)
+    response = client.get('/api/pension_payments', headers={'X-Profile': 'cprofile'})
+    profile_id = response.headers['X-Profile-Id']
+    assert 'cprofile' in client.get(f'/api/admin/profiles/{profile_id}').get_json()
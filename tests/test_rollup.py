@@ -0,0 +1,70 @@
+import pytest
+
+from config import rollup_config
+from conftest import query
+from utils.rollup import SummaryError, parse_summary_args, summary_query
+
+
+@pytest.fixture
+def rollup_enabled():
+    rollup_config['enabled'] = True
+    yield
+    rollup_config['enabled'] = False
+
+
+def insert(*dates):
+    for day in dates:
+        query("INSERT INTO pension_payments (date, personal_payment, company_payment, remarks) "
+              "VALUES (?, 1, 2, 'r')", (day,))
+
+
+def test_parse_summary_args_pads_dates():
+    assert parse_summary_args({'start_date': '2024-1-5', 'end_date': '2024-1-31'}) == \
+        ('month', '2024-01-05', '2024-01-31')
+
+
+def test_parse_summary_args_rejects_invalid_dates():
+    with pytest.raises(SummaryError):
+        parse_summary_args({'end_date': '2024-13-01'})
+
+
+def test_summary_query_bounds_without_padding():
+    _, params = summary_query('pension_payments', 'month', '2024-1-05', '2024-1-31')
+    assert params == ['2024-01-01', '2024-02-01']
+
+
+def test_rollup_summary_query_bounds_without_padding(rollup_enabled):
+    _, params = summary_query('pension_payments', 'month', '2024-1-05', '2024-12-31')
+    assert params == ['pension_payments', 2024, 2024, 1, 2024, 2024, 12]
+
+
+@pytest.mark.parametrize('args', [
+    'start_date=2024-1-05&end_date=2024-1-31',
+    'start_date=2024-01-05&end_date=2024-01-31',
+])
+def test_summary_endpoint_accepts_unpadded_dates(client, args):
+    insert('2023-12-31', '2024-01-05', '2024-01-31', '2024-02-01')
+    response = client.get(f'/api/pension_payments/summary?{args}')
+    assert response.status_code == 200
+    records = response.get_json()['records']
+    assert [(record['period'], record['count']) for record in records] == [('2024-01', 2)]
+
+
+def test_statements_endpoint_accepts_unpadded_end_date(client):
+    insert('2024-01-05')
+    response = client.get('/api/statements?end_date=2024-1-31')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path, record', [
+    ('/api/pension_payments', {'remarks': 'r'}),
+    ('/api/social_security_payments', {'personal_account': 3, 'remarks': 'r'}),
+    ('/api/medical_insurance_payments', {'remarks': 'r'}),
+])
+def test_insert_with_unpadded_date_updates_rollup(client, rollup_enabled, path, record):
+    from utils.rollup import CREATE_ROLLUP_TABLE
+    query(CREATE_ROLLUP_TABLE)
+    query('DELETE FROM payment_monthly_rollups')
+    response = client.post(path, json={'date': '2024-1-5', 'personal_payment': 1, 'company_payment': 2, **record})
+    assert response.status_code == 201
+    assert query('SELECT year, month, record_count FROM payment_monthly_rollups') == [(2024, 1, 1)]
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+from mysql.connector import errors
+
+from config import rollup_config
+from conftest import query
+from utils import spool
+from utils.rollup import CREATE_ROLLUP_TABLE
+
+COLUMNS = ['date', 'personal_payment', 'company_payment', 'remarks']
+
+
+@pytest.fixture
+def spools(tmp_path):
+    """按需创建同一个通道目录上的 WriteSpool（模拟进程重启），测试结束时全部关闭"""
+    opened = []
+
+    def open_spool(**kwargs):
+        lane_spool = spool.WriteSpool(str(tmp_path / 'lane-0'), 'test:0', **kwargs).recover()
+        opened.append(lane_spool)
+        return lane_spool
+
+    yield open_spool
+    for lane_spool in opened:
+        lane_spool.stop()
+
+
+def append(lane_spool, count, start=0, date='2024-01-05'):
+    return [lane_spool.append('pension_payments', COLUMNS, [date, i, i, f'r{i}'])
+            for i in range(start, start + count)]
+
+
+def pension_remarks():
+    return [row[0] for row in query('SELECT remarks FROM pension_payments ORDER BY id')]
+
+
+def drain_all(lane_spool):
+    total = 0
+    while True:
+        count = lane_spool.drain_once()
+        if not count:
+            return total
+        total += count
+
+
+def test_append_and_drain(spools):
+    lane_spool = spools()
+    ids = append(lane_spool, 3)
+    assert ids == ['test:0:1', 'test:0:2', 'test:0:3']
+    assert drain_all(lane_spool) == 3
+    assert pension_remarks() == ['r0', 'r1', 'r2']
+    assert query('SELECT lane, seq FROM spool_progress') == [('test:0', 3)]
+    assert spool.lookup('test:0:3')['status'] == 'applied'
+    assert lane_spool.stats()['depth'] == 0
+
+
+def test_recovery_truncates_torn_tail(spools):
+    lane_spool = spools()
+    append(lane_spool, 5)
+    path = lane_spool._segments[-1][1]
+    valid_size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(spool._encode(6, 0.0, b'{"table":"pension_payments"}')[:20])
+    lane_spool.stop()
+
+    recovered = spools()
+    assert os.path.getsize(path) == valid_size
+    assert recovered.append('pension_payments', COLUMNS, ['2024-01-05', 5, 5, 'r5']) == 'test:0:6'
+    assert drain_all(recovered) == 6
+    assert pension_remarks() == [f'r{i}' for i in range(6)]
+
+
+def test_restart_skips_records_already_committed(spools):
+    lane_spool = spools()
+    append(lane_spool, 5)
+    assert drain_all(lane_spool) == 5
+    lane_spool.stop()
+
+    # 本地检查点落后于 MySQL 中的进度（分段未删除），重启后不能重复写入
+    restarted = spools()
+    assert restarted._committed == 0
+    assert drain_all(restarted) == 0
+    append(restarted, 1, start=5)
+    assert drain_all(restarted) == 1
+    assert pension_remarks() == [f'r{i}' for i in range(6)]
+
+
+def test_drained_segments_are_deleted_and_sequence_continues(spools):
+    lane_spool = spools(segment_bytes=512)
+    append(lane_spool, 40)
+    assert len(lane_spool._segments) > 1
+    assert drain_all(lane_spool) == 40
+    assert len(lane_spool._segments) == 1
+    assert spool._read_checkpoint(lane_spool.directory) >= 1
+    lane_spool.stop()
+
+    restarted = spools(segment_bytes=512)
+    assert append(restarted, 1, start=40) == ['test:0:41']
+    assert drain_all(restarted) == 1
+    assert len(pension_remarks()) == 41
+
+
+def test_transient_error_keeps_records(spools, monkeypatch):
+    lane_spool = spools()
+    append(lane_spool, 3)
+
+    def unavailable(*args, **kwargs):
+        raise errors.OperationalError(msg='MySQL server has gone away', errno=2006)
+
+    monkeypatch.setattr(spool, 'get_db_connection', unavailable)
+    with pytest.raises(errors.OperationalError):
+        lane_spool.drain_once()
+    assert lane_spool.stats()['depth'] == 3
+    monkeypatch.undo()
+    assert drain_all(lane_spool) == 3
+    assert pension_remarks() == ['r0', 'r1', 'r2']
+
+
+@pytest.fixture
+def rollup_enabled():
+    query(CREATE_ROLLUP_TABLE)
+    query('DELETE FROM payment_monthly_rollups')
+    rollup_config['enabled'] = True
+    yield
+    rollup_config['enabled'] = False
+
+
+def test_poison_record_is_rejected_without_blocking_the_lane(spools, rollup_enabled):
+    lane_spool = spools()
+    append(lane_spool, 1)
+    poison = append(lane_spool, 1, start=1, date='not-a-date')[0]
+    append(lane_spool, 1, start=2)
+
+    assert drain_all(lane_spool) == 3
+    assert pension_remarks() == ['r0', 'r2']
+    rejected = query('SELECT lane, seq, error FROM spool_rejected')
+    assert [(lane, seq) for lane, seq, _ in rejected] == [('test:0', 2)]
+    assert 'ValueError' in rejected[0][2]
+    assert spool.lookup(poison)['status'] == 'rejected'
+    assert lane_spool.stats()['depth'] == 0
+
+    append(lane_spool, 1, start=3)
+    assert drain_all(lane_spool) == 1
+    assert pension_remarks() == ['r0', 'r2', 'r3']
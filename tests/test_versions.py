@@ -0,0 +1,69 @@
+import gzip
+import json
+
+import pytest
+
+import serve
+from config import server_config, version_config
+from utils.versions import local_version, store_kind
+
+
+@pytest.fixture
+def restore_config():
+    saved = dict(version_config), server_config['workers']
+    yield
+    version_config.update(saved[0])
+    server_config['workers'] = saved[1]
+
+
+@pytest.mark.parametrize('store, workers, expected', [
+    ('auto', 4, 'file'),
+    ('auto', 1, 'memory'),
+    ('memory', 4, 'memory'),
+    ('file', 1, 'file'),
+])
+def test_store_kind(restore_config, store, workers, expected):
+    version_config['store'] = store
+    server_config['workers'] = workers
+    assert store_kind() == expected
+
+
+def test_serve_refuses_memory_store_with_several_workers(restore_config):
+    version_config['store'] = 'memory'
+    with pytest.raises(SystemExit):
+        serve._check_version_store(4)
+    serve._check_version_store(1)
+    version_config['store'] = 'auto'
+    serve._check_version_store(4)
+
+
+def bumps(client, method, path, **kwargs):
+    """请求 path，返回本进程 pension_payments 版本号的递增次数"""
+    before = local_version('pension_payments')
+    getattr(client, method)(path, **kwargs)
+    return local_version('pension_payments') - before
+
+
+RECORD = {'date': '2024-01-05', 'personal_payment': 1, 'company_payment': 2, 'remarks': 'ok'}
+
+
+def test_rejected_writes_keep_the_version(client):
+    assert bumps(client, 'post', '/api/pension_payments', json={'date': '2024-01-05'}) == 0
+    assert bumps(client, 'delete', '/api/pension_payments/batch', json={'ids': 'x'}) == 0
+    assert bumps(client, 'delete', '/api/pension_payments?start_date=bad') == 0
+    assert bumps(client, 'delete', '/api/pension_payments/999') == 0
+
+
+def test_successful_writes_bump_the_version(client):
+    assert bumps(client, 'post', '/api/pension_payments', json=RECORD) == 1
+    assert bumps(client, 'delete', '/api/pension_payments?start_date=2024-01-01&end_date=2024-12-31') == 1
+
+
+def test_partially_committed_ingest_bumps_the_version(client):
+    body = gzip.compress((json.dumps(RECORD) + '\n').encode() * 50)[:-20]
+    before = local_version('pension_payments')
+    response = client.post('/api/pension_payments/batch?chunk_size=1', data=body, headers={
+        'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+    assert response.get_json()['inserted_count'] > 0
+    assert local_version('pension_payments') == before + 1
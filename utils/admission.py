@@ -0,0 +1,195 @@
+import math
+import threading
+import time
+
+from flask import g, jsonify, request
+from config import admission_config
+from utils.db import client_key
+from utils.metrics import inc, metrics_enabled
+
+
+def route_class(req):
+    """
+    按路由判断请求类别：
+    - bulk：/batch 批量插入和删除、/export 导出、按日期范围删除；
+    - write：单条插入和删除；
+    - read：查询、汇总和统计。
+    蓝图之外的接口（监控、统计、管理）不分类，不受准入控制。
+    """
+    if req.blueprint is None or req.url_rule is None:
+        return None
+    rule = req.url_rule.rule
+    if rule.endswith('/batch') or rule.endswith('/export'):
+        return 'bulk'
+    if req.method == 'DELETE':
+        return 'write' if req.view_args else 'bulk'
+    if req.method in ('POST', 'PUT', 'PATCH'):
+        return 'write'
+    return 'read'
+
+
+class RouteLimiter:
+    """
+    一类路由的并发上限和排队上限：正在执行的请求数达到 concurrency 时新请求排队等待，
+    排队数也达到 queue 或等待超过 queue_timeout 秒时拒绝，不再占用数据库连接和工作线程。
+    """
+
+    def __init__(self, name, concurrency, queue, queue_timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """占用一个执行名额，成功返回 True；队列已满或等待超时返回 False"""
+        with self._cond:
+            if self.active < self.concurrency and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.concurrency, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'concurrency': self.concurrency,
+                'queue': self.queue,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+class TokenBuckets:
+    """每个客户端一个令牌桶：每秒补充 rate 个令牌，最多积累 burst 个，每个请求消耗一个"""
+
+    # 客户端数超过该值时清理已补满（长时间未请求）的桶
+    MAX_CLIENTS = 10000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}      # 客户端 -> [令牌数, 上次补充时间]
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_CLIENTS:
+                    self._evict(now)
+                bucket = self._buckets[client] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    def _evict(self, now):
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[client]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_limiters = {}
+_buckets = {}
+
+
+def _build():
+    for name, limits in admission_config['classes'].items():
+        _limiters[name] = RouteLimiter(name, limits['concurrency'], limits['queue'], limits['queue_timeout'])
+        rate_limit = limits.get('rate_limit')
+        if rate_limit:
+            _buckets[name] = TokenBuckets(rate_limit['rate'], rate_limit['burst'])
+
+
+def _reject(name, reason, retry_after):
+    if metrics_enabled():
+        inc('payment_admission_rejected_total', (('class', name), ('reason', reason)))
+    response = jsonify({'error': f'Too many {name} requests, retry later', 'reason': reason})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit():
+    """before_request 钩子：先按客户端限速，再按路由类别限制并发，超限时直接返回 429"""
+    name = route_class(request)
+    limiter = _limiters.get(name)
+    if limiter is None:
+        return None
+    buckets = _buckets.get(name)
+    if buckets is not None:
+        wait = buckets.take(client_key())
+        if wait:
+            return _reject(name, 'rate_limited', wait)
+    if not limiter.acquire():
+        return _reject(name, 'overloaded', admission_config['classes'][name]['retry_after'])
+    g.admission_limiter = limiter
+    return None
+
+
+def _release():
+    limiter = g.pop('admission_limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+
+def admission_stats():
+    return {
+        name: {**limiter.stats(), 'rate_limited_clients': len(_buckets[name]) if name in _buckets else None}
+        for name, limiter in _limiters.items()
+    }
+
+
+def init_app(app):
+    """
+    注册准入控制钩子。执行名额在响应关闭时归还，流式导出在输出完毕前一直占用名额；
+    处理过程中出现未捕获的异常时在请求结束时归还。限制按工作进程计算。
+    """
+    if not admission_config['enabled']:
+        return
+    _build()
+    app.before_request(admit)
+
+    @app.after_request
+    def _release_on_close(response):
+        limiter = g.pop('admission_limiter', None)
+        if limiter is not None:
+            response.call_on_close(limiter.release)
+        return response
+
+    @app.teardown_request
+    def _release_on_error(exc):
+        _release()
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+from config import cache_config, version_config
+from utils.versions import table_version, version_stamp
+from utils.profiling import note
+
+
+class ResponseCache:
+    """
+    查询结果的进程内 LRU + TTL 缓存，缓存序列化后的响应体。
+    每个条目记录写入时相关各表的版本号，任一表有写操作（版本号递增）后旧条目不再命中。
+    """
+
+    def __init__(self, max_entries=1024, ttl=30, max_body_bytes=1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_body_bytes = max_body_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, tables, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                versions, expires_at, body, mimetype = entry
+                if versions == table_versions(tables) and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return body, mimetype
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key, versions, body, mimetype):
+        if len(body) > self.max_body_bytes:
+            return
+        with self._lock:
+            self._entries[key] = (versions, time.monotonic() + self.ttl, body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=cache_config['max_entries'],
+    ttl=cache_config['ttl'],
+    max_body_bytes=cache_config['max_body_bytes'],
+)
+
+
+def table_versions(tables):
+    return tuple(table_version(table) for table in tables)
+
+
+def cache_key(tables):
+    """由表名、路径和规范化后的查询参数（忽略空值、按名称排序）组成缓存键"""
+    params = tuple(sorted(
+        (name, tuple(value for value in values if value))
+        for name, values in request.args.lists()
+        if any(values)
+    ))
+    return tables, request.path, params
+
+
+def response_etag(tables, key):
+    """由各表版本号和缓存键（即规范化后的查询条件）生成的弱 ETag，数据或查询条件变化后随之改变"""
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+    return f'{version_stamp(tables)}-{digest}'
+
+
+def cached_response(*tables):
+    """
+    查询接口装饰器：
+    - 请求头 If-None-Match 与当前 ETag 相同时直接返回 304，不访问数据库也不序列化；
+    - 命中缓存时直接返回缓存的响应体，不访问数据库；
+    - 未命中时执行查询，并缓存 200 响应。
+    200 响应带有 ETag，客户端轮询时带上 If-None-Match 即可。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            use_cache = cache_config['enabled']
+            use_etag = version_config['etag']
+            if not use_cache and not use_etag:
+                return view(*args, **kwargs)
+            key = cache_key(tables)
+            # 在查询前取版本号，查询期间发生写操作时缓存的条目和签发的 ETag 会立即失效
+            versions = table_versions(tables)
+            etag = response_etag(tables, key) if use_etag else None
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                note('cache', 'not_modified')
+                response = make_response('', 304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            cached = response_cache.get(tables, key) if use_cache else None
+            if use_cache:
+                note('cache', 'hit' if cached is not None else 'miss')
+            if cached is not None:
+                body, mimetype = cached
+                response = make_response(body, 200)
+                response.mimetype = mimetype
+            else:
+                response = make_response(view(*args, **kwargs))
+                if use_cache and response.status_code == 200 and not response.is_streamed:
+                    response_cache.put(key, versions, response.get_data(), response.mimetype)
+            if etag is not None and response.status_code == 200:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,218 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from mysql.connector import Error
+from config import coalesce_config
+from utils.db import get_db_connection
+from utils.rollup import record_inserted
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescerTimeoutError(Error):
+    """等待合并写入结果超时"""
+
+
+class WriteCoalescer:
+    """
+    单条插入的合并写入器（group commit）。
+    请求线程调用 submit() 提交一行数据并等待结果；后台写线程收集同一张表的插入，
+    在 max_delay_ms 毫秒内或凑满 max_batch 行后在一个事务中写入、一次提交，再把各自的新记录 ID 交还给对应请求。
+    innodb_autoinc_lock_mode ≤ 1 时一条多行 INSERT 分配的自增 ID 连续，用一条多行 INSERT 写入并按步长推算各行 ID；
+    否则（MySQL 8 默认为 2，并发插入的 ID 可能交错）逐行 INSERT，各行 ID 取自各自的 lastrowid。
+    """
+
+    def __init__(self, table, columns, max_delay_ms=5, max_batch=100):
+        self.table = table
+        self.columns = columns
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._increment = None
+        self._consecutive = None
+        self._stats = {
+            'submitted': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'max_batch_rows': 0,
+            'fallback_flushes': 0,
+            'errors': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name=f'coalescer-{self.table}', daemon=True)
+                    self._thread.start()
+
+    def submit(self, values, timeout=None):
+        """提交一行插入数据，阻塞直到所在批次提交，返回新记录 ID；写入失败时抛出 mysql.connector.Error"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((values, future))
+        with self._lock:
+            self._stats['submitted'] += 1
+        timeout = timeout if timeout is not None else coalesce_config['wait_timeout']
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # 尚未开始写入的请求可以撤销；已在写入中的请求结果未知
+            state = 'cancelled' if future.cancel() else 'still in flight'
+            raise CoalescerTimeoutError(msg=f'Timed out after {timeout}s waiting for coalesced insert ({state})')
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 只处理仍在等待结果的请求（已超时放弃的请求不再写入）
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+
+    def _insert_query(self, rows):
+        placeholders = '(' + ', '.join(['%s'] * len(self.columns)) + ')'
+        return (f"INSERT INTO `{self.table}` ({', '.join(f'`{c}`' for c in self.columns)}) "
+                f"VALUES {', '.join([placeholders] * rows)}")
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        connection = cursor = None
+        try:
+            connection, cursor = get_db_connection()
+            if self._consecutive is None:
+                self._check_auto_increment(cursor)
+            try:
+                ids = self._insert(cursor, batch)
+                record_inserted(connection, self.table, [values for values, _ in batch])
+                connection.commit()
+                for record_id, (_, future) in zip(ids, batch):
+                    future.set_result(record_id)
+            except Exception as e:
+                # 整批失败时逐行重试，只让有问题的那一行失败（包括写入钩子抛出的非数据库异常）
+                connection.rollback()
+                logger.error(f"Coalesced insert into {self.table} failed, retrying row by row: {str(e)}")
+                self._flush_one_by_one(connection, cursor, batch)
+                fallback = True
+            else:
+                fallback = False
+            self._record(len(batch), started, fallback)
+        except Exception as e:
+            # 任何异常都只让本批请求失败，写线程继续处理后续批次
+            logger.error(f"Error in coalescer for {self.table}: {str(e)}")
+            with self._lock:
+                self._stats['errors'] += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if connection is not None and connection.is_connected():
+                connection.close()
+
+    def _check_auto_increment(self, cursor):
+        """
+        首次写入时读取自增 ID 的分配方式：innodb_autoinc_lock_mode 为 0 或 1 时，一条多行 INSERT
+        分配的 ID 连续、步长为 auto_increment_increment；为 2 或无法读取时不能按步长推算 ID。
+        """
+        cursor.execute("SELECT @@session.auto_increment_increment")
+        self._increment = cursor.fetchone()[0]
+        try:
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode")
+            lock_mode = cursor.fetchone()[0]
+        except Error as e:
+            logger.warning(f"Cannot read innodb_autoinc_lock_mode, inserting {self.table} row by row: {str(e)}")
+            lock_mode = None
+        self._consecutive = lock_mode is not None and int(lock_mode) <= 1
+
+    def _insert(self, cursor, batch):
+        """在当前事务中写入一批行（不提交），按顺序返回各行的新记录 ID"""
+        if self._consecutive:
+            cursor.execute(self._insert_query(len(batch)),
+                           [value for values, _ in batch for value in values])
+            first_id = cursor.lastrowid
+            return [first_id + index * self._increment for index in range(len(batch))]
+        query = self._insert_query(1)
+        ids = []
+        for values, _ in batch:
+            cursor.execute(query, values)
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def _flush_one_by_one(self, connection, cursor, batch):
+        query = self._insert_query(1)
+        for values, future in batch:
+            try:
+                cursor.execute(query, values)
+                record_id = cursor.lastrowid
+                record_inserted(connection, self.table, [values])
+                connection.commit()
+                future.set_result(record_id)
+            except Exception as e:
+                connection.rollback()
+                with self._lock:
+                    self._stats['errors'] += 1
+                future.set_exception(e)
+
+    def _record(self, rows, started, fallback):
+        with self._lock:
+            stats = self._stats
+            stats['flushes'] += 1
+            stats['rows_flushed'] += rows
+            stats['max_batch_rows'] = max(stats['max_batch_rows'], rows)
+            stats['fallback_flushes'] += fallback
+            stats['last_flush_ms'] = round((time.monotonic() - started) * 1000, 3)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_rows'] = round(stats['rows_flushed'] / stats['flushes'], 2) if stats['flushes'] else 0
+        stats['max_delay_ms'] = self.max_delay * 1000
+        stats['max_batch'] = self.max_batch
+        stats['multi_row_insert'] = self._consecutive
+        return stats
+
+
+_coalescers = {}
+_coalescers_lock = threading.Lock()
+
+
+def coalescing_enabled():
+    return coalesce_config['enabled']
+
+
+def get_coalescer(table, columns):
+    """获取指定表的合并写入器，首次调用时创建"""
+    coalescer = _coalescers.get(table)
+    if coalescer is None:
+        with _coalescers_lock:
+            coalescer = _coalescers.get(table)
+            if coalescer is None:
+                coalescer = WriteCoalescer(
+                    table, columns,
+                    max_delay_ms=coalesce_config['max_delay_ms'],
+                    max_batch=coalesce_config['max_batch'])
+                _coalescers[table] = coalescer
+    return coalescer
+
+
+def coalescer_stats():
+    """各表合并写入器的统计信息"""
+    return {table: coalescer.stats() for table, coalescer in _coalescers.items()}
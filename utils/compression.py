@@ -0,0 +1,100 @@
+import zlib
+
+from flask import request
+from config import compression_config
+
+# zstd 和 brotli 为可选依赖（pip install zstandard brotli），未安装时只协商 gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _gzip_compressor():
+    compressor = zlib.compressobj(compression_config['gzip_level'], zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _zstd_compressor():
+    compressor = zstandard.ZstdCompressor(level=compression_config['zstd_level']).compressobj()
+    return compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+
+
+def _brotli_compressor():
+    compressor = brotli.Compressor(quality=compression_config['brotli_quality'])
+    return compressor.process, compressor.flush, compressor.finish
+
+
+# Content-Encoding -> 创建压缩器的函数，压缩器为 (compress, flush, finish) 三个函数
+COMPRESSORS = {'gzip': _gzip_compressor}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd_compressor
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli_compressor
+
+
+def negotiate(accept_encodings):
+    """按配置的优先顺序选出客户端接受且本机可用的编码，都不接受时返回 None"""
+    for encoding in compression_config['algorithms']:
+        if encoding in COMPRESSORS and accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def _compressible(response):
+    if response.status_code != 200 or request.method == 'HEAD' or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    return response.mimetype in compression_config['mimetypes']
+
+
+def _stream(chunks, compressor):
+    """逐块压缩流式响应，每块压缩后立即刷出，客户端无需等待整个响应生成完毕"""
+    compress, flush, finish = compressor
+    for chunk in chunks:
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(response):
+    """
+    按 Accept-Encoding 压缩响应：
+    - 普通响应不小于 min_size 字节时整体压缩；
+    - 流式响应（导出等生成器）无法预知大小，总是逐块压缩。
+    """
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream(response.iter_encoded(), COMPRESSORS[encoding]())
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < compression_config['min_size']:
+            return response
+        compress, _, finish = COMPRESSORS[encoding]()
+        response.set_data(compress(data) + finish())
+    response.headers['Content-Encoding'] = encoding
+    # 强 ETag 标识逐字节相同的响应，压缩后的表示需要不同的 ETag；弱 ETag 不受影响
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def init_app(app):
+    """注册响应压缩钩子。after_request 钩子按注册的相反顺序执行，最后注册时最先压缩，压缩耗时计入延迟统计"""
+    if not compression_config['enabled']:
+        return
+    app.after_request(compress_response)
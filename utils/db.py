@@ -1,11 +1,529 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import mysql.connector
-from mysql.connector import Error
-from config import db_config
+from flask import has_request_context, request
+from mysql.connector import Error, errors
+from config import db_config, pool_config, replica_config
+from utils.metrics import TimedCursor, metrics_enabled, observe_db_wait
+from utils.profiling import current_profile, note
+from utils.versions import seconds_since_write
+
+
+class PoolTimeoutError(Error):
+    """连接池已满且在等待时间内没有空闲连接"""
+
+
+class PooledConnection:
+    """
+    连接池借出的连接代理。
+    除 close() 外的所有属性都转发给底层 MySQL 连接；close() 不会断开连接，而是把它归还给连接池，
+    因此沿用 "finally: connection.close()" 写法的旧代码无需修改。
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._on_commit = []
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def on_commit(self, callback):
+        """登记在当前事务提交后执行的回调（如更新进程内的快照），事务回滚或连接归还时丢弃"""
+        self._on_commit.append(callback)
+
+    def commit(self):
+        self._raw.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._on_commit = []
+        self._raw.rollback()
+
+    def cursor(self, *args, **kwargs):
+        """创建游标；开启监控指标或请求分析时包装为记录执行耗时的游标"""
+        cursor = self._raw.cursor(*args, **kwargs)
+        return TimedCursor(cursor) if metrics_enabled() or current_profile() is not None else cursor
+
+    @property
+    def raw(self):
+        """底层 MySQL 连接，归还后为 None"""
+        return self._raw
+
+    def is_connected(self):
+        # 已归还的连接对调用方而言视为已断开，避免重复归还
+        return self._raw is not None and self._raw.is_connected()
+
+    def close(self):
+        """归还连接到连接池（可重复调用）"""
+        if self._raw is None:
+            return
+        self._on_commit = []
+        raw, self._raw = self._raw, None
+        self._pool.release(raw, self._created_at)
+
+    def discard(self):
+        """
+        丢弃连接而不归还（例如流式读取中途中止、仍有未读结果时），
+        直接断开底层连接并释放连接池名额。
+        """
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._pool.discard(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    有界 MySQL 连接池：
+    - 最多 pool_size 个连接，池满时调用方排队等待，超过 checkout_timeout 秒抛出 PoolTimeoutError；
+    - 借出时校验连接（空闲超过 ping_interval 秒则 ping），失效连接直接重建；
+    - 连接存活超过 max_age 秒后回收重建；
+    - 归还时回滚未结束的事务，避免下一个借用者读到旧快照。
+    """
+
+    def __init__(self, pool_size=10, max_age=1800, checkout_timeout=5, ping_interval=0, **connect_args):
+        if pool_size < 1:
+            raise ValueError('pool_size must be a positive integer')
+        self.pool_size = pool_size
+        self.max_age = max_age
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self._connect_args = connect_args
+        # 空闲连接：(连接, 创建时间, 最近归还时间)，后进先出以复用最热的连接
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+        self._cond = threading.Condition(threading.Lock())
+
+    def _connect(self):
+        return mysql.connector.connect(**self._connect_args), time.monotonic()
+
+    def _expired(self, created_at, now):
+        return self.max_age and now - created_at >= self.max_age
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def acquire(self, timeout=None):
+        """借出一个可用连接，返回 PooledConnection"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                while not self._idle and self._size >= self.pool_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            msg=f'Timed out after {timeout}s waiting for a database connection '
+                                f'(pool_size={self.pool_size})')
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    # 先占位再在锁外建立连接，避免握手期间阻塞其他线程
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    raw, created_at = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+                return PooledConnection(self, raw, created_at)
+
+            raw, created_at, released_at = entry
+            now = time.monotonic()
+            if self._expired(created_at, now):
+                self._discard(raw)
+                self._forget()
+                continue
+            if now - released_at >= self.ping_interval:
+                try:
+                    raw.ping(reconnect=False)
+                except Error:
+                    self._discard(raw)
+                    self._forget()
+                    continue
+            return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at):
+        """归还连接；事务未结束则回滚，连接失效或过期则关闭"""
+        try:
+            if raw.in_transaction or raw.unread_result:
+                raw.rollback()
+        except Error:
+            self._discard(raw)
+            self._forget()
+            return
+        now = time.monotonic()
+        if self._expired(created_at, now):
+            self._discard(raw)
+            self._forget()
+            return
+        with self._cond:
+            self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def discard(self, raw):
+        """断开一个借出的连接并释放名额"""
+        raw.shutdown()
+        self._forget()
+
+    def _forget(self):
+        """释放一个连接名额并唤醒等待者"""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+            }
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接在归还时正常处理）"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+
+class Replica:
+    """一个只读副本：自己的连接池，以及可用性和复制延迟状态"""
+
+    # 查询复制状态的语句及延迟列，MySQL 8.0.22 起为 REPLICA 写法，8.4 起不再支持 SLAVE 写法
+    STATUS_STATEMENTS = (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                         ('SHOW SLAVE STATUS', 'Seconds_Behind_Master'))
+
+    def __init__(self, settings, checkout_timeout):
+        settings = dict(settings)
+        self.weight = settings.pop('weight', 1)
+        connect_args = {**db_config, **settings}
+        self.name = f"{connect_args['host']}:{connect_args.get('port', 3306)}"
+        self.pool = ConnectionPool(**{**pool_config, 'checkout_timeout': checkout_timeout}, **connect_args)
+        self.down_until = 0.0
+        self.last_error = None
+        self.lag = None
+        self.checked_at = None
+        self.reads = 0
+        self._statements = self.STATUS_STATEMENTS
+        self._check_lock = threading.Lock()
+
+    def available(self, now):
+        return now >= self.down_until
+
+    def busy(self):
+        """借出和等待中的连接数相对权重的比值，least_busy 选择该值最小的副本"""
+        stats = self.pool.stats()
+        return (stats['in_use'] + stats['waiting']) / self.weight
 
-def get_db_connection(dictionary=False):
+    def mark_down(self, error, retry_after):
+        self.down_until = time.monotonic() + retry_after
+        self.last_error = str(error)
+
+    def _replication_lag(self, connection):
+        """副本落后主库的秒数，复制未运行或不是副本时返回 None"""
+        cursor = connection.raw.cursor(dictionary=True)
+        try:
+            for statement, column in self._statements:
+                try:
+                    cursor.execute(statement)
+                except errors.ProgrammingError:
+                    continue
+                self._statements = ((statement, column),)
+                rows = cursor.fetchall()
+                lags = [row.get(column) for row in rows]
+                if not lags or None in lags:
+                    return None
+                return max(int(lag) for lag in lags)
+            return None
+        finally:
+            cursor.close()
+
+    def healthy(self, connection, max_lag, check_interval, retry_after):
+        """
+        复制延迟是否在 max_lag 秒以内；每 check_interval 秒最多查询一次复制状态，
+        其他线程在检查期间沿用上一次的结果。max_lag 为 None 时不检查（两个独立实例测试时使用）。
+        """
+        if max_lag is None:
+            return True
+        now = time.monotonic()
+        if (self.checked_at is None or now - self.checked_at >= check_interval) \
+                and self._check_lock.acquire(blocking=False):
+            try:
+                self.lag = self._replication_lag(connection)
+                self.checked_at = now
+            except Error as e:
+                self.mark_down(e, retry_after)
+                return False
+            finally:
+                self._check_lock.release()
+        if self.lag is None:
+            if self.checked_at is not None:
+                self.last_error = 'replication is not running'
+            return False
+        return self.lag <= max_lag
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'name': self.name,
+            'weight': self.weight,
+            'available': self.available(now),
+            'retry_in': round(max(0.0, self.down_until - now), 3),
+            'lag_seconds': self.lag,
+            'last_error': self.last_error,
+            'reads': self.reads,
+            'pool': self.pool.stats(),
+        }
+
+
+class ReplicaSet:
+    """
+    只读副本集合：按权重随机（weighted）或按借出连接数/权重最少（least_busy）选择副本；
+    副本连接失败、借不到连接或复制延迟超过 max_lag_seconds 时换下一个副本，都不可用时回退到主库。
+    连接失败的副本暂停使用 retry_after 秒。
+    """
+
+    def __init__(self, replicas, balance='least_busy', max_lag_seconds=5, check_interval=2,
+                 retry_after=10, checkout_timeout=1, **kwargs):
+        if balance not in ('weighted', 'least_busy'):
+            raise ValueError("balance must be 'weighted' or 'least_busy'")
+        self.replicas = [Replica(settings, checkout_timeout) for settings in replicas]
+        self.balance = balance
+        self.max_lag = max_lag_seconds
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.counts = {'replica_reads': 0, 'primary_reads': 0, 'pinned_reads': 0, 'fallbacks': 0}
+
+    def _candidates(self):
+        now = time.monotonic()
+        replicas = [replica for replica in self.replicas if replica.available(now)]
+        if self.balance == 'least_busy':
+            # 负载相同时随机打散，避免总是先选第一个副本
+            random.shuffle(replicas)
+            return sorted(replicas, key=Replica.busy)
+        ordered = []
+        while replicas:
+            replica = random.choices(replicas, weights=[r.weight for r in replicas])[0]
+            replicas.remove(replica)
+            ordered.append(replica)
+        return ordered
+
+    def acquire(self):
+        """从可用副本借出连接，返回 (PooledConnection, 副本)，没有可用副本时返回 (None, None)"""
+        for replica in self._candidates():
+            try:
+                connection = replica.pool.acquire()
+            except PoolTimeoutError:
+                continue
+            except Error as e:
+                replica.mark_down(e, self.retry_after)
+                continue
+            if not replica.healthy(connection, self.max_lag, self.check_interval, self.retry_after):
+                connection.close()
+                continue
+            replica.reads += 1
+            self.counts['replica_reads'] += 1
+            return connection, replica
+        self.counts['fallbacks'] += 1
+        return None, None
+
+    def stats(self):
+        return {
+            'balance': self.balance,
+            'max_lag_seconds': self.max_lag,
+            **self.counts,
+            'replicas': [replica.stats() for replica in self.replicas],
+        }
+
+    def close_all(self):
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_replicas = None
+# 最近写入过的客户端 -> 读请求改走主库的截止时间（time.monotonic()）
+_pinned_clients = {}
+_MAX_PINNED_CLIENTS = 10000
+
+
+def get_pool():
+    """获取进程内共享的连接池，首次调用时创建"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**pool_config, **db_config)
+    return _pool
+
+
+def get_replicas():
+    """获取进程内共享的只读副本集合，未配置副本时返回 None"""
+    global _replicas
+    if _replicas is None and replica_config['replicas']:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = ReplicaSet(**replica_config)
+    return _replicas
+
+
+def close_pool():
+    """关闭进程内连接池的空闲连接（工作进程退出时调用）"""
+    if _pool is not None:
+        _pool.close_all()
+    if _replicas is not None:
+        _replicas.close_all()
+
+
+def _reset_pool_after_fork():
+    """
+    fork 出的子进程不能使用父进程的连接（底层套接字与父进程共享），
+    丢弃继承来的连接池（不关闭连接，以免影响父进程），子进程首次使用时重新创建。
+    """
+    global _pool, _pool_lock, _replicas
+    _pool = None
+    _replicas = None
+    _pool_lock = threading.Lock()
+    _pinned_clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def client_key():
+    """识别客户端：replica_config['client_header'] 指定的请求头，未配置或未携带时为客户端 IP"""
+    header = replica_config['client_header']
+    return (header and request.headers.get(header)) or request.remote_addr
+
+
+def _pinned_to_primary(read_table):
+    """
+    读请求是否必须走主库：
+    - 当前客户端在 sticky_seconds 内写入过（本进程记录的客户端，或写响应设置的 Cookie 未过期）；
+    - 本进程在 sticky_seconds 内写入过该表，副本可能还没有这次写入，而查询缓存已按新版本号缓存。
+    """
+    window = replica_config['sticky_seconds']
+    age = seconds_since_write(read_table)
+    if age is not None and age < window:
+        return True
+    if not has_request_context():
+        return False
+    if _pinned_clients.get(client_key(), 0) > time.monotonic():
+        return True
+    cookie = replica_config['sticky_cookie']
+    if cookie:
+        try:
+            return float(request.cookies.get(cookie, 0)) > time.time()
+        except ValueError:
+            return False
+    return False
+
+
+def _acquire(read_table):
+    """只读查询优先借用副本连接，其余情况借用主库连接"""
+    replicas = get_replicas() if read_table is not None else None
+    if replicas is None:
+        return get_pool().acquire()
+    if _pinned_to_primary(read_table):
+        replicas.counts['pinned_reads'] += 1
+    else:
+        connection, replica = replicas.acquire()
+        if connection is not None:
+            note('db', replica.name)
+            return connection
+    replicas.counts['primary_reads'] += 1
+    note('db', 'primary')
+    return get_pool().acquire()
+
+
+def get_db_connection(dictionary=False, read_table=None):
+    """
+    从连接池借出连接并创建游标，返回 (connection, cursor)。
+    connection.close() 会把连接归还给连接池。
+    read_table 为只读查询所读的表，提供时该查询可以路由到只读副本（见 replica_config）。
+    """
+    started = time.perf_counter()
+    connection = _acquire(read_table)
+    waited = time.perf_counter() - started
+    observe_db_wait(waited)
+    profile = current_profile()
+    if profile is not None:
+        profile.add_stage('db_wait', waited)
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=dictionary)
-        return connection, cursor
-    except Error as e:
-        raise e
\ No newline at end of file
+    except Error:
+        connection.close()
+        raise
+    return connection, cursor
+
+
+@contextmanager
+def db_connection(dictionary=False):
+    """
+    以上下文管理器方式借用连接：
+        with db_connection() as (connection, cursor):
+            ...
+    退出时关闭游标并归还连接。
+    """
+    connection, cursor = get_db_connection(dictionary=dictionary)
+    try:
+        yield connection, cursor
+    finally:
+        try:
+            cursor.close()
+        finally:
+            connection.close()
+
+
+def init_app(app):
+    """注册请求钩子：写请求之后，该客户端在 sticky_seconds 内的读请求走主库，保证读到自己的写入"""
+
+    @app.after_request
+    def _pin_writer(response):
+        if request.method not in ('POST', 'PUT', 'PATCH', 'DELETE') or get_replicas() is None:
+            return response
+        window = replica_config['sticky_seconds']
+        if len(_pinned_clients) >= _MAX_PINNED_CLIENTS:
+            now = time.monotonic()
+            for key, until in list(_pinned_clients.items()):
+                if until <= now:
+                    _pinned_clients.pop(key, None)
+        _pinned_clients[client_key()] = time.monotonic() + window
+        # 多进程部署时后续请求可能落到其他工作进程，通过 Cookie 同样走主库
+        cookie = replica_config['sticky_cookie']
+        if cookie:
+            response.set_cookie(cookie, f'{time.time() + window:.3f}', max_age=max(1, int(window)), httponly=True)
+        return response
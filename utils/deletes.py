@@ -0,0 +1,116 @@
+import time
+from datetime import datetime
+
+from config import delete_config
+from utils.db import get_db_connection
+from utils.rollup import record_deleting, record_deleting_range
+from utils.statements import execute, fetch_all, in_placeholders
+from utils.versions import mark_written
+
+
+class DeleteError(ValueError):
+    """删除参数无效"""
+
+
+def parse_range_args(args):
+    """解析按日期范围删除的参数，返回 (start_date, end_date, chunk_size)；两个日期都必须提供"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    if not start_date or not end_date:
+        raise DeleteError('start_date and end_date are required')
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise DeleteError(f'{name} must be in YYYY-MM-DD format')
+    if start_date > end_date:
+        raise DeleteError('start_date must not be later than end_date')
+    chunk_size = args.get('chunk_size', delete_config['range_chunk_size'], type=int)
+    if chunk_size < 1 or chunk_size > delete_config['max_range_chunk_size']:
+        raise DeleteError(f"chunk_size must be between 1 and {delete_config['max_range_chunk_size']}")
+    return start_date, end_date, chunk_size
+
+
+def _delete_chunk(connection, table, ids):
+    """
+    在一个事务中删除一组 ID，返回实际删除的 ID。
+    通常只执行一条 DELETE，按影响行数判断是否全部删除；
+    影响行数少于 ID 数时回滚，锁定实际存在的记录后只删除这些记录，以便准确报告缺失的 ID。
+    """
+    existing = record_deleting(connection, table, ids)
+    if existing is None:
+        placeholders, params = in_placeholders(ids)
+        result = execute(connection, f"DELETE FROM {table} WHERE id IN ({placeholders})", params)
+        if result.rowcount == len(ids):
+            connection.commit()
+            return ids
+        connection.rollback()
+        rows = fetch_all(connection, f"SELECT id FROM {table} WHERE id IN ({placeholders}) FOR UPDATE", params)
+        existing = [row[0] for row in rows]
+    if existing:
+        placeholders, params = in_placeholders(existing)
+        execute(connection, f"DELETE FROM {table} WHERE id IN ({placeholders})", params)
+    connection.commit()
+    found = set(existing)
+    return [id for id in ids if id in found]
+
+
+def delete_ids(table, ids, chunk_size=None):
+    """
+    按 ID 删除记录，ID 列表按 chunk_size 分块，每块一个事务单独提交，避免长时间持有大量行锁。
+    返回 (已删除的 ID, 不存在的 ID)。某一块失败时抛出异常，之前已提交的块保持删除。
+    """
+    chunk_size = chunk_size or delete_config['batch_chunk_size']
+    ids = list(dict.fromkeys(ids))
+    deleted = []
+    connection, cursor = get_db_connection()
+    try:
+        for start in range(0, len(ids), chunk_size):
+            removed = _delete_chunk(connection, table, ids[start:start + chunk_size])
+            if removed:
+                mark_written(table)
+            deleted.extend(removed)
+    finally:
+        cursor.close()
+        connection.close()
+    found = set(deleted)
+    return deleted, [id for id in ids if id not in found]
+
+
+def delete_range(table, start_date, end_date, chunk_size):
+    """
+    删除日期范围内（含两端）的记录：每个事务按 (date, id) 顺序最多删除 chunk_size 行，
+    分块之间暂停 range_pause_ms 毫秒，避免长事务阻塞复制和其他写入。返回删除的行数和分块数。
+    """
+    pause = delete_config['range_pause_ms'] / 1000.0
+    deleted_count = 0
+    chunks = 0
+    connection, cursor = get_db_connection()
+    try:
+        while True:
+            ids = record_deleting_range(connection, table, start_date, end_date, chunk_size)
+            if ids is None:
+                result = execute(
+                    connection,
+                    f"DELETE FROM {table} WHERE date >= %s AND date <= %s ORDER BY date, id LIMIT %s",
+                    (start_date, end_date, chunk_size))
+                count = result.rowcount
+            elif ids:
+                placeholders, params = in_placeholders(ids)
+                execute(connection, f"DELETE FROM {table} WHERE id IN ({placeholders})", params)
+                count = len(ids)
+            else:
+                count = 0
+            connection.commit()
+            if count:
+                mark_written(table)
+                deleted_count += count
+                chunks += 1
+            if count < chunk_size:
+                break
+            if pause:
+                time.sleep(pause)
+    finally:
+        cursor.close()
+        connection.close()
+    return {'deleted_count': deleted_count, 'chunks': chunks}
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Response
+from config import export_config
+from utils.db import get_db_connection
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',      # 作为 mimetype 传入，Werkzeug 自动加上 charset=utf-8
+}
+
+
+class ExportError(ValueError):
+    """导出参数无效"""
+
+
+def parse_export_args(args):
+    """解析并校验导出参数，返回 (start_date, end_date, format)"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    fmt = args.get('format', 'ndjson').lower()
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ExportError(f'{name} must be in YYYY-MM-DD format')
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return start_date, end_date, fmt
+
+
+def _format_value(value):
+    # 日期输出为 YYYY-MM-DD，Decimal 等类型输出为字符串，None 保持为空
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_chunks(cursor, columns, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_format_value, row))), ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def _csv_chunks(cursor, columns, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        writer.writerows([map(_format_value, row) for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # 没有数据时也输出表头
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_query(table, columns, start_date=None, end_date=None):
+    """导出接口的 SQL 和参数：按日期范围过滤，按 (date, id) 升序输出"""
+    query = f"SELECT {', '.join(columns)} FROM {table} WHERE 1=1"
+    params = []
+    if start_date:
+        query += " AND date >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND date <= %s"
+        params.append(end_date)
+    query += " ORDER BY date, id"
+    return query, params
+
+
+def export_response(table, columns, start_date, end_date, fmt):
+    """
+    按日期范围流式导出整张表，返回 Flask 流式响应。
+    使用非缓冲游标按 chunk_size 分块读取，内存占用与导出行数无关；
+    查询在返回响应前执行，数据库错误仍由调用方按 500 处理。
+    """
+    query, params = export_query(table, columns, start_date, end_date)
+
+    # 连接默认 buffered=False，游标边读边从服务器取数据，不会一次性加载结果集
+    connection, cursor = get_db_connection(read_table=table)
+    try:
+        cursor.execute(query, params)
+    except Exception:
+        cursor.close()
+        connection.close()
+        raise
+
+    chunks = _csv_chunks if fmt == 'csv' else _ndjson_chunks
+    finished = False
+
+    def generate():
+        nonlocal finished
+        yield from chunks(cursor, columns, export_config['chunk_size'])
+        finished = True
+
+    def release():
+        if finished:
+            cursor.close()
+            connection.close()
+        else:
+            # 客户端中途断开或读取出错时结果集未读完，直接丢弃连接，避免读完剩余数据
+            connection.discard()
+
+    response = Response(
+        generate(),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{table}.{fmt}"'},
+    )
+    # 响应结束（包括未开始输出就被关闭）时归还连接
+    response.call_on_close(release)
+    return response
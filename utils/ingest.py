@@ -0,0 +1,183 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import zlib
+
+from flask import jsonify
+from mysql.connector import Error
+from config import ingest_config
+from utils.db import get_db_connection
+from utils.metrics import observe_batch_size
+from utils.rollup import record_inserted
+from utils.versions import mark_written
+
+logger = logging.getLogger(__name__)
+
+# 支持流式导入的请求体类型
+STREAM_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+class IngestError(ValueError):
+    """导入参数或请求体无效"""
+
+
+def stream_format(request):
+    """返回请求体的流式导入格式（ndjson/csv），普通 JSON 请求返回 None"""
+    return STREAM_FORMATS.get(request.mimetype)
+
+
+def parse_chunk_size(args):
+    chunk_size = args.get('chunk_size', ingest_config['chunk_size'], type=int)
+    if chunk_size < 1 or chunk_size > ingest_config['max_chunk_size']:
+        raise IngestError(f"chunk_size must be between 1 and {ingest_config['max_chunk_size']}")
+    return chunk_size
+
+
+def _open_body(request):
+    """把请求体包装为逐行读取的文本流，Content-Encoding: gzip 时边读边解压"""
+    encoding = (request.headers.get('Content-Encoding') or 'identity').lower()
+    stream = request.stream
+    if encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif encoding != 'identity':
+        raise IngestError(f'Unsupported Content-Encoding: {encoding}')
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+def _ndjson_records(text):
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'Record must be a JSON object'
+            continue
+        yield line_no, record, None
+
+
+def _csv_records(text):
+    reader = csv.DictReader(text)
+    for record in reader:
+        # 列数不足的行缺少的字段视为未提供，多余的列忽略
+        record = {key: value for key, value in record.items() if key is not None and value is not None}
+        yield reader.line_num, record, None
+
+
+def iter_records(request, fmt):
+    """逐条解析请求体，产出 (行号, 记录, 解析错误)"""
+    text = _open_body(request)
+    return _csv_records(text) if fmt == 'csv' else _ndjson_records(text)
+
+
+def ingest_response(report, kind):
+    """
+    导入报告对应的响应：至少写入一行时返回 201；请求体损坏时返回 400（报告中列出已提交的分块）；
+    一行都没有写入时，因数据库错误返回 500，因记录全部无效或请求体为空返回 400。
+    """
+    inserted = report['inserted_count']
+    if inserted:
+        message = f'Successfully inserted {inserted} {kind} records'
+    else:
+        message = f'No {kind} records inserted'
+    if 'error' in report:
+        status = 400
+    elif inserted:
+        status = 201
+    elif any('error' in chunk for chunk in report['chunks']):
+        status = 500
+    else:
+        status = 400
+    return jsonify({'message': message, **report}), status
+
+
+def _insert_chunk(connection, cursor, table, columns, rows):
+    """用一条多行 VALUES 语句插入一个分块并提交"""
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    query = (f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+             f"VALUES {', '.join([placeholders] * len(rows))}")
+    cursor.execute(query, [value for row in rows for value in row])
+    record_inserted(connection, table, rows)
+    connection.commit()
+
+
+def _validate_chunk(validator, parsed, to_row):
+    """
+    列式校验一个分块中解析成功的记录，返回 (待写入的行, 被拒绝的记录)。
+    同一条记录的多处错误合并为一条拒绝信息。
+    """
+    records = [record for _, record in parsed]
+    messages = {}
+    for error in validator.validate(records):
+        messages.setdefault(error['index'], []).append(error['error'])
+    rows = [to_row(record) for index, record in enumerate(records) if index not in messages]
+    rejected = [{'line': parsed[index][0], 'error': '; '.join(errors)} for index, errors in messages.items()]
+    return rows, rejected
+
+
+def ingest_records(records, table, columns, validator, to_row, chunk_size):
+    """
+    分块校验并写入记录：每 chunk_size 条记录用 validator（BatchValidator）一次校验，
+    合格的记录用一条多行 INSERT 写入并单独提交。
+    校验失败的记录被跳过并记录在报告中；某个分块写入失败时回滚该分块并继续处理后续分块，
+    已提交的分块不受影响。返回导入报告。
+    """
+    report = {'inserted_count': 0, 'rejected_count': 0, 'chunks': []}
+    connection, cursor = get_db_connection()
+    try:
+        def flush(first_line, last_line, parsed, rejected):
+            rows, invalid = _validate_chunk(validator, parsed, to_row)
+            rejected = sorted(rejected + invalid, key=lambda item: item['line'])
+            chunk = {
+                'chunk': len(report['chunks']) + 1,
+                'first_line': first_line,
+                'last_line': last_line,
+                'accepted': 0,
+                'rejected': rejected,
+            }
+            if rows:
+                try:
+                    _insert_chunk(connection, cursor, table, columns, rows)
+                    mark_written(table)
+                    chunk['accepted'] = len(rows)
+                except Error as e:
+                    logger.error(f"Database error in chunk {chunk['chunk']}: {str(e)}")
+                    connection.rollback()
+                    chunk['error'] = str(e)
+                    chunk['rejected'] = rejected + [{'line': None, 'error': f'{len(rows)} rows not inserted: {e}'}]
+            report['inserted_count'] += chunk['accepted']
+            report['rejected_count'] += len(rejected) + (len(rows) - chunk['accepted'])
+            report['chunks'].append(chunk)
+
+        parsed, rejected, first_line, line_no, seen = [], [], None, None, 0
+        try:
+            for line_no, record, error in records:
+                if first_line is None:
+                    first_line = line_no
+                seen += 1
+                if error is None:
+                    parsed.append((line_no, record))
+                else:
+                    rejected.append({'line': line_no, 'error': error})
+                if seen == chunk_size:
+                    flush(first_line, line_no, parsed, rejected)
+                    parsed, rejected, first_line, seen = [], [], None, 0
+        except (OSError, EOFError, UnicodeDecodeError, zlib.error, csv.Error) as e:
+            # 请求体损坏（如 gzip 截断）时停止读取，已提交的分块保留
+            report['error'] = f'Failed to read request body after line {line_no}: {e}'
+        if seen:
+            flush(first_line, line_no, parsed, rejected)
+        observe_batch_size(report['inserted_count'] + report['rejected_count'])
+        return report
+    finally:
+        cursor.close()
+        connection.close()
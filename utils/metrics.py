@@ -0,0 +1,258 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from config import metrics_config
+from utils.profiling import current_profile
+
+# 延迟类指标的直方图分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 行数、批量大小的直方图分桶
+SIZE_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+# 指标定义：名称 -> (类型, 说明, 分桶)
+METRICS = {
+    'payment_http_requests_total': ('counter', 'HTTP requests by route, method and status', None),
+    'payment_http_request_duration_seconds': ('histogram', 'HTTP request latency until the response is returned', LATENCY_BUCKETS),
+    'payment_db_connection_wait_seconds': ('histogram', 'Time spent waiting for a pooled database connection', LATENCY_BUCKETS),
+    'payment_db_query_duration_seconds': ('histogram', 'Time spent executing SQL statements', LATENCY_BUCKETS),
+    'payment_db_rows_returned': ('histogram', 'Rows returned per query', SIZE_BUCKETS),
+    'payment_batch_size': ('histogram', 'Records per request on the /batch endpoints', SIZE_BUCKETS),
+    'payment_admission_rejected_total': ('counter', 'Requests rejected with 429 by route class and reason', None),
+}
+
+# 每个线程写自己的分片，采集时再合并：记录指标的热路径上不加锁
+_local = threading.local()
+_shards = []             # [(线程, 分片)]
+_retired = {}            # 已结束线程的分片合并结果
+_shards_lock = threading.Lock()
+_MAX_SHARDS = 256        # 分片数超过该值时合并已结束线程的分片（每请求一个线程的服务器）
+
+
+def metrics_enabled():
+    return metrics_config['enabled']
+
+
+def _merge(target, shard):
+    for key, value in shard.items():
+        if isinstance(value, list):
+            merged = target.get(key)
+            if merged is None:
+                target[key] = list(value)
+            else:
+                for index, count in enumerate(value):
+                    merged[index] += count
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _retire_dead_shards():
+    """把已结束线程的分片合并进 _retired，调用方需持有 _shards_lock"""
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            _merge(_retired, shard)
+    _shards[:] = alive
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            if len(_shards) >= _MAX_SHARDS:
+                _retire_dead_shards()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def inc(name, labels, amount=1):
+    """计数器加 amount，labels 为 ((标签名, 值), ...)"""
+    shard = _shard()
+    key = (name, labels)
+    shard[key] = shard.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    """记录一次直方图观测值；分片内按桶保存非累计计数，最后两项为总和与次数"""
+    shard = _shard()
+    key = (name, labels)
+    counts = shard.get(key)
+    buckets = METRICS[name][2]
+    if counts is None:
+        counts = shard[key] = [0] * (len(buckets) + 3)
+    counts[bisect_left(buckets, value)] += 1
+    counts[-2] += value
+    counts[-1] += 1
+
+
+def current_route():
+    """当前请求匹配的路由规则（如 /api/pension_payments/<int:id>），请求之外为 background"""
+    if has_request_context():
+        rule = request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+    return 'background'
+
+
+def observe_db_wait(seconds):
+    if metrics_enabled():
+        observe('payment_db_connection_wait_seconds', (('route', current_route()),), seconds)
+
+
+def observe_query(route, statement, seconds):
+    observe('payment_db_query_duration_seconds', (('route', route), ('statement', statement)), seconds)
+
+
+def observe_rows(route, rows):
+    observe('payment_db_rows_returned', (('route', route),), rows)
+
+
+def observe_batch_size(size):
+    """记录 /batch 接口一次请求的记录数"""
+    if metrics_enabled():
+        observe('payment_batch_size', (('route', current_route()), ('method', request.method)), size)
+
+
+def statement_kind(operation):
+    """SQL 语句类型（SELECT/INSERT/DELETE 等），用作标签"""
+    words = operation.split(None, 1)
+    return words[0].upper() if words else ''
+
+
+class TimedCursor:
+    """
+    记录执行耗时和返回行数（监控指标）以及 SQL 与参数（请求分析）的游标代理，其余属性转发给原游标。
+    路由标签在创建时确定，流式导出在请求结束后读取剩余结果时仍计入原路由。
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._route = current_route()
+        self._rows = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _flush_rows(self):
+        if self._rows is not None and metrics_enabled():
+            observe_rows(self._route, self._rows)
+            self._rows = None
+
+    def _executed(self, operation, params, started, many=False):
+        elapsed = time.perf_counter() - started
+        if metrics_enabled():
+            observe_query(self._route, statement_kind(operation), elapsed)
+        profile = current_profile()
+        if profile is not None:
+            profile.add_sql(operation, params, elapsed, many)
+        # 有结果集的语句开始计数返回行数，在下一次执行或关闭游标时记录
+        if self._cursor.description is not None:
+            self._rows = 0
+
+    def execute(self, operation, params=(), multi=False):
+        self._flush_rows()
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, multi)
+        finally:
+            self._executed(operation, params, started)
+
+    def executemany(self, operation, seq_params):
+        self._flush_rows()
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            self._executed(operation, seq_params, started, many=True)
+
+    def _count(self, rows):
+        if self._rows is not None:
+            self._rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None and self._rows is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+    def close(self):
+        self._flush_rows()
+        return self._cursor.close()
+
+
+def init_app(app):
+    """注册请求钩子，统计每个路由的请求数、状态码和延迟"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None or not metrics_enabled() or request.endpoint == 'metrics':
+            return response
+        route = current_route()
+        inc('payment_http_requests_total',
+            (('route', route), ('method', request.method), ('status', str(response.status_code))))
+        observe('payment_http_request_duration_seconds',
+                (('route', route), ('method', request.method)), time.perf_counter() - started)
+        return response
+
+
+def _collect():
+    with _shards_lock:
+        _retire_dead_shards()
+        totals = {}
+        _merge(totals, _retired)
+        for _, shard in _shards:
+            # dict.copy 在 GIL 下是原子的，不影响写入线程
+            _merge(totals, shard.copy())
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render():
+    """以 Prometheus 文本格式输出所有指标"""
+    totals = _collect()
+    by_name = {}
+    for (name, labels), value in totals.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name.get(name, ())):
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,255 @@
+"""
+数据库结构的版本管理与索引检查：
+
+    python3 -m utils.migrate status              查看各版本迁移是否已执行
+    python3 -m utils.migrate up [--to VERSION]   按版本顺序执行未执行的迁移
+    python3 -m utils.migrate explain [--seed N]  对各接口的查询形状执行 EXPLAIN，出现全表扫描时退出码为 1
+
+迁移文件位于 migrations/，文件名为 "四位版本号_说明.sql"，语句以行尾的分号分隔。
+已执行的版本及文件校验和记录在 schema_migrations 表中。
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+from mysql.connector import Error, errorcode
+from utils.bulk_load import LOAD_COLUMNS
+from utils.db import get_db_connection
+from utils.export import export_query
+from utils.pagination import Pagination, paginate_query
+from utils.rollup import PAYMENT_TABLES, summary_query
+from utils.rows import select_list
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS `schema_migrations` (
+    `version` INT NOT NULL,
+    `name` VARCHAR(255) NOT NULL,
+    `checksum` CHAR(64) NOT NULL,
+    `applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`version`)
+)
+"""
+
+# 目标已存在（早于迁移工具建立的表、列和索引）时跳过该语句，迁移继续执行
+ALREADY_EXISTS_ERRORS = {
+    errorcode.ER_TABLE_EXISTS_ERROR: 'table exists',
+    errorcode.ER_DUP_FIELDNAME: 'column exists',
+    errorcode.ER_DUP_KEYNAME: 'index exists',
+}
+
+# 查询接口支持按金额精确过滤的表
+AMOUNT_FILTER_TABLES = ('social_security_payments',)
+
+
+class MigrationError(Exception):
+    """迁移文件无效或执行失败"""
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """读取迁移文件，按版本号排序返回 [(版本, 名称, SQL, 校验和)]"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        version = int(match.group(1))
+        if migrations and migrations[-1][0] == version:
+            raise MigrationError(f'duplicate migration version {version}')
+        migrations.append((version, match.group(2), sql, hashlib.sha256(sql.encode()).hexdigest()))
+    return migrations
+
+
+def split_statements(sql):
+    """去掉整行注释，按行尾分号拆分为单条语句"""
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith('--')]
+    statements = re.split(r';\s*$', '\n'.join(lines), flags=re.M)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def applied_migrations(cursor):
+    """已执行的版本 -> (名称, 校验和, 执行时间)"""
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {version: (name, checksum, applied_at) for version, name, checksum, applied_at in cursor.fetchall()}
+
+
+def migration_status():
+    """各版本的执行状态：applied、pending，或 changed（已执行后文件被修改）"""
+    connection, cursor = get_db_connection()
+    try:
+        applied = applied_migrations(cursor)
+    finally:
+        cursor.close()
+        connection.close()
+    status = []
+    for version, name, _, checksum in load_migrations():
+        if version not in applied:
+            status.append((version, name, 'pending', None))
+        else:
+            state = 'applied' if applied[version][1] == checksum else 'changed'
+            status.append((version, name, state, applied[version][2]))
+    return status
+
+
+def migrate_up(target=None, log=print):
+    """
+    按版本顺序执行未执行的迁移（到 target 版本为止），返回执行的版本列表。
+    MySQL 的 DDL 会隐式提交，某条语句失败时该版本不记录为已执行，修正后重新执行即可：
+    已生效的建表、加列、加索引语句再次执行时按"已存在"跳过。
+    """
+    executed = []
+    connection, cursor = get_db_connection()
+    try:
+        applied = applied_migrations(cursor)
+        for version, name, sql, checksum in load_migrations():
+            if version in applied or (target is not None and version > target):
+                continue
+            log(f'{version:04d} {name}')
+            for statement in split_statements(sql):
+                try:
+                    cursor.execute(statement)
+                except Error as e:
+                    if e.errno not in ALREADY_EXISTS_ERRORS:
+                        raise MigrationError(f'{version:04d} {name} failed: {e}\n{statement}')
+                    log(f'  skipped ({ALREADY_EXISTS_ERRORS[e.errno]}): {statement.splitlines()[0]}')
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (version, name, checksum)
+            )
+            connection.commit()
+            executed.append(version)
+    finally:
+        cursor.close()
+        connection.close()
+    return executed
+
+
+def _listing(table, conditions='', params=(), pagination=Pagination(None, 20, None)):
+    """与查询接口相同的 SQL 形状：过滤条件 + 按 (date, id) 降序分页"""
+    query = f"SELECT {select_list(['id', 'date', 'personal_payment', 'company_payment', 'remarks'])} " \
+            f"FROM {table} WHERE 1=1{conditions}"
+    params = list(params)
+    return paginate_query(query, params, pagination), params
+
+
+def export_columns(table):
+    """导出接口输出的列：ID 加上表的全部数据列（与各蓝图的 QUERY_COLUMNS 相同）"""
+    return ['id', *LOAD_COLUMNS[table][0]]
+
+
+def query_shapes(table):
+    """各接口对 table 执行的查询形状，返回 [(接口, SQL, 参数)]"""
+    shapes = [
+        ('GET', *_listing(table)),
+        ('GET ?id', *_listing(table, " AND id = %s", [1])),
+        ('GET ?start_date&end_date', *_listing(table, " AND date >= %s AND date <= %s", ['2020-01-01', '2020-12-31'])),
+        ('GET ?year', *_listing(table, " AND year = %s", [2020])),
+        ('GET ?cursor', *_listing(table, pagination=Pagination(None, 20, ('2020-06-01', 1000)))),
+        ('GET ?page', *_listing(table, pagination=Pagination(5, 20, None))),
+    ]
+    if table in AMOUNT_FILTER_TABLES:
+        shapes += [
+            ('GET ?personal_payment', *_listing(table, " AND personal_payment = %s", [Decimal('812.50')])),
+            ('GET ?company_payment', *_listing(table, " AND company_payment = %s", [Decimal('812.50')])),
+        ]
+    shapes += [
+        ('GET /summary?group_by=month', *summary_query(table, 'month')),
+        ('GET /summary?group_by=year&start_date&end_date', *summary_query(table, 'year', '2015-01-01', '2020-12-31')),
+        ('GET /export?start_date&end_date', *export_query(table, export_columns(table), '2020-01-01', '2020-12-31')),
+        ('DELETE /batch', f"DELETE FROM {table} WHERE id IN (%s, %s, %s, %s)", [1, 2, 3, 4]),
+        ('DELETE ?start_date&end_date',
+         f"DELETE FROM {table} WHERE date >= %s AND date <= %s ORDER BY date, id LIMIT %s",
+         ['2020-01-01', '2020-12-31', 1000]),
+    ]
+    return shapes
+
+
+def _text(value):
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+def seed_tables(rows, tables=PAYMENT_TABLES, chunk_size=1000):
+    """向每张表写入 rows 条测试数据（日期分布在 2000 年起的 25 年内），然后更新索引统计信息"""
+    amounts = [Decimal('812.50'), Decimal('1625.00'), Decimal('300.00'), Decimal('2450.75')]
+    first = date(2000, 1, 1)
+    connection, cursor = get_db_connection()
+    try:
+        for table in tables:
+            for start in range(0, rows, chunk_size):
+                count = min(chunk_size, rows - start)
+                values = []
+                for index in range(start, start + count):
+                    values += [first + timedelta(days=(index * 7) % (25 * 365)),
+                               amounts[index % 4], amounts[(index + 1) % 4], 'explain seed']
+                cursor.execute(
+                    f"INSERT INTO {table} (date, personal_payment, company_payment, remarks) VALUES "
+                    + ', '.join(['(%s, %s, %s, %s)'] * count), values)
+                connection.commit()
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def explain_routes(tables=PAYMENT_TABLES):
+    """对每个查询形状执行 EXPLAIN，返回 [(表, 接口, EXPLAIN 行列表, 是否全表扫描)]"""
+    results = []
+    connection, cursor = get_db_connection(dictionary=True)
+    try:
+        for table in tables:
+            for route, query, params in query_shapes(table):
+                cursor.execute(f"EXPLAIN {query}", params)
+                plan = [{key: _text(value) for key, value in row.items()} for row in cursor.fetchall()]
+                full_scan = any(row['type'] == 'ALL' and row['table'] == table for row in plan)
+                results.append((table, route, plan, full_scan))
+    finally:
+        cursor.close()
+        connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the payment schema and check query plans')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='show which migrations have been applied')
+    up = subparsers.add_parser('up', help='apply pending migrations in version order')
+    up.add_argument('--to', type=int, help='stop after this version')
+    explain = subparsers.add_parser('explain', help='EXPLAIN every route query shape and fail on full table scans')
+    explain.add_argument('--seed', type=int, default=0,
+                         help='insert this many synthetic rows per table first (scratch databases only)')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        for version, name, state, applied_at in migration_status():
+            print(f"{version:04d} {name:<32} {state:<8} {applied_at or ''}")
+    elif args.command == 'up':
+        try:
+            executed = migrate_up(args.to)
+        except MigrationError as e:
+            sys.exit(str(e))
+        print(f"applied {len(executed)} migration(s)" if executed else 'schema is up to date')
+    elif args.command == 'explain':
+        if args.seed:
+            seed_tables(args.seed)
+        failures = 0
+        for table, route, plan, full_scan in explain_routes():
+            failures += full_scan
+            for row in plan:
+                print(f"{'FAIL' if full_scan else 'ok':<5} {table:<28} {route:<48} "
+                      f"type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}")
+        if failures:
+            sys.exit(f'{failures} route query shape(s) use a full table scan')
+
+
+if __name__ == '__main__':
+    main()
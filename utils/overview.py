@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from flask import copy_current_request_context, has_request_context
+from config import overview_config
+from utils.rollup import PAYMENT_TABLES, query_summary
+
+# 三张缴费表的汇总查询共用的线程池，按需创建；各查询从连接池借用自己的连接
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class OverviewTimeout(Exception):
+    """汇总查询未在 overview_config['timeout'] 秒内完成"""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(overview_config['max_workers'], thread_name_prefix='overview')
+    return _executor
+
+
+def _reset_executor_after_fork():
+    # 线程不会随 fork 复制到子进程，子进程按需重新创建线程池
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+def _submit(func, *args):
+    # 在请求上下文中提交时带上请求上下文，副本路由仍能按客户端判断是否必须读主库
+    if has_request_context():
+        func = copy_current_request_context(func)
+    return _get_executor().submit(func, *args)
+
+
+def _empty_totals():
+    return {'count': 0, 'personal_payment': Decimal(0), 'company_payment': Decimal(0), 'total_payment': Decimal(0)}
+
+
+def _add(totals, record):
+    totals['count'] += record['count']
+    totals['personal_payment'] += record['personal_payment']
+    totals['company_payment'] += record['company_payment']
+    totals['total_payment'] += record['total_payment']
+
+
+def query_overview(group_by='month', start_date=None, end_date=None, tables=PAYMENT_TABLES):
+    """
+    并发查询各缴费表的按月（或按年）汇总，按周期合并。
+    每个周期包含各表的记录数和金额以及三者合计，另返回整个范围内各表和全部的合计。
+    耗时取决于最慢的一张表，超时抛出 OverviewTimeout，数据库错误原样抛出。
+    """
+    futures = {table: _submit(query_summary, table, group_by, start_date, end_date) for table in tables}
+    results = {}
+    try:
+        for table, future in futures.items():
+            try:
+                results[table] = future.result(timeout=overview_config['timeout'])
+            except TimeoutError:
+                raise OverviewTimeout(f'{table} summary did not finish within {overview_config["timeout"]}s')
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+    periods = {}
+    totals = {table: _empty_totals() for table in tables}
+    totals['all'] = _empty_totals()
+    for table, records in results.items():
+        for record in records:
+            period = periods.get(record['period'])
+            if period is None:
+                period = periods[record['period']] = {table: _empty_totals() for table in tables}
+                period['all'] = _empty_totals()
+            period[table] = record.copy()
+            del period[table]['period']
+            _add(period['all'], record)
+            _add(totals[table], record)
+            _add(totals['all'], record)
+    records = [{'period': key, **periods[key]} for key in sorted(periods)]
+    return records, totals
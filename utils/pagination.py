@@ -0,0 +1,89 @@
+import base64
+from collections import namedtuple
+from datetime import datetime, date
+
+# page 不为 None 时为兼容的 page/per_page 偏移分页；否则为基于 (date, id) 的游标分页，after 为上一页最后一条记录的 (date, id)
+Pagination = namedtuple('Pagination', ['page', 'per_page', 'after'])
+
+
+class PaginationError(ValueError):
+    """分页参数无效"""
+
+
+def encode_cursor(date_value, record_id):
+    """把 (date, id) 编码为不透明的游标字符串"""
+    if isinstance(date_value, (datetime, date)):
+        date_value = date_value.strftime('%Y-%m-%d')
+    raw = f'{date_value},{record_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """解析游标字符串，返回 (date 字符串, id)，无效时抛出 PaginationError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        date_str, record_id = raw.split(',')
+        datetime.strptime(date_str, '%Y-%m-%d')
+        return date_str, int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        raise PaginationError('cursor is invalid')
+
+
+def parse_pagination(args, default_per_page=20):
+    """
+    从查询参数解析分页方式：
+    - cursor：游标分页，取上一页响应中的 next_cursor；
+    - page：兼容旧的偏移分页；
+    - 都未提供时从第一页开始游标分页。
+    """
+    per_page = args.get('per_page', default_per_page, type=int)
+    page = args.get('page', type=int)
+    cursor = args.get('cursor')
+    if per_page < 1:
+        raise PaginationError('per_page must be a positive integer')
+    if 'page' in args and (page is None or page < 1):
+        raise PaginationError('Page and per_page must be positive integers')
+    if cursor and page is not None:
+        raise PaginationError('cursor and page cannot be used together')
+    after = decode_cursor(cursor) if cursor else None
+    return Pagination(page, per_page, after)
+
+
+def paginate_query(query, params, pagination):
+    """
+    为 "... WHERE 1=1 AND ..." 形式的查询追加分页条件、排序和 LIMIT。
+    多取一条记录用于判断是否还有下一页。
+    """
+    if pagination.after:
+        after_date, after_id = pagination.after
+        query += " AND (date < %s OR (date = %s AND id < %s))"
+        params.extend([after_date, after_date, after_id])
+    query += " ORDER BY date DESC, id DESC LIMIT %s"
+    params.append(pagination.per_page + 1)
+    if pagination.page is not None:
+        query += " OFFSET %s"
+        params.append((pagination.page - 1) * pagination.per_page)
+    return query
+
+
+def _dict_key(record):
+    return record['date'], record['id']
+
+
+def split_page(records, pagination, key=_dict_key):
+    """
+    截掉多取的一条记录，返回 (本页记录, next_cursor)；没有下一页时 next_cursor 为 None。
+    key 从记录中取出 (date, id)，默认适用于字典记录。
+    """
+    if len(records) <= pagination.per_page:
+        return records, None
+    records = records[:pagination.per_page]
+    return records, encode_cursor(*key(records[-1]))
+
+
+def page_info(pagination, next_cursor):
+    """响应中的分页字段"""
+    info = {'per_page': pagination.per_page, 'next_cursor': next_cursor}
+    if pagination.page is not None:
+        info['page'] = pagination.page
+    return info
@@ -0,0 +1,248 @@
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import logging
+import logging.handlers
+import pstats
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from flask import g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from config import profiling_config
+
+# 慢请求日志：最近的慢请求保存在内存中供管理接口读取，配置 slow_log_file 时同时写入滚动日志文件
+_slow_log = deque(maxlen=profiling_config['slow_log_size'])
+# 最近被分析的请求，按 ID 查看完整分析结果
+_recent = OrderedDict()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_state = {'enabled': profiling_config['enabled']}
+
+_file_logger = None
+if profiling_config['slow_log_file']:
+    _file_logger = logging.getLogger('payment.slow_log')
+    _file_logger.propagate = False
+    _handler = logging.handlers.RotatingFileHandler(
+        profiling_config['slow_log_file'], maxBytes=10 * 1024 * 1024, backupCount=3, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    _file_logger.addHandler(_handler)
+    _file_logger.setLevel(logging.INFO)
+
+# 记录的 SQL 参数个数上限，超出部分只记录数量
+MAX_PARAMS = 20
+
+
+class RequestProfile:
+    """单个请求的分析结果：各阶段耗时、每条 SQL 的耗时与参数，以及可选的 cProfile 统计"""
+
+    def __init__(self, use_cprofile=False):
+        self.id = next(_ids)
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.statements = []
+        self.notes = {}
+        self.profiler = cProfile.Profile() if use_cprofile else None
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_sql(self, operation, params, seconds, many=False):
+        self.add_stage('sql', seconds)
+        if many:
+            params = {'rows': len(params)}
+        elif params is not None:
+            params = [_format_param(value) for value in list(params)[:MAX_PARAMS]] + (
+                [f'... {len(params) - MAX_PARAMS} more'] if len(params) > MAX_PARAMS else [])
+        self.statements.append({
+            'sql': ' '.join(operation.split()),
+            'params': params,
+            'ms': round(seconds * 1000, 3),
+        })
+
+    def finish(self, status):
+        total = time.perf_counter() - self.started
+        stages = dict(self.stages)
+        stages['other'] = max(0.0, total - sum(stages.values()))
+        result = {
+            'id': self.id,
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'status': status,
+            'total_ms': round(total * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in stages.items()},
+            'statements': self.statements,
+            **self.notes,
+        }
+        if self.profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(30)
+            result['cprofile'] = output.getvalue()
+        return result
+
+
+def _format_param(value):
+    return value if value is None or isinstance(value, (int, float, str)) else str(value)
+
+
+def current_profile():
+    """当前请求的分析对象，未开启分析时返回 None"""
+    if has_request_context():
+        return g.get('profile')
+    return None
+
+
+@contextmanager
+def stage(name):
+    """统计代码块的耗时并计入当前请求的阶段 name，未开启分析时不做任何事"""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - started)
+
+
+def profiled_stage(name):
+    """把函数的耗时计入阶段 name 的装饰器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_profile() is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note(key, value):
+    """在当前请求的分析结果中附加说明（如缓存是否命中）"""
+    profile = current_profile()
+    if profile is not None:
+        profile.notes[key] = value
+
+
+class ProfilingJSONProvider(DefaultJSONProvider):
+    """jsonify 生成响应体的耗时计入 serialize 阶段"""
+
+    def response(self, *args, **kwargs):
+        if current_profile() is None:
+            return super().response(*args, **kwargs)
+        with stage('serialize'):
+            return super().response(*args, **kwargs)
+
+
+def _record(result):
+    with _lock:
+        _recent[result['id']] = result
+        while len(_recent) > profiling_config['recent_size']:
+            _recent.popitem(last=False)
+        entry = None
+        if result['total_ms'] >= profiling_config['slow_threshold_ms']:
+            entry = {key: value for key, value in result.items() if key != 'cprofile'}
+            _slow_log.append(entry)
+    if entry is not None and _file_logger is not None:
+        _file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def _server_timing(result):
+    return ', '.join(f'{name};dur={ms}' for name, ms in result['stages_ms'].items()) + \
+        f", total;dur={result['total_ms']}"
+
+
+def init_app(app):
+    """
+    注册请求分析钩子：配置允许分析请求头（header_enabled）且请求带有该请求头（默认 X-Profile: 1，
+    值为 cprofile 时同时运行 cProfile），或管理开关打开时，记录该请求各阶段和每条 SQL 的耗时，通过 Server-Timing 响应头返回，
+    超过阈值的请求写入慢请求日志。
+    """
+    app.json = ProfilingJSONProvider(app)
+    header = profiling_config['header']
+
+    @app.before_request
+    def _start_profile():
+        mode = request.headers.get(header, '').lower() if profiling_config['header_enabled'] else ''
+        if mode in ('', '0', 'false', 'off') and not _state['enabled']:
+            return
+        if request.path.startswith('/api/admin/'):
+            return
+        profile = g.profile = RequestProfile(use_cprofile=(mode == 'cprofile'))
+        if profile.profiler is not None:
+            profile.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        result = profile.finish(response.status_code)
+        _record(result)
+        response.headers['Server-Timing'] = _server_timing(result)
+        response.headers['X-Profile-Id'] = str(result['id'])
+        return response
+
+
+# 未配置共享密钥时允许访问管理接口的地址
+LOOPBACK = ('127.0.0.1', '::1')
+
+
+def admin_only(view):
+    """
+    管理接口的访问控制：配置了 admin_token 时请求必须带有相同的 X-Admin-Token 请求头，
+    否则只允许本机访问。分析结果包含 SQL 参数，开关和 cProfile 也会增加服务端开销。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = profiling_config['admin_token']
+        if token:
+            allowed = hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode())
+        else:
+            allowed = request.remote_addr in LOOPBACK
+        if not allowed:
+            return jsonify({'error': 'Admin access denied'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def set_enabled(enabled, slow_threshold_ms=None):
+    """管理开关：对所有请求开启或关闭分析，可同时调整慢请求阈值"""
+    _state['enabled'] = bool(enabled)
+    if slow_threshold_ms is not None:
+        profiling_config['slow_threshold_ms'] = slow_threshold_ms
+    return profiling_status()
+
+
+def profiling_status():
+    return {
+        'enabled': _state['enabled'],
+        'header': profiling_config['header'] if profiling_config['header_enabled'] else None,
+        'slow_threshold_ms': profiling_config['slow_threshold_ms'],
+        'slow_log_size': len(_slow_log),
+    }
+
+
+def slow_log(limit=None):
+    """慢请求日志，最新的在前"""
+    with _lock:
+        entries = list(_slow_log)
+    entries.reverse()
+    return entries[:limit] if limit else entries
+
+
+def get_profile(profile_id):
+    with _lock:
+        return _recent.get(profile_id)
@@ -0,0 +1,295 @@
+import argparse
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from config import rollup_config
+from utils.db import get_db_connection
+from utils.snapshot import capture_deleted, capture_inserted, snapshot_enabled
+
+# 维护月度汇总的缴费表
+PAYMENT_TABLES = ('pension_payments', 'social_security_payments', 'medical_insurance_payments')
+
+ROLLUP_TABLE = 'payment_monthly_rollups'
+
+CREATE_ROLLUP_TABLE = f"""
+CREATE TABLE IF NOT EXISTS `{ROLLUP_TABLE}` (
+    `table_name` VARCHAR(64) NOT NULL,
+    `year` SMALLINT NOT NULL,
+    `month` TINYINT NOT NULL,
+    `record_count` INT NOT NULL DEFAULT 0,
+    `personal_total` DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    `company_total` DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`table_name`, `year`, `month`)
+)
+"""
+
+UPSERT_DELTAS = f"""
+INSERT INTO `{ROLLUP_TABLE}`
+(`table_name`, `year`, `month`, `record_count`, `personal_total`, `company_total`)
+VALUES {{values}}
+ON DUPLICATE KEY UPDATE
+    `record_count` = `record_count` + VALUES(`record_count`),
+    `personal_total` = `personal_total` + VALUES(`personal_total`),
+    `company_total` = `company_total` + VALUES(`company_total`)
+"""
+
+
+class SummaryError(ValueError):
+    """汇总查询参数无效"""
+
+
+def rollup_enabled():
+    return rollup_config['enabled']
+
+
+def _to_date(value):
+    """日期列的值转为 date：date/datetime 原样取日期，字符串按 YYYY-MM-DD 解析（月、日可以不补零，如 2024-1-5）"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        # 与 MySQL 对无法解析金额的处理保持一致，按 0 计入
+        return Decimal(0)
+
+
+def _apply_deltas(connection, table, deltas):
+    """把 {(year, month): [count, personal, company]} 形式的增量合并进汇总表"""
+    if not deltas:
+        return
+    params = []
+    for (year, month), (count, personal, company) in sorted(deltas.items()):
+        params.extend([table, year, month, count, personal, company])
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(deltas))
+    cursor = connection.cursor()
+    try:
+        cursor.execute(UPSERT_DELTAS.format(values=values), params)
+    finally:
+        cursor.close()
+
+
+def record_inserted(connection, table, rows):
+    """
+    在插入记录的同一事务中（提交前）累加月度汇总，并登记提交后合并进进程内快照。
+    rows 为插入的 VALUES 参数，前三列依次为 date、personal_payment、company_payment。
+    使用独立游标，不影响调用方游标的 lastrowid/rowcount。
+    """
+    capture_inserted(connection, table, rows)
+    if not rollup_enabled():
+        return
+    deltas = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for row in rows:
+        delta = deltas[_month_key(row[0])]
+        delta[0] += 1
+        delta[1] += _amount(row[1])
+        delta[2] += _amount(row[2])
+    _apply_deltas(connection, table, deltas)
+
+
+def record_loaded(connection, table, source):
+    """批量导入：在把暂存表 source 的记录合并进 table 的同一事务中（提交前），按月累加这些记录"""
+    if not rollup_enabled():
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"INSERT INTO `{ROLLUP_TABLE}` "
+            f"(`table_name`, `year`, `month`, `record_count`, `personal_total`, `company_total`) "
+            f"SELECT %s, year, MONTH(date), COUNT(*), COALESCE(SUM(personal_payment), 0), "
+            f"COALESCE(SUM(company_payment), 0) FROM {source} GROUP BY year, MONTH(date) "
+            f"ON DUPLICATE KEY UPDATE "
+            f"`record_count` = `record_count` + VALUES(`record_count`), "
+            f"`personal_total` = `personal_total` + VALUES(`personal_total`), "
+            f"`company_total` = `company_total` + VALUES(`company_total`)",
+            (table,)
+        )
+    finally:
+        cursor.close()
+
+
+def _tracking_deletes(table):
+    """删除前是否需要锁定并读出待删除的记录：开启月度汇总或该表的进程内快照时需要"""
+    return rollup_enabled() or snapshot_enabled(table)
+
+
+def _subtract_locked(connection, table, condition, params):
+    """锁定满足条件的记录，从月度汇总中扣减并登记提交后从快照中移除，返回锁定记录的 ID"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT id, year, MONTH(date), personal_payment, company_payment, date "
+            f"FROM {table} WHERE {condition} FOR UPDATE",
+            params
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    capture_deleted(connection, table, [(day, personal, company) for _, _, _, personal, company, day in rows])
+    if rollup_enabled():
+        deltas = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        for _, year, month, personal, company, _ in rows:
+            delta = deltas[(year, month)]
+            delta[0] -= 1
+            delta[1] -= _amount(personal)
+            delta[2] -= _amount(company)
+        _apply_deltas(connection, table, deltas)
+    return [row[0] for row in rows]
+
+
+def record_deleting(connection, table, ids):
+    """
+    在删除记录的同一事务中、执行 DELETE 之前调用：锁定待删除记录并从月度汇总中扣减。
+    并发删除同一记录时后到的事务会等待锁，看到记录已删除后不会重复扣减。
+    开启汇总或快照时返回实际存在（已锁定）的 ID，都未开启时返回 None。
+    """
+    if not _tracking_deletes(table) or not ids:
+        return None
+    return _subtract_locked(connection, table, f"id IN ({', '.join(['%s'] * len(ids))})", list(ids))
+
+
+def record_deleting_range(connection, table, start_date, end_date, limit):
+    """
+    按日期范围分块删除时使用：锁定范围内按 (date, id) 排序的前 limit 条记录并扣减汇总，
+    返回锁定记录的 ID，调用方随后按 ID 删除。汇总和快照都未开启时返回 None。
+    """
+    if not _tracking_deletes(table):
+        return None
+    return _subtract_locked(
+        connection, table, "date >= %s AND date <= %s ORDER BY date, id LIMIT %s",
+        [start_date, end_date, limit])
+
+
+def parse_summary_args(args):
+    """解析汇总查询参数，返回 (group_by, start_date, end_date)"""
+    group_by = args.get('group_by', 'month')
+    if group_by not in ('month', 'year'):
+        raise SummaryError('group_by must be month or year')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    dates = []
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        if value:
+            try:
+                # 统一为补零的 YYYY-MM-DD，2024-1-5 与 2024-01-05 等价
+                value = _to_date(value).isoformat()
+            except ValueError:
+                raise SummaryError(f'{name} must be in YYYY-MM-DD format')
+        dates.append(value)
+    return group_by, dates[0], dates[1]
+
+
+def _month_key(value):
+    day = _to_date(value)
+    return day.year, day.month
+
+
+def summary_query(table, group_by, start_date=None, end_date=None):
+    """
+    汇总查询的 SQL 和参数，日期范围按所在月份整月计算。
+    开启汇总表时查询汇总表（代价与月份数成正比），否则直接在明细表上分组统计。
+    """
+    params = []
+    if rollup_enabled():
+        query = (f"SELECT year, month, record_count, personal_total, company_total "
+                 f"FROM {ROLLUP_TABLE} WHERE table_name = %s AND record_count > 0")
+        params.append(table)
+        if start_date:
+            year, month = _month_key(start_date)
+            query += " AND (year > %s OR (year = %s AND month >= %s))"
+            params.extend([year, year, month])
+        if end_date:
+            year, month = _month_key(end_date)
+            query += " AND (year < %s OR (year = %s AND month <= %s))"
+            params.extend([year, year, month])
+        if group_by == 'year':
+            query = (f"SELECT year, NULL, SUM(record_count), SUM(personal_total), SUM(company_total) "
+                     f"FROM ({query}) AS months GROUP BY year")
+    else:
+        month_column = 'NULL' if group_by == 'year' else 'MONTH(date)'
+        query = (f"SELECT year, {month_column}, COUNT(*), SUM(personal_payment), SUM(company_payment) "
+                 f"FROM {table} WHERE 1=1")
+        if start_date:
+            query += " AND date >= %s"
+            year, month = _month_key(start_date)
+            params.append(date(year, month, 1).isoformat())
+        if end_date:
+            year, month = _month_key(end_date)
+            query += " AND date < %s"
+            params.append(f'{year + month // 12:04d}-{month % 12 + 1:02d}-01')
+        query += " GROUP BY year" + ('' if group_by == 'year' else ', MONTH(date)')
+    query += " ORDER BY year" + ('' if group_by == 'year' else ', 2')
+    return query, params
+
+
+def query_summary(table, group_by, start_date=None, end_date=None):
+    """按月或按年汇总缴纳金额，返回各期的记录数和金额合计"""
+    query, params = summary_query(table, group_by, start_date, end_date)
+    connection, cursor = get_db_connection(read_table=table)
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    records = []
+    for year, month, count, personal, company in rows:
+        personal = personal or Decimal(0)
+        company = company or Decimal(0)
+        records.append({
+            'period': f'{year:04d}' if group_by == 'year' else f'{year:04d}-{month:02d}',
+            'count': int(count),
+            'personal_payment': personal,
+            'company_payment': company,
+            'total_payment': personal + company,
+        })
+    return records
+
+
+def rebuild_rollups(tables=PAYMENT_TABLES):
+    """从明细表全量重建月度汇总（每张表一个事务），返回各表重建的月份数"""
+    connection, cursor = get_db_connection()
+    try:
+        cursor.execute(CREATE_ROLLUP_TABLE)
+        result = {}
+        for table in tables:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE table_name = %s", (table,))
+            # INSERT ... SELECT 会对明细表加共享锁，重建期间的并发写入等待提交后再累加增量
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_TABLE} "
+                f"(table_name, year, month, record_count, personal_total, company_total) "
+                f"SELECT %s, year, MONTH(date), COUNT(*), COALESCE(SUM(personal_payment), 0), "
+                f"COALESCE(SUM(company_payment), 0) FROM {table} GROUP BY year, MONTH(date)",
+                (table,)
+            )
+            result[table] = cursor.rowcount
+            connection.commit()
+        return result
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain monthly payment rollups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild = subparsers.add_parser('rebuild', help='rebuild rollups from the payment tables')
+    rebuild.add_argument('tables', nargs='*', help=f"tables to rebuild (default: {', '.join(PAYMENT_TABLES)})")
+    args = parser.parse_args()
+    if args.command == 'rebuild':
+        unknown = set(args.tables) - set(PAYMENT_TABLES)
+        if unknown:
+            parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+        for table, months in rebuild_rollups(args.tables or PAYMENT_TABLES).items():
+            print(f'{table}: rebuilt {months} months')
+
+
+if __name__ == '__main__':
+    main()
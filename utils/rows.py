@@ -0,0 +1,24 @@
+from utils.profiling import profiled_stage
+
+# 在 SQL 中把 date 格式化为 YYYY-MM，避免在 Python 中逐行解析和格式化日期。
+# 别名不能用 date，否则 ORDER BY date 会按格式化后的字符串而不是原始日期排序
+MONTH_COLUMN = "DATE_FORMAT(date, '%Y-%m') AS month"
+
+
+def select_list(columns):
+    """
+    生成查询的 SELECT 列表：date 列由 MySQL 格式化为 YYYY-MM，
+    末尾附加原始 date 列（sort_date）供游标分页生成 next_cursor，不出现在响应中。
+    """
+    return ', '.join(MONTH_COLUMN if column == 'date' else column for column in columns) + ', date AS sort_date'
+
+
+def cursor_key(row):
+    """元组行的 (date, id)：id 为第一列，原始 date 为最后一列"""
+    return row[-1], row[0]
+
+
+@profiled_stage('rows')
+def to_records(columns, rows):
+    """按预先确定的列名把元组行转换为响应记录，zip 在列名用尽时截断，丢弃末尾的 sort_date"""
+    return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,465 @@
+"""
+缴费表的进程内列式快照，用于按日期范围、金额条件的统计查询（/api/<表>/report）：
+
+- 每张表的日期存为日序号（date.toordinal()），金额存为以分为单位的整数，均为 array 数组，按日期排序；
+- 启动后在后台线程载入，之后由写接口在事务提交后增量更新（插入追加、删除按值移除）；
+- 查询先按日期二分查找出范围，再在范围内按金额条件过滤、求和、按月或按年分组；
+- 快照过期（其他进程写过该表、超过 max_age、增量更新失败或正在重新载入）时查询改由 MySQL 回答，
+  并在后台重新载入。version_config['store'] 为 file 时才能感知其他工作进程的写入。
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP, Decimal
+from itertools import compress
+
+from config import snapshot_config
+from utils.db import get_db_connection
+from utils.versions import local_version, table_version
+
+logger = logging.getLogger(__name__)
+
+# 快照保存的金额列 -> Columns 的属性，按在 INSERT 值中的位置排列（date 为第 0 列）
+AMOUNT_COLUMNS = {'personal_payment': 'personal', 'company_payment': 'company'}
+CENT = Decimal('0.01')
+# 一次插入或删除的行数超过该值时整体重建数组，而不是逐行在数组中间插入、删除
+REBUILD_ROWS = 64
+
+
+class ReportError(ValueError):
+    """统计查询参数无效"""
+
+
+def _day(value):
+    if isinstance(value, date):
+        return value.toordinal()
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').toordinal()
+
+
+def _cents(value):
+    """金额转为分，None 表示 NULL；与 MySQL 写入 DECIMAL(12,2) 一样四舍五入到分"""
+    if value is None:
+        return None
+    return int(Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def _amount(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+class Columns:
+    """
+    一张表的列式数据：days 为升序的日序号，personal/company 为对应行的金额（分，NULL 存为 0），
+    nulls 中对应位置的 bit0/bit1 表示个人/公司金额为 NULL。同一天内的行顺序无关紧要。
+    """
+
+    def __init__(self):
+        self.days = array('i')
+        self.personal = array('q')
+        self.company = array('q')
+        self.nulls = bytearray()
+
+    def __len__(self):
+        return len(self.days)
+
+    @staticmethod
+    def _row(day, personal, company):
+        nulls = (personal is None) | (company is None) << 1
+        return day, personal or 0, company or 0, nulls
+
+    def append_sorted(self, rows):
+        """按日期升序追加 (日序号, 个人, 公司) 行"""
+        for row in rows:
+            day, personal, company, nulls = self._row(*row)
+            self.days.append(day)
+            self.personal.append(personal)
+            self.company.append(company)
+            self.nulls.append(nulls)
+
+    def _splice(self, cuts):
+        """
+        按升序的 (位置, 插入的行或 None) 重建各数组：行不为 None 时在该位置前插入，为 None 时删除该位置的行。
+        位置之间的数据按切片整段复制，代价与插入、删除的行数成正比，而不是逐行移动数组。
+        """
+        columns = Columns()
+        start = 0
+        for position, row in cuts:
+            columns.days += self.days[start:position]
+            columns.personal += self.personal[start:position]
+            columns.company += self.company[start:position]
+            columns.nulls += self.nulls[start:position]
+            if row is None:
+                start = position + 1
+            else:
+                day, personal, company, nulls = row
+                columns.days.append(day)
+                columns.personal.append(personal)
+                columns.company.append(company)
+                columns.nulls.append(nulls)
+                start = position
+        columns.days += self.days[start:]
+        columns.personal += self.personal[start:]
+        columns.company += self.company[start:]
+        columns.nulls += self.nulls[start:]
+        self.days, self.personal, self.company, self.nulls = \
+            columns.days, columns.personal, columns.company, columns.nulls
+
+    def insert(self, rows):
+        rows = sorted(self._row(*row) for row in rows)
+        if len(rows) > REBUILD_ROWS:
+            self._splice([(bisect_right(self.days, row[0]), row) for row in rows])
+            return
+        for day, personal, company, nulls in rows:
+            position = bisect_right(self.days, day)
+            self.days.insert(position, day)
+            self.personal.insert(position, personal)
+            self.company.insert(position, company)
+            self.nulls.insert(position, nulls)
+
+    def delete(self, rows):
+        """按值删除行（同一天金额相同的行对统计没有区别），有行找不到时抛出 LookupError 且不做任何修改"""
+        positions = set()
+        for row in rows:
+            day, personal, company, nulls = self._row(*row)
+            for position in range(bisect_left(self.days, day), bisect_right(self.days, day)):
+                if (position not in positions and self.personal[position] == personal
+                        and self.company[position] == company and self.nulls[position] == nulls):
+                    positions.add(position)
+                    break
+            else:
+                raise LookupError(f'row {(day, personal, company)} is not in the snapshot')
+        if len(positions) > REBUILD_ROWS:
+            self._splice([(position, None) for position in sorted(positions)])
+            return
+        for position in sorted(positions, reverse=True):
+            del self.days[position]
+            del self.personal[position]
+            del self.company[position]
+            del self.nulls[position]
+
+    def _periods(self, lo, hi, group_by):
+        """把 [lo, hi) 按月或按年切分为 (周期, 起, 止)，每段的日期范围用二分查找确定"""
+        if group_by is None:
+            yield None, lo, hi
+            return
+        start = lo
+        while start < hi:
+            first = date.fromordinal(self.days[start])
+            if group_by == 'year':
+                period = f'{first.year:04d}'
+                boundary = date(first.year + 1, 1, 1)
+            else:
+                period = f'{first.year:04d}-{first.month:02d}'
+                boundary = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+            end = bisect_left(self.days, boundary.toordinal(), start, hi)
+            yield period, start, end
+            start = end
+
+    def _mask(self, lo, hi, filters):
+        """范围内满足全部金额条件的行（NULL 不满足任何条件）"""
+        nulls = self.nulls[lo:hi]
+        mask = None
+        for bit, attribute, low, high in filters:
+            values = getattr(self, attribute)[lo:hi]
+            keep = [not (null & bit) and low <= value <= high for value, null in zip(values, nulls)]
+            mask = keep if mask is None else [a and b for a, b in zip(mask, keep)]
+        return mask
+
+    def query(self, start_day, end_day, filters, group_by):
+        """统计日期在 [start_day, end_day] 内且满足金额条件的行，返回各周期的 (周期, 行数, 个人合计, 公司合计)"""
+        lo = bisect_left(self.days, start_day)
+        hi = bisect_right(self.days, end_day)
+        results = []
+        for period, start, end in self._periods(lo, hi, group_by):
+            if not filters:
+                count = end - start
+                personal = sum(self.personal[start:end])
+                company = sum(self.company[start:end])
+            else:
+                mask = self._mask(start, end, filters)
+                count = sum(mask)
+                personal = sum(compress(self.personal[start:end], mask))
+                company = sum(compress(self.company[start:end], mask))
+            if count or group_by is None:
+                results.append((period, count, personal, company))
+        return results
+
+
+class TableSnapshot:
+    """一张表的快照及其载入状态"""
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = None
+        self.lock = threading.Lock()
+        # 每次载入完成后递增，提交回调只更新登记时的那一代数据
+        self.generation = 0
+        self.stale = True
+        self.loading = False
+        self.overlapped = False
+        self.loaded_at = None
+        self.load_seconds = None
+        self.last_attempt = 0.0
+        self.shared_base = 0
+        self.local_base = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def fresh(self):
+        if self.columns is None or self.stale or self.loading:
+            return False
+        max_age = snapshot_config['max_age']
+        if max_age is not None and time.monotonic() - self.loaded_at > max_age:
+            return False
+        # 共享版本号的增量多于本进程的写操作次数，说明其他进程写过该表
+        return table_version(self.table) - self.shared_base == local_version(self.table) - self.local_base
+
+    def apply(self, generation, kind, rows):
+        """事务提交后把插入或删除的行合并进快照；无法合并时标记为过期，等待重新载入"""
+        with self.lock:
+            if self.loading:
+                # 正在载入的数据可能包含也可能不包含这次写入，载入结果作废
+                self.overlapped = True
+            if generation != self.generation or self.columns is None:
+                self.stale = True
+                return
+            try:
+                converted = [(_day(row[0]), _cents(row[1]), _cents(row[2])) for row in rows]
+                if kind == 'insert':
+                    self.columns.insert(converted)
+                else:
+                    self.columns.delete(converted)
+            except Exception as e:
+                logger.warning(f'Snapshot of {self.table} is stale after a failed {kind}: {e}')
+                self.stale = True
+
+    def load(self):
+        """从 MySQL 全量载入（在后台线程中执行）"""
+        with self.lock:
+            self.overlapped = False
+            shared_base, local_base = table_version(self.table), local_version(self.table)
+        started = time.monotonic()
+        columns = Columns()
+        connection, cursor = get_db_connection()
+        try:
+            cursor.execute(f"SELECT date, {', '.join(AMOUNT_COLUMNS)} FROM {self.table} ORDER BY date")
+            while True:
+                rows = cursor.fetchmany(snapshot_config['fetch_size'])
+                if not rows:
+                    break
+                columns.append_sorted((_day(day), _cents(personal), _cents(company))
+                                      for day, personal, company in rows)
+                if len(columns) > snapshot_config['max_rows']:
+                    raise OverflowError(f"{self.table} has more than {snapshot_config['max_rows']} rows")
+        finally:
+            cursor.close()
+            connection.close()
+        with self.lock:
+            if self.overlapped:
+                logger.info(f'Snapshot load of {self.table} overlapped with a write, will retry')
+                return
+            self.columns = columns
+            self.generation += 1
+            self.stale = False
+            self.loaded_at = time.monotonic()
+            self.load_seconds = self.loaded_at - started
+            self.shared_base, self.local_base = shared_base, local_base
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f'Failed to load snapshot of {self.table}: {e}')
+        finally:
+            with self.lock:
+                self.loading = False
+
+    def ensure_loading(self):
+        """快照过期时在后台重新载入，距上次尝试不足 retry_interval 秒时跳过"""
+        with self.lock:
+            now = time.monotonic()
+            if self.loading or now - self.last_attempt < snapshot_config['retry_interval']:
+                return
+            self.loading = True
+            self.last_attempt = now
+        threading.Thread(target=self._load_in_background, name=f'snapshot-{self.table}', daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rows': len(self.columns) if self.columns is not None else None,
+                'fresh': self.fresh(),
+                'loading': self.loading,
+                'age_seconds': round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+                'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+                'hits': self.hits,
+                'fallbacks': self.fallbacks,
+            }
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def snapshot_enabled(table):
+    return snapshot_config['enabled'] and table in snapshot_config['tables']
+
+
+def get_snapshot(table):
+    snapshot = _snapshots.get(table)
+    if snapshot is None:
+        with _snapshots_lock:
+            snapshot = _snapshots.setdefault(table, TableSnapshot(table))
+    return snapshot
+
+
+def _reset_after_fork():
+    # 载入线程不会随 fork 复制，子进程按需重新载入
+    global _snapshots_lock
+    _snapshots.clear()
+    _snapshots_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _capture(connection, table, kind, rows):
+    if not rows or not snapshot_enabled(table) or not hasattr(connection, 'on_commit'):
+        return
+    snapshot = get_snapshot(table)
+    generation = snapshot.generation
+    rows = list(rows)
+    connection.on_commit(lambda: snapshot.apply(generation, kind, rows))
+
+
+def capture_inserted(connection, table, rows):
+    """在插入的同一事务中调用，rows 为 INSERT 的值（前三列为日期、个人、公司金额），提交后合并进快照"""
+    _capture(connection, table, 'insert', rows)
+
+
+def capture_deleted(connection, table, rows):
+    """在删除的同一事务中调用，rows 为待删除记录的 (日期, 个人, 公司金额)，提交后从快照中移除"""
+    _capture(connection, table, 'delete', rows)
+
+
+def parse_report_args(args):
+    """解析统计查询参数，返回 (start_date, end_date, 金额条件 {列: (最小值, 最大值)}, group_by)"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ReportError(f'{name} must be in YYYY-MM-DD format')
+    ranges = {}
+    for column in AMOUNT_COLUMNS:
+        bounds = []
+        for prefix in ('min', 'max'):
+            value = args.get(f'{prefix}_{column}')
+            try:
+                bounds.append(Decimal(value) if value else None)
+            except ArithmeticError:
+                raise ReportError(f'{prefix}_{column} must be a valid number')
+            if bounds[-1] is not None and not bounds[-1].is_finite():
+                raise ReportError(f'{prefix}_{column} must be a valid number')
+        if bounds != [None, None]:
+            ranges[column] = tuple(bounds)
+    group_by = args.get('group_by') or None
+    if group_by not in (None, 'month', 'year'):
+        raise ReportError('group_by must be month or year')
+    return start_date, end_date, ranges, group_by
+
+
+def _record(period, count, personal, company):
+    record = {'count': count, 'personal_payment': personal, 'company_payment': company,
+              'total_payment': personal + company}
+    return record if period is None else {'period': period, **record}
+
+
+def _snapshot_report(columns, start_date, end_date, ranges, group_by):
+    start_day = _day(start_date) if start_date else 0
+    end_day = _day(end_date) if end_date else date.max.toordinal()
+    filters = []
+    for bit, (column, attribute) in enumerate(AMOUNT_COLUMNS.items()):
+        if column in ranges:
+            low, high = ranges[column]
+            # 以分为单位比较：最小值向上、最大值向下取整到分
+            low = -2 ** 63 if low is None else int((low * 100).to_integral_value(rounding=ROUND_CEILING))
+            high = 2 ** 63 - 1 if high is None else int((high * 100).to_integral_value(rounding=ROUND_FLOOR))
+            filters.append((1 << bit, attribute, low, high))
+    return [_record(period, count, _amount(personal), _amount(company))
+            for period, count, personal, company in columns.query(start_day, end_day, filters, group_by)]
+
+
+def _mysql_report(table, start_date, end_date, ranges, group_by):
+    conditions, params = '', []
+    if start_date:
+        conditions += " AND date >= %s"
+        params.append(start_date)
+    if end_date:
+        conditions += " AND date <= %s"
+        params.append(end_date)
+    for column, (low, high) in ranges.items():
+        if low is not None:
+            conditions += f" AND {column} >= %s"
+            params.append(low)
+        if high is not None:
+            conditions += f" AND {column} <= %s"
+            params.append(high)
+    group = {'month': "year, MONTH(date)", 'year': "year", None: None}[group_by]
+    period = {'month': group, 'year': "year, NULL", None: "NULL, NULL"}[group_by]
+    query = (f"SELECT {period}, COUNT(*), SUM(personal_payment), SUM(company_payment) "
+             f"FROM {table} WHERE 1=1{conditions}")
+    if group is not None:
+        query += f" GROUP BY {group} ORDER BY {group}"
+    connection, cursor = get_db_connection(read_table=table)
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    records = []
+    for year, month, count, personal, company in rows:
+        key = None if group_by is None else f'{year:04d}' if group_by == 'year' else f'{year:04d}-{month:02d}'
+        records.append(_record(key, int(count), Decimal(personal or 0), Decimal(company or 0)))
+    return records
+
+
+def query_report(table, start_date=None, end_date=None, ranges=None, group_by=None):
+    """
+    统计日期范围内满足金额条件的记录数和金额合计，可按月或按年分组。
+    快照可用时由快照回答，否则查询 MySQL 并在后台重新载入快照。返回 (结果, 数据来源)。
+    """
+    ranges = ranges or {}
+    if snapshot_enabled(table):
+        snapshot = get_snapshot(table)
+        with snapshot.lock:
+            if snapshot.fresh():
+                snapshot.hits += 1
+                return _snapshot_report(snapshot.columns, start_date, end_date, ranges, group_by), 'snapshot'
+            snapshot.fallbacks += 1
+        snapshot.ensure_loading()
+    return _mysql_report(table, start_date, end_date, ranges, group_by), 'mysql'
+
+
+def snapshot_stats():
+    return {table: get_snapshot(table).stats() for table in snapshot_config['tables']}
+
+
+def init_app(app):
+    """注册请求钩子：每个进程收到第一个请求时开始在后台载入各表的快照"""
+    if not snapshot_config['enabled']:
+        return
+
+    @app.before_request
+    def _load_snapshots():
+        for table in snapshot_config['tables']:
+            snapshot = get_snapshot(table)
+            if snapshot.columns is None and not snapshot.loading:
+                snapshot.ensure_loading()
@@ -0,0 +1,687 @@
+"""
+单条插入的本地写入暂存（spool）：MySQL 变慢或重启期间，插入接口把记录追加到本地分段日志并 fsync 后
+立即返回 202 和暂存 ID，后台重放线程按顺序成批写入 MySQL。
+
+    python3 -m utils.spool status    查看各通道的积压记录数和最早未重放记录的时间
+    python3 -m utils.spool drain     重放没有工作进程占用的通道（如减少工作进程数后遗留的通道）
+
+每个工作进程独占 spool_config['path'] 下的一个通道目录（lane-N，flock 加锁），进程退出后由下一个
+启动的工作进程接管，截断写入中途崩溃留下的不完整记录后继续重放。
+每批记录的插入与 spool_progress 中该通道已重放序号的更新在同一事务中提交，重复重放时跳过已提交的序号，
+因此每条记录只写入一次。表结构见 migrations/0005_write_spool.sql。
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from itertools import groupby
+
+from mysql.connector import Error, errorcode, errors
+from config import spool_config
+from utils.db import PoolTimeoutError, get_db_connection
+from utils.rollup import record_inserted
+from utils.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# 记录头：负载长度、CRC32（覆盖序号、接收时间和负载）、序号、接收时间（Unix 秒）
+HEADER = struct.Struct('<IIQd')
+MAX_RECORD_BYTES = 1024 * 1024
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint'
+LOCK_FILE = 'lane.lock'
+
+PROGRESS_TABLE = 'spool_progress'
+REJECTED_TABLE = 'spool_rejected'
+
+SAVE_PROGRESS = f"""
+INSERT INTO `{PROGRESS_TABLE}` (`lane`, `seq`) VALUES (%s, %s)
+ON DUPLICATE KEY UPDATE `seq` = VALUES(`seq`)
+"""
+
+# 重试即可恢复的服务端错误：锁等待超时、死锁、连接数已满、关闭中、主库只读（切换中）、表尚未建立
+TRANSIENT_ERRORS = {
+    errorcode.ER_LOCK_WAIT_TIMEOUT,
+    errorcode.ER_LOCK_DEADLOCK,
+    errorcode.ER_CON_COUNT_ERROR,
+    errorcode.ER_SERVER_SHUTDOWN,
+    errorcode.ER_QUERY_INTERRUPTED,
+    errorcode.ER_OPTION_PREVENTS_STATEMENT,
+    errorcode.ER_READ_ONLY_MODE,
+    errorcode.ER_NO_SUCH_TABLE,
+}
+
+
+class SpoolUnavailableError(Exception):
+    """暂存暂时不能接收记录（积压超过上限或写本地磁盘失败），客户端应在 retry_after 秒后重试"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.retry_after = spool_config['retry_after']
+
+
+class SpoolIdError(ValueError):
+    """暂存 ID 格式无效"""
+
+
+def _transient(error):
+    """连接类错误和 TRANSIENT_ERRORS 稍后重试；其余错误说明记录本身不能写入"""
+    if isinstance(error, (errors.InterfaceError, errors.OperationalError, errors.PoolError, PoolTimeoutError)):
+        return True
+    return error.errno is None or 2000 <= error.errno < 3000 or error.errno in TRANSIENT_ERRORS
+
+
+def _encode(seq, accepted_at, payload):
+    header = HEADER.pack(len(payload), 0, seq, accepted_at)
+    crc = zlib.crc32(header[8:] + payload)
+    return HEADER.pack(len(payload), crc, seq, accepted_at) + payload
+
+
+def _read_records(f, offset=0):
+    """从 offset 起读取分段文件中的记录，产出 (序号, 接收时间, 负载, 结束偏移)；遇到不完整或校验失败的记录时停止"""
+    f.seek(offset)
+    while True:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        length, crc, seq, accepted_at = HEADER.unpack(header)
+        if length > MAX_RECORD_BYTES:
+            return
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(header[8:] + payload) != crc:
+            return
+        offset += HEADER.size + length
+        yield seq, accepted_at, payload, offset
+
+
+def _segment_path(directory, first_seq):
+    return os.path.join(directory, f'{first_seq:020d}{SEGMENT_SUFFIX}')
+
+
+def _list_segments(directory):
+    """目录中的分段文件 [(第一条记录的序号, 路径)]，按序号排序"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    return [(int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(directory, name)) for name in names]
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_checkpoint(directory):
+    try:
+        with open(os.path.join(directory, CHECKPOINT_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(directory, seq):
+    """记录已重放的序号；删除分段前写入，分段全部删除后重启也不会重复使用序号"""
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(str(seq))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    _fsync_directory(directory)
+
+
+class WriteSpool:
+    """
+    一个通道的写入暂存。
+    请求线程调用 append() 把记录追加到当前分段（文件名为段内第一条记录的序号），多个请求的 fsync 合并执行：
+    一次 fsync 使此前写入的记录全部持久化。后台重放线程只读取已持久化的记录，按表把连续的记录合并为
+    多行 INSERT，和通道进度一起提交；已全部重放的分段删除。
+    """
+
+    def __init__(self, directory, lane, segment_bytes=64 * 1024 * 1024, max_pending=1000000,
+                 batch_rows=1000, max_delay_ms=50, retry_interval=1):
+        self.directory = directory
+        self.lane = lane
+        self.segment_bytes = segment_bytes
+        self.max_pending = max_pending
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()          # 追加记录、切换分段
+        self._sync_lock = threading.Lock()     # 合并 fsync
+        self._cond = threading.Condition()     # 重放线程等待新的持久化记录
+        self._segments = []        # [(第一条记录的序号, 路径)]，最后一个为当前追加的分段
+        self._file = None
+        self._file_size = 0
+        self._closing = []         # 已切换、等 fsync 线程关闭的分段文件
+        self._next_seq = 1
+        self._synced_seq = 0       # 已持久化的最大序号
+        self._committed = 0        # 已提交到 MySQL 的最大序号
+        self._recovered_seq = 0    # 恢复时本地已分配的最大序号
+        self._progress_loaded = False
+        self._read_first = None    # 重放读取位置：分段的第一条序号、段内偏移
+        self._read_offset = 0
+        self._pending = []         # 已读取、尚未提交的记录 [(序号, 接收时间, 表, 列, 值)]
+        self._thread = None
+        self._stopping = False
+        self._stats = {
+            'appended': 0,
+            'drained': 0,
+            'batches': 0,
+            'rejected': 0,
+            'errors': 0,
+            'last_error': None,
+            'last_batch_ms': 0.0,
+        }
+
+    def recover(self):
+        """扫描已有分段：截断写入中途崩溃留下的不完整记录，恢复下一个序号和重放位置"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._committed = _read_checkpoint(self.directory)
+        last_seq = self._committed
+        for first_seq, path in _list_segments(self.directory):
+            end = 0
+            with open(path, 'rb') as f:
+                for seq, _, _, end in _read_records(f):
+                    last_seq = seq
+            size = os.path.getsize(path)
+            # 文件名中的序号已分配（切换分段后尚未写入就崩溃），同样不再使用
+            last_seq = max(last_seq, first_seq - 1)
+            if end == 0:
+                os.remove(path)
+                continue
+            if end < size:
+                logger.warning(f'Truncating {size - end} bytes of incomplete records from spool segment {path}')
+                os.truncate(path, end)
+            self._segments.append((first_seq, path))
+        self._next_seq = last_seq + 1
+        self._synced_seq = self._recovered_seq = last_seq
+        if self._segments:
+            self._read_first = self._segments[0][0]
+        return self
+
+    # ---- 追加 ----
+
+    def append(self, table, columns, values):
+        """追加一条插入记录并等待其持久化，返回暂存 ID（通道:序号）"""
+        payload = json.dumps({'table': table, 'columns': list(columns), 'values': list(values)},
+                             ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(payload) > MAX_RECORD_BYTES:
+            raise ValueError(f'Record is larger than {MAX_RECORD_BYTES} bytes')
+        with self._lock:
+            if self._next_seq - 1 - self._committed >= self.max_pending:
+                raise SpoolUnavailableError(f'Spool lane {self.lane} has {self.max_pending} records pending')
+            seq = self._next_seq
+            data = _encode(seq, time.time(), payload)
+            try:
+                if self._file is None or (self._file_size and self._file_size + len(data) > self.segment_bytes):
+                    self._rotate(seq)
+                self._write(data)
+            except OSError as e:
+                raise SpoolUnavailableError(f'Failed to write spool segment: {e}') from e
+            self._next_seq += 1
+            self._stats['appended'] += 1
+        self._sync(seq)
+        return f'{self.lane}:{seq}'
+
+    def _rotate(self, seq):
+        """切换到以 seq 开头的新分段；旧分段先 fsync，由 _sync 关闭（调用方持有 _lock）"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._closing.append(self._file)
+            self._file = None
+        path = _segment_path(self.directory, seq)
+        self._file = open(path, 'ab', buffering=0)
+        self._file_size = 0
+        _fsync_directory(self.directory)
+        self._segments.append((seq, path))
+
+    def _write(self, data):
+        try:
+            written = 0
+            while written < len(data):
+                written += self._file.write(data[written:])
+        except OSError:
+            # 去掉写了一半的记录；截断失败时改用新分段，后续记录不会跟在损坏的数据之后
+            try:
+                os.ftruncate(self._file.fileno(), self._file_size)
+            except OSError:
+                self._closing.append(self._file)
+                self._file = None
+            raise
+        self._file_size += len(data)
+
+    def _sync(self, seq):
+        """持久化到 seq 为止的记录：已被其他请求的 fsync 覆盖时直接返回"""
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._lock:
+                file, upto, closing = self._file, self._next_seq - 1, self._closing
+                self._closing = []
+            try:
+                if file is not None:
+                    os.fsync(file.fileno())
+            except OSError as e:
+                raise SpoolUnavailableError(f'Failed to fsync spool segment: {e}') from e
+            finally:
+                for old in closing:
+                    old.close()
+            with self._cond:
+                self._synced_seq = upto
+                self._cond.notify()
+
+    # ---- 重放 ----
+
+    def _read_segment(self, path, limit, room):
+        """从重放位置读取至多 room 条已持久化的记录，返回是否已读到该分段末尾"""
+        with open(path, 'rb') as f:
+            for seq, accepted_at, payload, end in _read_records(f, self._read_offset):
+                if seq > limit:
+                    return False
+                self._read_offset = end
+                if seq > self._committed:
+                    record = json.loads(payload)
+                    self._pending.append((seq, accepted_at, record['table'], record['columns'], record['values']))
+                    room -= 1
+                    if room == 0:
+                        return False
+        return True
+
+    def _next_batch(self):
+        """补足待重放的记录（至多 batch_rows 条）"""
+        limit = self._synced_seq
+        while len(self._pending) < self.batch_rows:
+            with self._lock:
+                segments = list(self._segments)
+            firsts = [first for first, _ in segments]
+            if self._read_first not in firsts:
+                if not segments:
+                    break
+                self._read_first, self._read_offset = segments[0][0], 0
+            index = firsts.index(self._read_first)
+            exhausted = self._read_segment(segments[index][1], limit, self.batch_rows - len(self._pending))
+            # 当前分段读完且已有更新的分段时才前进（之后的数据只会写入新分段）
+            if not exhausted or index + 1 == len(segments):
+                break
+            self._read_first, self._read_offset = segments[index + 1][0], 0
+        return self._pending
+
+    def _load_progress(self, cursor):
+        """重启后以 MySQL 中的通道进度为准，跳过已提交的记录"""
+        cursor.execute(f"SELECT `seq` FROM `{PROGRESS_TABLE}` WHERE `lane` = %s", (self.lane,))
+        row = cursor.fetchone()
+        if row is not None and row[0] > self._recovered_seq:
+            # 本地没有这些序号的记录（通道目录被清空或替换），新记录不能因序号较小而被跳过
+            logger.warning(f'Spool progress of lane {self.lane} ({row[0]}) is ahead of the local spool '
+                           f'({self._recovered_seq}), ignoring it')
+        elif row is not None and row[0] > self._committed:
+            self._committed = row[0]
+            self._pending = [record for record in self._pending if record[0] > self._committed]
+        self._progress_loaded = True
+
+    def drain_once(self):
+        """重放一批记录，返回提交的记录数；数据库暂时不可用时抛出 mysql.connector.Error，待重放的记录保留"""
+        connection = cursor = None
+        try:
+            if not self._progress_loaded:
+                connection, cursor = get_db_connection()
+                self._load_progress(cursor)
+            batch = self._next_batch()
+            if not batch:
+                return 0
+            started = time.monotonic()
+            committed = self._committed
+            if connection is None:
+                connection, cursor = get_db_connection()
+            try:
+                tables = self._insert_records(connection, cursor, batch)
+                cursor.execute(SAVE_PROGRESS, (self.lane, batch[-1][0]))
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                if isinstance(e, Error) and _transient(e):
+                    raise
+                # 整批失败时逐条重试，只拒绝有问题的记录
+                logger.error(f'Spooled batch on lane {self.lane} failed, retrying record by record: {str(e)}')
+                self._drain_one_by_one(connection, cursor, list(batch))
+            else:
+                self._committed_through(batch[-1][0], tables)
+            self._stats['batches'] += 1
+            self._stats['last_batch_ms'] = round((time.monotonic() - started) * 1000, 3)
+            return self._committed - committed
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if connection is not None and connection.is_connected():
+                connection.close()
+
+    def _insert_records(self, connection, cursor, records):
+        """同一张表、相同列的连续记录合并为一条多行 INSERT，返回涉及的表"""
+        tables = set()
+        for (table, columns), run in groupby(records, key=lambda record: (record[2], tuple(record[3]))):
+            rows = [tuple(record[4]) for record in run]
+            placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            cursor.execute(
+                f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+                f"VALUES {', '.join([placeholders] * len(rows))}",
+                [value for row in rows for value in row]
+            )
+            record_inserted(connection, table, rows)
+            tables.add(table)
+        return tables
+
+    def _drain_one_by_one(self, connection, cursor, records):
+        for record in records:
+            seq, _, table, columns, values = record
+            try:
+                tables = self._insert_records(connection, cursor, [record])
+                cursor.execute(SAVE_PROGRESS, (self.lane, seq))
+                connection.commit()
+            except Exception as e:
+                # 数据库拒绝的记录和写入钩子抛出的其他异常（如无法解析的日期）都拒绝该记录，
+                # 否则它会一直留在待重放列表的开头，阻塞同一通道后续的全部记录
+                connection.rollback()
+                if isinstance(e, Error) and _transient(e):
+                    raise
+                error = str(e) if isinstance(e, Error) else f'{type(e).__name__}: {e}'
+                logger.error(f'Rejected spooled record {self.lane}:{seq}: {error}')
+                cursor.execute(
+                    f"INSERT INTO `{REJECTED_TABLE}` (`lane`, `seq`, `table_name`, `record`, `error`) "
+                    f"VALUES (%s, %s, %s, %s, %s)",
+                    (self.lane, seq, table, json.dumps(dict(zip(columns, values)), ensure_ascii=False),
+                     error[:1024])
+                )
+                cursor.execute(SAVE_PROGRESS, (self.lane, seq))
+                connection.commit()
+                tables = ()
+                self._stats['rejected'] += 1
+            self._committed_through(seq, tables)
+
+    def _committed_through(self, seq, tables):
+        """序号不大于 seq 的记录已提交：移出待重放列表，删除已全部重放的分段，递增涉及表的版本号"""
+        self._stats['drained'] += sum(1 for record in self._pending if record[0] <= seq)
+        self._pending = [record for record in self._pending if record[0] > seq]
+        self._committed = seq
+        for table in tables:
+            bump_version(table)
+        with self._lock:
+            drained = []
+            # 下一个分段的第一条记录已提交，说明当前分段全部重放；当前追加的分段保留
+            while len(self._segments) > 1 and self._segments[1][0] <= seq + 1:
+                drained.append(self._segments.pop(0))
+        if drained:
+            _write_checkpoint(self.directory, seq)
+            for first_seq, path in drained:
+                os.remove(path)
+                if self._read_first == first_seq:
+                    self._read_first, self._read_offset = None, 0
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                drained = self.drain_once()
+            except Error as e:
+                logger.error(f'Failed to drain spool lane {self.lane}, retrying in {self.retry_interval}s: {str(e)}')
+                self._stats['errors'] += 1
+                self._stats['last_error'] = str(e)
+                time.sleep(self.retry_interval)
+                continue
+            except Exception as e:
+                logger.exception(f'Unexpected error while draining spool lane {self.lane}')
+                self._stats['errors'] += 1
+                self._stats['last_error'] = str(e)
+                time.sleep(self.retry_interval)
+                continue
+            if drained >= self.batch_rows:
+                continue
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping or self._synced_seq > self._committed + len(self._pending),
+                                    self.retry_interval)
+            # 积压不足一批时稍等，让后续请求并入同一批
+            if self._synced_seq - self._committed < self.batch_rows:
+                time.sleep(self.max_delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'spool-{self.lane}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for file in self._closing + ([self._file] if self._file is not None else []):
+                file.close()
+            self._closing, self._file = [], None
+
+    def stats(self):
+        with self._lock:
+            last_seq = self._next_seq - 1
+            segments = list(self._segments)
+            stats = dict(self._stats)
+        pending = self._pending
+        depth = last_seq - self._committed
+        # 最早未重放记录的等待时间；尚未读入的新记录刚写入，按 0 计
+        lag = time.time() - pending[0][1] if pending and depth else 0
+        size = 0
+        for _, path in segments:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return {
+            'lane': self.lane,
+            'depth': depth,
+            'lag_seconds': round(max(lag, 0), 3),
+            'last_seq': last_seq,
+            'committed_seq': self._committed,
+            'segments': len(segments),
+            'bytes': size,
+            **stats,
+        }
+
+
+def spooling_enabled():
+    return spool_config['enabled']
+
+
+def _lane_name(index):
+    return f"{spool_config['node'] or socket.gethostname()}:{index}"
+
+
+def _lock_lane(index):
+    """对通道目录加锁，成功返回 (目录, 锁文件描述符)，已被其他进程占用时返回 None"""
+    directory = os.path.join(spool_config['path'], f'lane-{index}')
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return directory, fd
+
+
+def _new_spool(index, directory):
+    return WriteSpool(
+        directory, _lane_name(index),
+        segment_bytes=spool_config['segment_bytes'],
+        max_pending=spool_config['max_pending'],
+        batch_rows=spool_config['batch_rows'],
+        max_delay_ms=spool_config['max_delay_ms'],
+        retry_interval=spool_config['retry_interval'],
+    ).recover()
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """本进程的写入暂存：首次调用时占用第一个空闲通道、恢复其中未重放的记录并启动重放线程"""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                for index in range(spool_config['lanes']):
+                    try:
+                        locked = _lock_lane(index)
+                    except OSError as e:
+                        raise SpoolUnavailableError(f'Failed to open spool directory: {e}') from e
+                    if locked is not None:
+                        _spool = _new_spool(index, locked[0]).start()
+                        break
+                else:
+                    raise SpoolUnavailableError(f"All {spool_config['lanes']} spool lanes are in use")
+    return _spool
+
+
+def _reset_after_fork():
+    # 重放线程不会随 fork 复制，子进程按需占用自己的通道
+    global _spool, _spool_lock
+    _spool = None
+    _spool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def spool_stats():
+    return _spool.stats() if _spool is not None else None
+
+
+def lookup(spool_id):
+    """按暂存 ID 查询记录状态：pending（尚未写入）、applied（已写入）或 rejected（被数据库拒绝）"""
+    lane, _, seq = spool_id.rpartition(':')
+    if not lane or not seq.isdigit():
+        raise SpoolIdError('spool_id must be in the form <lane>:<seq>')
+    seq = int(seq)
+    connection, cursor = get_db_connection()
+    try:
+        cursor.execute(f"SELECT `error` FROM `{REJECTED_TABLE}` WHERE `lane` = %s AND `seq` = %s", (lane, seq))
+        row = cursor.fetchone()
+        if row is not None:
+            return {'spool_id': spool_id, 'status': 'rejected', 'error': row[0]}
+        cursor.execute(f"SELECT `seq` FROM `{PROGRESS_TABLE}` WHERE `lane` = %s", (lane,))
+        row = cursor.fetchone()
+        status = 'applied' if row is not None and row[0] >= seq else 'pending'
+        return {'spool_id': spool_id, 'status': status}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def init_app(app):
+    """每个工作进程收到第一个请求时占用通道并开始重放（重启后接管崩溃前未重放的记录）"""
+    if not spooling_enabled():
+        return
+
+    @app.before_request
+    def _open_spool():
+        if _spool is None:
+            try:
+                get_spool()
+            except SpoolUnavailableError as e:
+                logger.error(str(e))
+
+
+def _lane_indexes():
+    root = spool_config['path']
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(name[5:]) for name in os.listdir(root) if name.startswith('lane-') and name[5:].isdigit())
+
+
+def _committed_seqs():
+    """各通道在 MySQL 中的重放进度，数据库不可用时返回 None"""
+    try:
+        connection, cursor = get_db_connection()
+    except Error:
+        return None
+    try:
+        cursor.execute(f"SELECT `lane`, `seq` FROM `{PROGRESS_TABLE}`")
+        return dict(cursor.fetchall())
+    except Error:
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def lane_status(index, committed=None):
+    """只读扫描一个通道目录：分段数、字节数、最后的序号和最早未重放记录的接收时间"""
+    directory = os.path.join(spool_config['path'], f'lane-{index}')
+    committed = max(committed or 0, _read_checkpoint(directory))
+    status = {'lane': _lane_name(index), 'segments': 0, 'bytes': 0, 'last_seq': committed,
+              'committed_seq': committed, 'depth': 0, 'oldest_pending': None}
+    for _, path in _list_segments(directory):
+        status['segments'] += 1
+        status['bytes'] += os.path.getsize(path)
+        with open(path, 'rb') as f:
+            for seq, accepted_at, _, _ in _read_records(f):
+                status['last_seq'] = max(status['last_seq'], seq)
+                if seq > committed:
+                    status['depth'] += 1
+                    if status['oldest_pending'] is None:
+                        status['oldest_pending'] = accepted_at
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and drain the local write spool')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='show pending records per lane')
+    subparsers.add_parser('drain', help='replay lanes that are not owned by a running worker')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        committed = _committed_seqs()
+        if committed is None:
+            print('warning: database unavailable, depth is counted from the local checkpoint', file=sys.stderr)
+        for index in _lane_indexes():
+            status = lane_status(index, (committed or {}).get(_lane_name(index)))
+            oldest = status['oldest_pending']
+            age = f'{time.time() - oldest:.1f}s' if oldest is not None else '-'
+            print(f"{status['lane']}: depth={status['depth']} oldest={age} segments={status['segments']} "
+                  f"bytes={status['bytes']} last_seq={status['last_seq']} committed_seq={status['committed_seq']}")
+        return
+
+    failed = False
+    for index in _lane_indexes():
+        locked = _lock_lane(index)
+        if locked is None:
+            print(f'{_lane_name(index)}: owned by a running worker, skipped')
+            continue
+        directory, fd = locked
+        spool = _new_spool(index, directory)
+        drained = 0
+        try:
+            while True:
+                count = spool.drain_once()
+                if not count:
+                    break
+                drained += count
+            print(f'{spool.lane}: drained {drained} records')
+        except Error as e:
+            print(f'{spool.lane}: drained {drained} records, stopped: {e}', file=sys.stderr)
+            failed = True
+        finally:
+            spool.stop()
+            os.close(fd)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from mysql.connector import errors
+from mysql.connector.constants import FieldType
+from mysql.connector.cursor import MySQLCursorPrepared
+from config import statement_config
+from utils.metrics import current_route, metrics_enabled, observe_query, observe_rows, statement_kind
+from utils.profiling import current_profile
+
+# 预处理语句的执行统计：{SQL: [预处理次数, 执行次数]}
+_stats = {}
+_stats_lock = threading.Lock()
+
+_DECIMAL_TYPES = (FieldType.DECIMAL, FieldType.NEWDECIMAL)
+
+
+class PreparedStatementCursor(MySQLCursorPrepared):
+    """
+    只预处理一次、之后直接执行的游标。
+    mysql-connector 2.2.9 的 MySQLCursorPrepared 每次执行前都会发送 COM_STMT_RESET，
+    多一次网络往返；该命令只在发送过长数据或结果未读完时需要，而这里每次都会读完结果，因此省去。
+    """
+
+    def __init__(self, connection=None):
+        super().__init__(connection)
+        self._converters = None
+
+    def execute(self, operation, params=(), multi=False):
+        if self._prepared is None or operation != self._executed:
+            super().execute(operation, params)
+            self._converters = None
+            return
+        if len(self._prepared['parameters']) != len(params):
+            raise errors.ProgrammingError(
+                errno=1210, msg="Incorrect number of arguments executing prepared statement")
+        res = self._connection.cmd_stmt_execute(
+            self._prepared['statement_id'],
+            data=params,
+            parameters=self._prepared['parameters'])
+        self._handle_result(res)
+
+    def converted_rows(self):
+        """
+        读取全部结果行。二进制协议下 DECIMAL 和字符串列以 bytes 返回，
+        按列类型转换为 Decimal/str，与普通游标的结果保持一致；转换函数按语句只计算一次。
+        """
+        rows = self.fetchall()
+        if self._converters is None:
+            charset = self._connection.python_charset
+            self._converters = [
+                (lambda value: Decimal(value.decode())) if column[1] in _DECIMAL_TYPES
+                else (lambda value: value.decode(charset))
+                for column in self.description
+            ]
+        converters = self._converters
+        return [
+            tuple(convert(value) if isinstance(value, bytes) else value
+                  for convert, value in zip(converters, row))
+            for row in rows
+        ]
+
+
+class StatementCache:
+    """单个连接上已预处理语句的 LRU 缓存，超过上限时关闭最久未使用的语句"""
+
+    def __init__(self, raw, max_size):
+        self._raw = raw
+        self._max_size = max_size
+        self._cursors = OrderedDict()
+
+    def cursor_for(self, sql):
+        cursor = self._cursors.get(sql)
+        if cursor is not None:
+            self._cursors.move_to_end(sql)
+            return cursor, False
+        cursor = self._raw.cursor(cursor_class=PreparedStatementCursor)
+        self._cursors[sql] = cursor
+        while len(self._cursors) > self._max_size:
+            _, evicted = self._cursors.popitem(last=False)
+            evicted.close()
+        return cursor, True
+
+    def discard(self, sql):
+        cursor = self._cursors.pop(sql, None)
+        if cursor is not None:
+            cursor.close()
+
+
+def _count(sql, prepared):
+    with _stats_lock:
+        counts = _stats.setdefault(sql, [0, 0])
+        counts[0] += prepared
+        counts[1] += 1
+
+
+def execute(connection, sql, params=()):
+    """
+    在连接上执行 SQL，返回执行后的游标（用于 rowcount/lastrowid）。
+    开启预处理时同一连接上相同形状的 SQL 只预处理一次，之后复用；
+    调用方不要关闭返回的游标，它属于连接的语句缓存。
+    """
+    params = tuple(params)
+    if not statement_config['enabled']:
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        _count(sql, False)
+        return cursor
+    raw = connection.raw
+    cache = getattr(raw, '_statement_cache', None)
+    if cache is None:
+        cache = raw._statement_cache = StatementCache(raw, statement_config['max_per_connection'])
+    cursor, prepared = cache.cursor_for(sql)
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        # 预处理或执行失败后语句状态未知，下次重新预处理
+        cache.discard(sql)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if metrics_enabled():
+            observe_query(current_route(), statement_kind(sql), elapsed)
+        profile = current_profile()
+        if profile is not None:
+            profile.add_sql(sql, params, elapsed)
+    _count(sql, prepared)
+    return cursor
+
+
+def fetch_all(connection, sql, params=()):
+    """执行查询并返回全部结果行（元组）"""
+    cursor = execute(connection, sql, params)
+    if isinstance(cursor, PreparedStatementCursor):
+        rows = cursor.converted_rows()
+        if metrics_enabled():
+            observe_rows(current_route(), len(rows))
+        return rows
+    try:
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def in_placeholders(values):
+    """
+    生成 IN 列表的占位符和参数。列表长度向上取整到 2 的幂并用最后一个值补齐，
+    使不同长度的 ID 列表落到少数几种语句形状上，便于复用预处理语句。
+    """
+    values = list(values)
+    size = 1
+    while size < len(values):
+        size *= 2
+    padded = values + values[-1:] * (size - len(values))
+    return ', '.join(['%s'] * size), padded
+
+
+def statement_stats():
+    """预处理次数、执行次数和复用率，以及各语句形状的明细"""
+    with _stats_lock:
+        shapes = {sql: {'prepares': p, 'executions': e} for sql, (p, e) in _stats.items()}
+    prepares = sum(shape['prepares'] for shape in shapes.values())
+    executions = sum(shape['executions'] for shape in shapes.values())
+    return {
+        'enabled': statement_config['enabled'],
+        'shapes': len(shapes),
+        'prepares': prepares,
+        'executions': executions,
+        'reuse_ratio': round(1 - prepares / executions, 4) if executions and statement_config['enabled'] else 0,
+        'statements': shapes,
+    }
@@ -0,0 +1,138 @@
+import math
+import re
+from datetime import datetime
+
+from config import validation_config
+
+# 缴费记录字段的校验规则，查询/写入接口和批量导入工具共用
+
+
+def validate_date(date_str):
+    """验证日期格式为 YYYY-MM-DD"""
+    try:
+        datetime.strptime(date_str, '%Y-%m-%d')
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def validate_payment(value, field_name):
+    """验证金额为正数"""
+    try:
+        val = float(value)
+        if val < 0:
+            return False, f"{field_name} must be non-negative"
+        return True, None
+    except (ValueError, TypeError):
+        return False, f"{field_name} must be a valid number"
+
+
+# ---- 批量校验 ----
+# 逐条记录调用 validate_date（strptime）和 validate_payment（float + 异常处理）代价较高，
+# 且只能报告第一处错误。BatchValidator 先把记录转成按字段的列，对每列去重后用预编译的正则一次校验，
+# 再按列表推导标出不合格的行，返回全部错误。
+
+# 与 datetime.strptime(value, '%Y-%m-%d') 接受的写法相同（月、日可以是一位数）
+DATE_PATTERN = re.compile(r'(\d{4})-(1[0-2]|0[1-9]|[1-9])-(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])')
+# 十进制数字（可带正负号、小数和指数，首尾空白），不接受 nan、inf 和下划线分隔
+NUMBER_PATTERN = re.compile(r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*')
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+_MISSING = object()
+
+
+def _valid_date_string(value):
+    match = DATE_PATTERN.fullmatch(value)
+    if match is None:
+        return False
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    if year < 1:
+        return False
+    if month == 2 and day == 29:
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    return day <= _DAYS_IN_MONTH[month]
+
+
+def _valid_amount_string(value):
+    """非负的十进制数字符串；格式已由正则确认，float() 不会抛出异常"""
+    return NUMBER_PATTERN.fullmatch(value) is not None and not float(value) < 0
+
+
+def _amount_error(value, field):
+    """不合格金额的错误信息，与 validate_payment 相同"""
+    if type(value) in (int, float) or (type(value) is str and NUMBER_PATTERN.fullmatch(value)):
+        if value == value and float(value) < 0:
+            return f"{field} must be non-negative"
+    return f"{field} must be a valid number"
+
+
+class BatchValidator:
+    """
+    批量插入的列式校验器，每个蓝图按自己的字段创建一个：
+    required 为必需字段，dates 为日期字段，amounts 为必需的金额字段，
+    optional_amounts 为可以缺省、为 null 或为空字符串（CSV 导入）的金额字段。
+    """
+
+    def __init__(self, required, dates=('date',), amounts=(), optional_amounts=()):
+        self.required = list(required)
+        self.dates = list(dates)
+        self.amounts = list(amounts)
+        self.optional_amounts = list(optional_amounts)
+        self.fields = list(dict.fromkeys(self.required + self.dates + self.amounts + self.optional_amounts))
+
+    def _date_errors(self, column):
+        valid = {value for value in {value for value in column if type(value) is str} if _valid_date_string(value)}
+        return [index for index, value in enumerate(column)
+                if value is not _MISSING and (type(value) is not str or value not in valid)]
+
+    def _amount_errors(self, column, nullable):
+        strings = {value for value in column if type(value) is str}
+        valid = {value for value in strings if _valid_amount_string(value)}
+        bad = []
+        for index, value in enumerate(column):
+            kind = type(value)
+            if kind is str:
+                ok = value in valid or (nullable and value == '')
+            elif kind is int or kind is float:
+                # NaN 的比较结果总是 False，小于 inf 排除无穷大
+                ok = 0 <= value < math.inf
+            else:
+                ok = value is _MISSING or (nullable and value is None)
+            if not ok:
+                bad.append(index)
+        return bad
+
+    def validate(self, records):
+        """
+        校验记录列表，返回全部错误 [{'index': 记录下标, 'field': 字段, 'error': 错误信息}]，
+        按记录下标排序，没有错误时返回空列表。
+        """
+        indices = [index for index, record in enumerate(records) if type(record) is dict]
+        errors = [{'index': index, 'field': None, 'error': 'Record must be a JSON object'}
+                  for index, record in enumerate(records) if type(record) is not dict]
+        objects = records if not errors else [records[index] for index in indices]
+        required = set(self.required)
+
+        for field in self.fields:
+            column = [record.get(field, _MISSING) for record in objects]
+            if field in required:
+                errors += [{'index': indices[i], 'field': field, 'error': f'Missing required field: {field}'}
+                           for i, value in enumerate(column) if value is _MISSING]
+            if field in self.dates:
+                errors += [{'index': indices[i], 'field': field, 'error': 'Date must be in YYYY-MM-DD format'}
+                           for i in self._date_errors(column)]
+            if field in self.amounts or field in self.optional_amounts:
+                errors += [{'index': indices[i], 'field': field, 'error': _amount_error(column[i], field)}
+                           for i in self._amount_errors(column, field in self.optional_amounts)]
+        errors.sort(key=lambda error: error['index'])
+        return errors
+
+
+def error_report(errors, record_count):
+    """批量校验失败时的 400 响应体，最多列出 validation_config['max_errors'] 条错误"""
+    invalid = len({error['index'] for error in errors})
+    return {
+        'error': f'{invalid} of {record_count} records are invalid',
+        'error_count': len(errors),
+        'errors': errors[:validation_config['max_errors']],
+    }
@@ -0,0 +1,171 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from config import cache_config, server_config, version_config
+
+# 每张表的变更版本号，写操作后递增，读缓存和 ETag 据此判断数据是否变化；
+# store 为 file 时共享的版本号保存在文件中，这里只记录本进程的写操作次数
+_versions = defaultdict(int)
+# 每张表最近一次写操作的时间（time.monotonic()）
+_written_at = {}
+_lock = threading.Lock()
+# 进程内版本号的纪元：进程重启或 fork 后版本号从 0 开始，ETag 带上纪元避免与之前签发的值相同
+_epoch = os.urandom(4).hex()
+
+# 版本号文件的内容：纪元（文件创建时随机生成）+ 版本号
+_SLOT = struct.Struct('<QQ')
+
+
+class FileVersions:
+    """
+    保存在 path 目录下的版本号，每张表一个文件，各进程 mmap 后共享：
+    同一台机器上的所有工作进程看到相同的版本号，重启后版本号继续递增。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _open(self, table):
+        mapped = self._files.get(table)
+        if mapped is not None:
+            return mapped
+        with self._lock:
+            mapped = self._files.get(table)
+            if mapped is None:
+                os.makedirs(self.path, exist_ok=True)
+                fd = os.open(os.path.join(self.path, f'{table}.version'), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fd).st_size < _SLOT.size:
+                        os.ftruncate(fd, 0)
+                        os.pwrite(fd, _SLOT.pack(int.from_bytes(os.urandom(8), 'little'), 0), 0)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                mapped = self._files[table] = (fd, mmap.mmap(fd, _SLOT.size))
+            return mapped
+
+    def get(self, table):
+        """返回 (纪元, 版本号)"""
+        return _SLOT.unpack_from(self._open(table)[1])
+
+    def bump(self, table):
+        fd, slots = self._open(table)
+        # flock 在进程间互斥，同一进程内的线程共用一个文件描述符，另用线程锁互斥
+        with self._lock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                epoch, version = _SLOT.unpack_from(slots)
+                _SLOT.pack_into(slots, 0, epoch, version + 1)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return version + 1
+
+    def reopen(self):
+        """fork 后调用：继承的文件描述符与父进程共用文件锁，子进程需要重新打开"""
+        for fd, slots in self._files.values():
+            slots.close()
+            os.close(fd)
+        self._files = {}
+        self._lock = threading.Lock()
+
+
+def store_kind():
+    """实际使用的版本号存储：store 为 auto 时多进程部署（server_config['workers'] > 1）使用 file，否则 memory"""
+    store = version_config['store']
+    if store == 'auto':
+        return 'file' if server_config['workers'] > 1 else 'memory'
+    if store not in ('memory', 'file'):
+        raise ValueError("version_config['store'] must be 'auto', 'memory' or 'file'")
+    return store
+
+
+_store = FileVersions(version_config['path']) if store_kind() == 'file' else None
+
+
+def _reset_after_fork():
+    global _lock, _epoch
+    _lock = threading.Lock()
+    _epoch = os.urandom(4).hex()
+    if _store is not None:
+        _store.reopen()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def table_version(table):
+    """返回表当前的变更版本号"""
+    if _store is not None:
+        return _store.get(table)[1]
+    return _versions[table]
+
+
+def version_stamp(tables):
+    """
+    各表版本号组成的标识，用于生成 ETag，任一表有写操作后改变。
+    进程内版本号无法感知其他进程的写操作，标识中另含按 cache_config['ttl'] 划分的时间段，
+    与查询缓存一样，其他进程的写入最迟一个 TTL 后可见。
+    """
+    if _store is not None:
+        return '.'.join('%x-%d' % _store.get(table) for table in tables)
+    stamp = '.'.join(str(_versions[table]) for table in tables)
+    return f'{_epoch}-{int(time.time() // cache_config["ttl"])}.{stamp}'
+
+
+def bump_version(table):
+    """表数据发生变化后递增版本号，返回新版本号"""
+    with _lock:
+        _written_at[table] = time.monotonic()
+        _versions[table] += 1
+        if _store is not None:
+            return _store.bump(table)
+        return _versions[table]
+
+
+def local_version(table):
+    """本进程对表的写操作次数；与 table_version 的增量不同说明有其他进程写过该表"""
+    return _versions[table]
+
+
+def seconds_since_write(table):
+    """距本进程最近一次写该表的秒数，没有写过时返回 None"""
+    written_at = _written_at.get(table)
+    return None if written_at is None else time.monotonic() - written_at
+
+
+def mark_written(table):
+    """
+    记录当前请求已向表提交过数据。分块提交的写入（流式导入、分块删除）在后续分块失败、
+    接口返回错误时也已改动数据，bumps_version 据此仍递增版本号。
+    """
+    if has_request_context():
+        g.setdefault('written_tables', set()).add(table)
+
+
+def bumps_version(table):
+    """
+    写接口装饰器：请求成功（2xx）或已通过 mark_written 记录提交过数据时递增表的版本号。
+    写入数据库之前就返回的错误（参数缺失、ID 列表无效等）不递增，不影响表的读缓存和 ETag。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            succeeded = False
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+                succeeded = 200 <= response.status_code < 300
+                return response
+            finally:
+                if succeeded or table in g.get('written_tables', ()):
+                    bump_version(table)
+        return wrapper
+    return decorator